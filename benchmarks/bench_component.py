@@ -0,0 +1,100 @@
+"""Benchmarks of `Component.init_cells` and `Component.update_lpjml`.
+
+Run with asv (see ``asv.conf.json``), e.g. ``asv run`` for the current
+commit or ``asv continuous main HEAD`` to compare two commits.
+"""
+
+import gc
+import os
+
+import pycopanlpjml as lpjml
+
+from .synthetic import SyntheticModel
+
+SIZES = [1000, 10000, 67420]
+
+# from the coupled test setup (2 cells) to the full LPJmL grid
+INIT_SIZES = [2, 1000, 10000, 67420]
+
+
+def rss():
+    """Current resident set size of this process in bytes."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class InitCells:
+    """Creation of cell instances and neighbourhood graph.
+
+    Measures the init time, the peak memory and the growth of the resident
+    set size (RSS, in total and per cell) from 2 cells to the full grid.
+    asv runs each benchmark in a fresh process, so that the RSS is not
+    distorted by earlier runs.
+    """
+
+    params = (INIT_SIZES, [False, True])
+    param_names = ["ncell", "lazy"]
+    number = 1
+    repeat = 3
+    timeout = 600
+
+    def setup(self, ncell, lazy):
+        if ncell > 10000 and not lazy:
+            # eager cell views take minutes and GBs on the full grid, asv
+            #   skips parameter combinations whose setup raises
+            #   NotImplementedError
+            raise NotImplementedError
+        self.model = SyntheticModel(ncell)
+        gc.collect()
+
+    def time_init_cells(self, ncell, lazy):
+        self.model.init_cells(cell_class=lpjml.Cell, lazy=lazy)
+
+    def peakmem_init_cells(self, ncell, lazy):
+        self.model.init_cells(cell_class=lpjml.Cell, lazy=lazy)
+
+    def track_rss_init_cells(self, ncell, lazy):
+        before = rss()
+        self.model.init_cells(cell_class=lpjml.Cell, lazy=lazy)
+        return rss() - before
+
+    track_rss_init_cells.unit = "bytes"
+
+    def track_bytes_per_cell(self, ncell, lazy):
+        before = rss()
+        self.model.init_cells(cell_class=lpjml.Cell, lazy=lazy)
+        return (rss() - before) / ncell
+
+    track_bytes_per_cell.unit = "bytes"
+
+
+class UpdateLPJmL:
+    """Yearly exchange with LPJmL and merge into the output history."""
+
+    params = (SIZES, [1, 10], ["shift", "ring"])
+    param_names = ["ncell", "history", "output_history"]
+    timeout = 600
+
+    def setup(self, ncell, history, output_history):
+        self.model = SyntheticModel(
+            ncell,
+            history=history,
+            output_history=output_history,
+            nyear=10**6,
+            fixed_output=True,
+        )
+        self.model.init_cells(cell_class=lpjml.Cell, lazy=True)
+        self.year = self.model.lpjml.sim_year
+        # first update outside of the timings (allocates the history)
+        self.update()
+
+    def update(self):
+        self.model.update_lpjml(self.year)
+        self.year += 1
+
+    def time_update_lpjml(self, ncell, history, output_history):
+        self.update()
+
+    def peakmem_update_lpjml(self, ncell, history, output_history):
+        for _ in range(3):
+            self.update()
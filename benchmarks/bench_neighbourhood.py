@@ -0,0 +1,63 @@
+"""Benchmarks of the construction and traversal of the neighbourhood."""
+
+import gc
+
+import networkx as nx
+import numpy as np
+
+import pycopanlpjml as lpjml
+
+from .synthetic import SyntheticModel
+
+SIZES = [1000, 10000, 67420]
+
+
+class Neighbourhood:
+    """Neighbourhood of the world cells with networkx and CSR backend."""
+
+    params = (SIZES, ["networkx", "csr"])
+    param_names = ["ncell", "backend"]
+    number = 1
+    repeat = 5
+    timeout = 600
+
+    def setup(self, ncell, backend):
+        self.model = SyntheticModel(ncell)
+        self.model.init_cells(
+            cell_class=lpjml.Cell, lazy=True, neighbourhood=backend
+        )
+        self.cells = sorted(self.model.world.cells, key=lambda c: c.index)
+        self.neighbour_matrix = self.model.lpjml.grid.get_neighbourhood(
+            id=False
+        )
+        self.values = np.random.default_rng(0).random((ncell, 32))
+        gc.collect()
+
+    def _construct(self, backend):
+        self.model.world.neighbourhood = nx.Graph()
+        self.model._init_neighbourhood(
+            self.cells, self.neighbour_matrix, backend
+        )
+
+    def time_construct(self, ncell, backend):
+        self._construct(backend)
+
+    def peakmem_construct(self, ncell, backend):
+        self._construct(backend)
+
+    def time_traverse_cells(self, ncell, backend):
+        """Visit the neighbours of every cell via `Cell.neighbourhood`."""
+        for cell in self.cells:
+            for _ in cell.neighbourhood:
+                pass
+
+    def time_neighbour_mean(self, ncell, backend):
+        """Mean of a 32 band cell array over the neighbours of each cell."""
+        neighbourhood = self.model.world.neighbourhood
+        if backend == "csr":
+            neighbourhood.neighbour_mean(self.values)
+            return
+        mean = np.empty_like(self.values)
+        for cell in self.cells:
+            neighbours = [other.index for other in neighbourhood[cell]]
+            mean[cell.index] = self.values[neighbours].mean(axis=0)
@@ -0,0 +1,173 @@
+"""Synthetic LPJmL coupler to benchmark copan:LPJmL without LPJmL."""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from pycoupler.data import LPJmLData, LPJmLDataSet
+
+import pycopanlpjml as lpjml
+from pycopanlpjml.standin import synthetic_grid
+
+# outputs (name: (number of bands, dtype)) as in the coupled test setup
+OUTPUTS = {
+    "pft_harvestc": (32, np.float64),
+    "cftfrac": (32, np.float64),
+    "soilc_agr_layer": (5, np.float64),
+    "hdate": (24, np.int64),
+}
+
+# inputs (name: (number of bands, dtype)) as in the coupled test setup
+INPUTS = {"with_tillage": (1, np.int32)}
+
+
+class SyntheticCoupler:
+    """Stand-in for `pycoupler.coupler.LPJmLCoupler` with synthetic data.
+
+    Implements the subset of the coupler interface that is used by
+    `pycopanlpjml.Component` and `pycopanlpjml.World` without any socket
+    communication, so that the Python side can be benchmarked in isolation.
+
+    Parameters
+    ----------
+    ncell : int
+        Number of cells of the synthetic grid.
+    history : int, default 1
+        Length of the historic output time series.
+    start_year : int, default 2023
+        First coupled simulation year.
+    nyear : int, default 10
+        Number of coupled simulation years.
+    seed : int, default 0
+        Seed of the random number generator for synthetic outputs.
+    fixed_output : bool, default False
+        If True, `read_output` returns the same output every year, which
+        keeps the generation of random values out of timings.
+    """
+
+    def __init__(
+        self,
+        ncell,
+        history=1,
+        start_year=2023,
+        nyear=10,
+        seed=0,
+        fixed_output=False,
+    ):
+        self._ncell = ncell
+        self._history = history
+        self._sim_year = start_year
+        self._rng = np.random.default_rng(seed)
+        self.config = SimpleNamespace(
+            startgrid=0,
+            endgrid=ncell - 1,
+            start_coupling=start_year,
+            lastyear=start_year + nyear - 1,
+            outputyear=start_year - history,
+            coupled_config=SimpleNamespace(
+                lpjml_settings=SimpleNamespace(
+                    country_code_to_name=False, iso_country_code=True
+                )
+            ),
+        )
+        lon, lat = synthetic_grid(ncell)
+        coords = dict(
+            cell=np.arange(ncell), lon=("cell", lon), lat=("cell", lat)
+        )
+        self.grid = LPJmLData(
+            data=np.stack([lon, lat], axis=1),
+            dims=("cell", "band"),
+            coords=dict(coords, band=["lon", "lat"]),
+            name="grid",
+            attrs={"cellsize": 0.5},
+        )
+        self.country = LPJmLData(
+            data=np.full((ncell, 1), "DEU"),
+            dims=("cell", "band"),
+            coords=dict(coords, band=[0]),
+            name="country",
+        )
+        self._coords = coords
+        self._output = None
+        self._fixed_output = fixed_output
+
+    @property
+    def ncell(self):
+        return self._ncell
+
+    @property
+    def sim_year(self):
+        return self._sim_year
+
+    def get_sim_years(self):
+        return iter(range(self._sim_year, self.config.lastyear + 1))
+
+    def get_cells(self, id=True):
+        return iter(range(self._ncell))
+
+    def code_to_name(self, to_iso_alpha_3=False):
+        pass
+
+    def _dataset(self, variables, years):
+        time = pd.to_datetime([f"{year}-12-31" for year in years])
+        data = {}
+        for name, (nband, dtype) in variables.items():
+            shape = (self._ncell, nband, len(years))
+            if np.issubdtype(dtype, np.integer):
+                values = self._rng.integers(0, 365, size=shape, dtype=dtype)
+            else:
+                values = self._rng.random(size=shape).astype(dtype)
+            data[name] = LPJmLData(
+                data=values,
+                dims=("cell", f"band ({name})", "time"),
+                coords=dict(self._coords, time=time),
+                name=name,
+                attrs={"cellsize": 0.5, "source": "synthetic", "history": ""},
+            )
+        return LPJmLDataSet(data)
+
+    def read_input(self, copy=False, **kwargs):
+        return self._dataset(INPUTS, [self._sim_year - 1])
+
+    def read_historic_output(self, to_xarray=True):
+        years = range(self._sim_year - self._history, self._sim_year)
+        return self._dataset(OUTPUTS, years)
+
+    def send_input(self, input_dict, year):
+        pass
+
+    def read_output(self, year, to_xarray=True):
+        if not self._fixed_output or self._output is None:
+            self._output = self._dataset(OUTPUTS, [year])
+        output = self._output
+        self._sim_year = year + 1
+        return output
+
+    def close(self):
+        pass
+
+
+class SyntheticModel(lpjml.Component):
+    """Model with a synthetic world of `ncell` cells (without cells).
+
+    Parameters
+    ----------
+    ncell : int
+        Number of cells of the synthetic grid.
+    output_history : str, default "shift"
+        Storage mode of the output history, see `pycopanlpjml.Component`.
+    kwargs : dict, optional
+        Further keyword arguments of `SyntheticCoupler`.
+    """
+
+    def __init__(self, ncell, output_history="shift", **kwargs):
+        super().__init__(
+            lpjml=SyntheticCoupler(ncell, **kwargs),
+            output_history=output_history,
+        )
+        self.world = lpjml.World(
+            input=self.lpjml.read_input(copy=False),
+            output=self.lpjml.read_historic_output(),
+            grid=self.lpjml.grid,
+            country=self.lpjml.country,
+        )
@@ -7,5 +7,22 @@ except ModuleNotFoundError:  # pragma: no cover
 from .cell import Cell
 from .world import World
 from .component import Component
+from .neighbourhood import Neighbourhood
+from .country import CountryIndex
+from .history import OutputHistory
+from .timing import PhaseTimer
+from .store import OutputStore
+from .shared import SharedWorld
 
-__all__ = ["__version__", "Cell", "World", "Component"]
+__all__ = [
+    "__version__",
+    "Cell",
+    "World",
+    "Component",
+    "Neighbourhood",
+    "CountryIndex",
+    "OutputHistory",
+    "PhaseTimer",
+    "OutputStore",
+    "SharedWorld",
+]
@@ -0,0 +1,325 @@
+"""Area-weighted aggregation of copan:LPJmL world arrays."""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import xarray as xr
+
+# length of one degree of latitude in m as used by LPJmL for the cell area
+_DEGREE_LENGTH = 111194.9
+
+
+def cell_area(lat, cellsize):
+    """Area in m2 of the cells of a regular lon/lat grid (vectorized).
+
+    Computed as LPJmL computes the cell area,
+    ``(111194.9 * dlat) * (111194.9 * dlon) * cos(lat)``.
+
+    Parameters
+    ----------
+    lat : array_like
+        Latitude of the cell centres in degrees.
+    cellsize : float or tuple of float
+        Cell size in degrees (or longitude and latitude cell size).
+
+    Returns
+    -------
+    numpy.ndarray
+        Area of each cell in m2.
+    """
+    dlon, dlat = np.broadcast_to(np.asarray(cellsize, dtype=float), (2,))
+    return (
+        (_DEGREE_LENGTH * dlat)
+        * (_DEGREE_LENGTH * dlon)
+        * np.cos(np.radians(np.asarray(lat, dtype=np.float64)))
+    )
+
+
+def _mask_key(mask):
+    """Cache key of a boolean cell mask."""
+    return hashlib.sha1(np.packbits(mask).tobytes()).hexdigest()
+
+
+class Aggregator:
+    """Area-weighted totals and means of world arrays over groups of cells.
+
+    The cells of a grouping (all cells, the countries of `country_index`,
+    a cell mask or several named masks) are stored once in group order
+    together with their area as weights and reused for every aggregation,
+    so that a total is one gather of the values and one dot product per
+    group. Outputs per area (e.g. ``pft_harvestc`` in gC/m2/yr) can be
+    multiplied by a `fraction` of the cell area (e.g. ``cftfrac``) before
+    the aggregation. Of the mask groupings, only the `cache_size` most
+    recently used are kept, so that e.g. a new threshold mask each year
+    does not accumulate.
+
+    Parameters
+    ----------
+    area : numpy.ndarray or xarray.DataArray
+        Area of each cell in m2, see `cell_area`.
+    country_index : pycopanlpjml.CountryIndex, optional
+        Country index of the cells, required to aggregate by country.
+    cache_size : int, default 8
+        Maximum number of cached mask (and region) groupings.
+
+    Examples
+    --------
+    >>> aggregator = Aggregator.from_world(world)
+    >>> harvest = aggregator.total(
+    ...     world.output.pft_harvestc,
+    ...     by="country",
+    ...     fraction=world.output.cftfrac,
+    ... )
+    """
+
+    def __init__(self, area, country_index=None, cache_size=8):
+        self.area = np.asarray(
+            getattr(area, "values", area), dtype=np.float64
+        ).reshape(-1)
+        self.country_index = country_index
+        self.cache_size = cache_size
+        self._groups = OrderedDict()
+
+    @classmethod
+    def from_world(cls, world):
+        """Aggregator of the cells of `world` with its `area` or, if not
+        set, the area computed from the grid (see `cell_area`).
+        """
+        if hasattr(world, "area"):
+            area = world.area
+        else:
+            index = world.grid_index
+            area = cell_area(index.lat, index.cellsize)
+        return cls(area, getattr(world, "country_index", None))
+
+    @property
+    def ncell(self):
+        """Number of cells."""
+        return self.area.size
+
+    def groups(self, by="global"):
+        """Cell positions, index pointer, weights and labels of a grouping
+        (cached, mask groupings up to `cache_size`).
+
+        Parameters
+        ----------
+        by : str, numpy.ndarray or dict, default "global"
+            "global", "country", a boolean cell mask or a dict of region
+            name and boolean cell mask.
+
+        Returns
+        -------
+        dict
+            ``cells`` (positions in group order), ``indptr`` (the cells of
+            group ``i`` are ``cells[indptr[i]:indptr[i + 1]]``),
+            ``weights`` (area of the cells), ``area`` (area of each group),
+            ``dim`` and ``labels`` (None for a single group).
+        """
+        if isinstance(by, str):
+            key = by
+        elif isinstance(by, dict):
+            by = {name: self._mask(mask) for name, mask in by.items()}
+            key = ("region",) + tuple(
+                (name, _mask_key(mask)) for name, mask in by.items()
+            )
+        else:
+            by = self._mask(by)
+            key = ("mask", _mask_key(by))
+        groups = self._groups.get(key)
+        if groups is not None:
+            self._groups.move_to_end(key)
+            return groups
+
+        dim = labels = None
+        if isinstance(by, dict):
+            masks = list(by.values())
+            cells = np.concatenate(
+                [np.flatnonzero(mask) for mask in masks]
+                or [np.empty(0, dtype=np.int64)]
+            )
+            indptr = np.zeros(len(masks) + 1, dtype=np.int64)
+            np.cumsum([mask.sum() for mask in masks], out=indptr[1:])
+            dim, labels = "region", np.array(list(by))
+        elif not isinstance(by, str):
+            cells = np.flatnonzero(by)
+            indptr = np.array([0, cells.size])
+        elif by == "global":
+            cells = np.arange(self.ncell)
+            indptr = np.array([0, self.ncell])
+        elif by == "country":
+            if self.country_index is None:
+                raise ValueError(
+                    "Aggregation by country requires a country index."
+                )
+            cells = self.country_index.cells
+            indptr = self.country_index.indptr
+            dim, labels = "country", self.country_index.names
+        else:
+            raise ValueError(
+                f"Unknown grouping '{by}', must be 'global', 'country', a"
+                " cell mask or a dict of region masks."
+            )
+        weights = self.area[cells]
+        groups = {
+            "cells": cells,
+            "indptr": indptr,
+            "weights": weights,
+            "area": np.array(
+                [
+                    weights[start:end].sum()
+                    for start, end in zip(indptr[:-1], indptr[1:])
+                ]
+            ),
+            "dim": dim,
+            "labels": labels,
+        }
+        self._groups[key] = groups
+        # evict the least recently used mask groupings
+        masks = [key for key in self._groups if not isinstance(key, str)]
+        for key in masks[: max(len(masks) - self.cache_size, 0)]:
+            del self._groups[key]
+        return groups
+
+    def _mask(self, mask):
+        """Boolean cell mask as numpy array of length ncell."""
+        mask = np.asarray(getattr(mask, "values", mask)).reshape(-1)
+        if mask.dtype != bool or mask.size != self.ncell:
+            raise ValueError(
+                f"Cell mask must be boolean of length {self.ncell}, got"
+                f" {mask.dtype} of length {mask.size}."
+            )
+        return mask
+
+    def _select(self, values, band, time):
+        """Select `band` and `time` of `values` (data arrays only select
+        `time` if they have the time dimension).
+        """
+        if getattr(values, "dims", None) is not None:
+            if band is not None:
+                values = values.sel(band=band)
+            if time is not None and "time" in values.dims:
+                values = values.isel(time=time)
+        elif band is not None:
+            values = np.asarray(values)[:, band]
+        return values
+
+    def _totals(self, data, groups):
+        """Weighted sums of `data` (cell axis first) over each group."""
+        flat = data.reshape(self.ncell, -1)
+        if groups["cells"].size != self.ncell or groups["dim"] is not None:
+            flat = flat[groups["cells"]]
+        weights, indptr = groups["weights"], groups["indptr"]
+        totals = np.empty(
+            (len(indptr) - 1, flat.shape[1]),
+            dtype=np.result_type(flat, weights),
+        )
+        for group, (start, end) in enumerate(zip(indptr[:-1], indptr[1:])):
+            totals[group] = weights[start:end] @ flat[start:end]
+        return totals.reshape((-1,) + data.shape[1:])
+
+    def _aggregate(self, values, how, by, band, fraction, time):
+        if how not in ("sum", "mean"):
+            raise ValueError(
+                f"Unknown aggregation '{how}', must be 'sum' or 'mean'."
+            )
+        groups = self.groups(by)
+        values = self._select(values, band, time)
+        dims = getattr(values, "dims", None)
+        if dims is not None:
+            axis = values.get_axis_num("cell")
+            data = np.moveaxis(values.values, axis, 0)
+        else:
+            data = np.asarray(values)
+        if data.shape[0] != self.ncell:
+            raise ValueError(
+                f"Length of cell dimension ({data.shape[0]}) does not match"
+                f" the number of cells ({self.ncell})."
+            )
+
+        if fraction is not None:
+            fraction = self._select(fraction, band, time)
+            if getattr(fraction, "dims", None) is not None:
+                fraction = np.moveaxis(
+                    fraction.values, fraction.get_axis_num("cell"), 0
+                )
+            fraction = np.broadcast_to(np.asarray(fraction), data.shape)
+            data = data * fraction
+
+        result = self._totals(data, groups)
+        if how == "mean":
+            if fraction is None:
+                total = groups["area"].reshape((-1,) + (1,) * (data.ndim - 1))
+            else:
+                total = self._totals(fraction, groups)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result = result / total
+
+        if groups["dim"] is None:
+            result = result[0]
+        if dims is None:
+            return result
+        if groups["dim"] is None:
+            result_dims = tuple(dim for dim in dims if dim != "cell")
+        else:
+            result = np.moveaxis(result, 0, axis)
+            result_dims = tuple(
+                groups["dim"] if dim == "cell" else dim for dim in dims
+            )
+        coords = {
+            name: coord
+            for name, coord in values.coords.items()
+            if "cell" not in coord.dims
+        }
+        if groups["dim"] is not None:
+            coords[groups["dim"]] = groups["labels"]
+        return xr.DataArray(
+            result,
+            dims=result_dims,
+            coords=coords,
+            name=values.name,
+            attrs=values.attrs,
+        )
+
+    def total(self, values, by="global", band=None, fraction=None, time=-1):
+        """Area-weighted total of `values` over groups of cells.
+
+        Parameters
+        ----------
+        values : numpy.ndarray or xarray.DataArray
+            World array with the cell dimension (first axis for numpy
+            arrays), e.g. an output per area.
+        by : str, numpy.ndarray or dict, default "global"
+            "global", "country", a boolean cell mask or a dict of region
+            name and boolean cell mask.
+        band : label, list or int, optional
+            Band(s) to aggregate (labels of data arrays, positions along
+            the second axis of numpy arrays), defaults to all bands.
+        fraction : numpy.ndarray or xarray.DataArray, optional
+            Fraction of the cell area (e.g. ``cftfrac``) the values refer
+            to, broadcast against `values` (after band and time selection).
+        time : int or slice, default -1
+            Time step(s) of data arrays with the time dimension, -1 for the
+            current time step, None for the whole output history.
+
+        Returns
+        -------
+        numpy.ndarray or xarray.DataArray
+            Totals with the group dimension ("country" or "region", first
+            axis for numpy arrays) instead of the cell dimension (dropped
+            for a single group).
+        """
+        return self._aggregate(values, "sum", by, band, fraction, time)
+
+    def mean(self, values, by="global", band=None, fraction=None, time=-1):
+        """Area-weighted mean of `values` over groups of cells, weighted by
+        the area (times `fraction`) of the cells. See `total` for the
+        parameters.
+        """
+        return self._aggregate(values, "mean", by, band, fraction, time)
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} ncell={self.ncell}"
+            f" groupings={len(self._groups)}>"
+        )
@@ -1,8 +1,256 @@
 """Cell entity type (mixin) class for copan:LPJmL component."""
 
+from collections.abc import MutableSet
+
+import numpy as np
+import xarray as xr
 import pycopancore.model_components.base.implementation as base
 
 
+def _cell_slice(data, index):
+    """Return a numpy view of `data` for the cell at position `index`."""
+    values = data.values
+    if isinstance(data, xr.DataArray) and "cell" in data.dims:
+        axis = data.get_axis_num("cell")
+    else:
+        axis = 0
+    return values[(slice(None),) * axis + (index,)]
+
+
+class CellView:
+    """Lightweight cell view of a world dataset.
+
+    A `CellView` resolves the data variables of a world dataset (e.g.
+    `world.input` or `world.output`) for a single cell on access. Each
+    variable is returned as a numpy view into the world buffer, so writes
+    through the view (``view.with_tillage[:] = 1``) modify the world data in
+    place.
+
+    Variables can also be set (``view.with_tillage = 1`` or
+    ``view["with_tillage"] = 1``), which writes the values into the world
+    buffer in place and reports the write to `on_write`, e.g. to mark the
+    cell for the input tracker (`pycopanlpjml.inputs.InputTracker`).
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        World dataset to generate the cell view from.
+    index : int
+        Position of the cell along the `cell` dimension.
+    on_write : callable, optional
+        Function ``on_write(name, index)`` called after variable `name` has
+        been set.
+    """
+
+    __slots__ = ("_data", "_index", "_on_write")
+
+    def __init__(self, data, index, on_write=None):
+        self._data = data
+        self._index = index
+        self._on_write = on_write
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            ) from None
+
+    def __getitem__(self, name):
+        return _cell_slice(self._data[name], self._index)
+
+    def __setattr__(self, name, values):
+        if name in CellView.__slots__:
+            object.__setattr__(self, name, values)
+        else:
+            self[name] = values
+
+    def __setitem__(self, name, values):
+        if name not in self._data.data_vars:
+            raise KeyError(f"Variable '{name}' is not part of the view.")
+        self[name][...] = values
+        if self._on_write is not None:
+            self._on_write(name, self._index)
+
+    def __contains__(self, name):
+        return name in self._data.data_vars
+
+    def __iter__(self):
+        return iter(self._data.data_vars)
+
+    def keys(self):
+        """Names of the data variables in the view."""
+        return self._data.data_vars.keys()
+
+    def to_xarray(self):
+        """Return the cell as xarray selection of the world dataset."""
+        return self._data.isel(cell=self._index)
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} cell={self._index} "
+            f"variables={list(self._data.data_vars)}>"
+        )
+
+
+def cell_view(data, index, on_write=None):
+    """Generate a cell view of world `data` for the cell at `index`.
+
+    Datasets are wrapped in a :class:`CellView` (with the `on_write`
+    callback), data arrays and numpy arrays are returned as numpy views of
+    the corresponding cell.
+    """
+    if isinstance(data, xr.Dataset):
+        return CellView(data, index, on_write=on_write)
+    return _cell_slice(data, index)
+
+
+class _Neighbourhood:
+    """Cell neighbourhood resolved from the world neighbourhood graph.
+
+    Returns an iterator over the neighbouring cells as soon as the cell is
+    part of the world neighbourhood, otherwise an empty list. Explicitly
+    assigned values take precedence.
+    """
+
+    def __get__(self, cell, owner=None):
+        if cell is None:
+            return self
+        try:
+            return cell.__dict__["neighbourhood"]
+        except KeyError:
+            pass
+        world = cell.__dict__.get("_world")
+        graph = getattr(world, "neighbourhood", None)
+        if graph is not None and cell in graph:
+            return graph.neighbors(cell)
+        return list()
+
+    def __set__(self, cell, value):
+        cell.__dict__["neighbourhood"] = value
+
+
+class _WorldView:
+    """Cell attribute that is resolved lazily from the world.
+
+    Explicitly assigned values are stored on the instance and take
+    precedence. Otherwise, the attribute of the same name is looked up on
+    the cell's world and the cell view for the cell index is returned.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, cell, owner=None):
+        if cell is None:
+            return self
+        try:
+            return cell.__dict__[self.name]
+        except KeyError:
+            pass
+        return cell._resolve_world_view(self.name)
+
+    def __set__(self, cell, value):
+        cell.__dict__[self.name] = value
+
+
+class LazyCells(MutableSet):
+    """Cells of a world created on first access.
+
+    Replaces the set of cells of a world (`world.cells`) to create the
+    cells of the selected `positions` only when they are accessed by
+    position (``world.cells[i]``). Iterating over the cells creates all
+    remaining cells, `created` holds the cells created so far. Cells
+    registered otherwise (e.g. created explicitly with the world) are
+    kept as with a set.
+
+    Parameters
+    ----------
+    factory : callable
+        Function ``factory(index)`` creating the cell at position `index`
+        (registering it with the world).
+    positions : array_like or iterable of int
+        Sorted positions of the cells that can be created.
+    """
+
+    def __init__(self, factory, positions):
+        self.factory = factory
+        if not hasattr(positions, "__len__"):
+            # e.g. the generator of `LPJmLCoupler.get_cells`
+            positions = np.fromiter(positions, dtype=np.int64)
+        self.positions = np.asarray(positions, dtype=np.int64)
+        if self.positions.ndim != 1:
+            raise ValueError(
+                "Cell positions must be one-dimensional, got shape"
+                f" {self.positions.shape}."
+            )
+        self.created = {}
+        self._others = set()
+        # positions of created cells removed from the world
+        self._removed = set()
+
+    def _selected(self, index):
+        position = np.searchsorted(self.positions, index)
+        return (
+            position < len(self.positions)
+            and self.positions[position] == index
+        )
+
+    def __getitem__(self, index):
+        """Cell at position `index`, created on first access."""
+        cell = self.created.get(index)
+        if cell is not None:
+            return cell
+        if not self._selected(index) or index in self._removed:
+            raise KeyError(f"Cell {index} is not part of the selection.")
+        cell = self.factory(index)
+        # cells register before their index is set
+        self._others.discard(cell)
+        self.created[index] = cell
+        return cell
+
+    @property
+    def existing(self):
+        """Cells created so far and cells registered otherwise (without
+        creating cells).
+        """
+        return list(self.created.values()) + list(self._others)
+
+    def __iter__(self):
+        for index in self.positions.tolist():
+            if index not in self._removed:
+                yield self[index]
+        yield from list(self._others)
+
+    def __len__(self):
+        return len(self.positions) - len(self._removed) + len(self._others)
+
+    def __contains__(self, cell):
+        index = getattr(cell, "__dict__", {}).get("index")
+        return self.created.get(index) is cell or cell in self._others
+
+    def add(self, cell):
+        index = cell.__dict__.get("index")
+        if index is not None and self._selected(index):
+            self.created.setdefault(index, cell)
+        else:
+            self._others.add(cell)
+
+    def discard(self, cell):
+        index = cell.__dict__.get("index")
+        if self.created.get(index) is cell:
+            del self.created[index]
+            self._removed.add(index)
+        self._others.discard(cell)
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} ncell={len(self.positions)}"
+            f" created={len(self.created)}>"
+        )
+
+
 class Cell(base.Cell):
     """An LPJmL-integrating cell entity.
 
@@ -25,6 +273,12 @@ class Cell(base.Cell):
         Country of the cell as a country code.
     area : float
         Area of the cell in square meters.
+    index : int, optional
+        Position of the cell in the world data (along the `cell` dimension).
+        Attributes that are not supplied explicitly (`input`, `output`,
+        `grid`, `country`, `area` and the world views registered by
+        `Component.init_cells`) are resolved lazily on access as numpy views
+        into the world buffers.
     kwargs : dict, optional
         Additional keyword arguments.
 
@@ -78,8 +332,21 @@ class Cell(base.Cell):
     ... )
 
     >>> cell
+
+    Alternatively, a cell can hold only its index and resolve its data
+    lazily from the world
+
+    >>> cell = Cell(world=world, index=cell_id)
+    >>> cell.output.hdate
     """
 
+    input = _WorldView()
+    output = _WorldView()
+    grid = _WorldView()
+    country = _WorldView()
+    area = _WorldView()
+    neighbourhood = _Neighbourhood()
+
     def __init__(
         self,
         input=None,
@@ -87,11 +354,15 @@ class Cell(base.Cell):
         grid=None,
         country=None,
         area=None,
+        index=None,
         **kwargs,
     ):
 
         super().__init__(**kwargs)
 
+        # position of the cell in the world data
+        self.index = index
+
         # hold the input data for LPJmL on cell level
         if input is not None:
             self.input = input
@@ -102,10 +373,9 @@ class Cell(base.Cell):
 
         # hold the grid information for each cell (lon, lat) from LPJmL on
         #   cell level
+        #   (the neighbourhood of the cell is resolved from the world)
         if grid is not None:
             self.grid = grid
-            # initialize the neighbourhood of the cell
-            self.neighbourhood = list()
 
         # hold the country information (country code str) from LPJmL on
         #   cell level
@@ -115,3 +385,24 @@ class Cell(base.Cell):
         # hold the area in m2 from LPJmL on cell level
         if area is not None:
             self.area = area
+
+    def _resolve_world_view(self, name):
+        """Resolve world attribute `name` as view of this cell."""
+        index = self.__dict__.get("index")
+        world = self.__dict__.get("_world")
+        data = getattr(world, name, None) if index is not None else None
+        if data is None:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        on_write = getattr(world, "_write_hooks", {}).get(name)
+        return cell_view(data, index, on_write=on_write)
+
+    def __getattr__(self, name):
+        # only called if regular lookup fails: resolve registered world views
+        world = self.__dict__.get("_world")
+        if name in getattr(world, "_cell_views", ()):
+            return self._resolve_world_view(name)
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'"
+        )
@@ -0,0 +1,222 @@
+"""Binary checkpoints of the Python side state of copan:LPJmL models."""
+
+import json
+import os
+
+import numpy as np
+
+from .neighbourhood import Neighbourhood
+from .shared import _variables
+
+# world attributes (datasets) stored in checkpoints
+CHECKPOINT_DATA = ("input", "output")
+
+# file name of the checkpoint metadata
+_META_FILE = "checkpoint.json"
+
+
+def _file(path, *keys):
+    """File name of the array `keys` in checkpoint `path`."""
+    return os.path.join(path, ".".join(keys) + ".npy")
+
+
+class Checkpoint:
+    """Checkpoint of the Python side state of a copan:LPJmL model.
+
+    A checkpoint is a directory of uncompressed `.npy` files (one per
+    array) and a JSON file with the metadata, so that its arrays can be
+    memory-mapped on reading. It holds
+
+    * the data variables and time axes of `world.input` and
+      `world.output`,
+    * the neighbourhood of the cells as unique neighbour pairs (positions
+      along the cell dimension),
+    * registered cell attributes, one array per attribute with the values
+      of all cells ordered by cell position, and the positions of the
+      cells (e.g. of a selection of cells).
+
+    Parameters
+    ----------
+    path : str
+        Directory of the checkpoint.
+    meta : dict
+        Checkpoint metadata (year, ncell, variables and cell attributes).
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+
+    @property
+    def year(self):
+        """Simulation year of the checkpoint (last year of the output)."""
+        return self.meta["year"]
+
+    @property
+    def ncell(self):
+        """Number of cells."""
+        return self.meta["ncell"]
+
+    @property
+    def cell_attributes(self):
+        """Names of the stored cell attributes."""
+        return list(self.meta["cell_attributes"])
+
+    @classmethod
+    def write(cls, path, world, year, cells=None, cell_attributes=()):
+        """Write the state of `world` (and `cells`) to a checkpoint.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the checkpoint, created if it does not exist.
+        world : pycopanlpjml.World
+            World with `input` and `output` and the neighbourhood.
+        year : int
+            Simulation year of the checkpoint.
+        cells : list, optional
+            Cells with a position (`cell.index`), required for
+            `cell_attributes`.
+        cell_attributes : list of str, optional
+            Cell attributes to store. The values of all cells have to be
+            convertible to one (non object) numpy array.
+
+        Returns
+        -------
+        Checkpoint
+            The written checkpoint.
+        """
+        os.makedirs(path, exist_ok=True)
+        meta = {
+            "year": int(year),
+            "ncell": world.output.sizes["cell"],
+            "variables": {},
+            "cell_attributes": list(cell_attributes),
+        }
+
+        for attribute in CHECKPOINT_DATA:
+            data = getattr(world, attribute)
+            meta["variables"][attribute] = list(data.data_vars)
+            for name, variable in _variables(data).items():
+                np.save(_file(path, attribute, name), variable.values)
+            np.save(_file(path, attribute, "time"), data.time.values)
+
+        np.save(_file(path, "neighbourhood"), _neighbour_pairs(world))
+
+        if cell_attributes:
+            np.save(
+                _file(path, "cells"),
+                np.array([cell.index for cell in cells], dtype=np.int64),
+            )
+        for name in cell_attributes:
+            values = np.asarray([getattr(cell, name) for cell in cells])
+            if values.dtype.hasobject:
+                raise ValueError(
+                    f"Cell attribute '{name}' cannot be stored as array."
+                )
+            np.save(_file(path, "cell", name), values)
+
+        with open(os.path.join(path, _META_FILE), "w") as file:
+            json.dump(meta, file, indent=2)
+        return cls(path, meta)
+
+    @classmethod
+    def read(cls, path):
+        """Read the checkpoint metadata of `path`, arrays are read (memory
+        mapped) on access.
+        """
+        with open(os.path.join(path, _META_FILE)) as file:
+            return cls(path, json.load(file))
+
+    def array(self, *keys):
+        """Array `keys` (e.g. ``"output", "hdate"``) as read-only memory
+        map.
+        """
+        return np.load(_file(self.path, *keys), mmap_mode="r")
+
+    def restore_world(self, world):
+        """Copy the stored input and output into the arrays of `world` in
+        place (views and shared buffers stay valid).
+
+        All variables and time axes are validated before the first one is
+        written, so that the world is left unchanged if the checkpoint
+        does not match.
+        """
+        targets = []
+        for attribute in CHECKPOINT_DATA:
+            data = getattr(world, attribute)
+            names = self.meta["variables"][attribute]
+            if set(names) != set(data.data_vars):
+                raise ValueError(
+                    f"Variables of world.{attribute} {list(data.data_vars)}"
+                    f" do not match the checkpoint {names}."
+                )
+            for name in names:
+                values = data.variables[name].values
+                stored = self.array(attribute, name)
+                if values.shape != stored.shape:
+                    raise ValueError(
+                        f"Shape of world.{attribute}.{name} {values.shape}"
+                        f" does not match the checkpoint {stored.shape}."
+                    )
+                targets.append((values, stored))
+            stored = self.array(attribute, "time")
+            if data.time.shape != stored.shape:
+                raise ValueError(
+                    f"Time axis of world.{attribute} ({data.time.size}) does"
+                    f" not match the checkpoint ({stored.size})."
+                )
+            targets.append((data.time.values, stored))
+
+        for values, stored in targets:
+            values[...] = stored
+
+    def neighbourhood(self, nodes=None):
+        """The stored neighbourhood as `pycopanlpjml.Neighbourhood`."""
+        return Neighbourhood.from_pairs(
+            np.array(self.array("neighbourhood")), self.ncell, nodes=nodes
+        )
+
+    def restore_cells(self, cells):
+        """Set the stored cell attributes of `cells`, matched by their
+        position (`cell.index`).
+        """
+        if not self.cell_attributes:
+            return
+        by_index = {cell.index: cell for cell in cells}
+        stored = self.array("cells").tolist()
+        missing = [index for index in stored if index not in by_index]
+        if missing:
+            raise ValueError(
+                f"Cells {missing[:10]} of the checkpoint are not part of the"
+                " cells to restore."
+            )
+        stored_cells = [by_index[index] for index in stored]
+        for name in self.cell_attributes:
+            values = np.array(self.array("cell", name))
+            for cell, value in zip(stored_cells, values):
+                setattr(cell, name, value.item() if value.ndim == 0 else value)
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} path='{self.path}' year={self.year}"
+            f" ncell={self.ncell}>"
+        )
+
+
+def _neighbour_pairs(world):
+    """Unique neighbour pairs of the world neighbourhood (positions)."""
+    neighbourhood = getattr(world, "neighbourhood", None)
+    if hasattr(neighbourhood, "pairs"):
+        return neighbourhood.pairs
+    if neighbourhood is None or neighbourhood.number_of_edges() == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = [
+        (source.index, target.index)
+        for source, target in neighbourhood.edges()
+    ]
+    if any(index is None for pair in pairs for index in pair):
+        raise ValueError(
+            "Cells of the neighbourhood require a position (cell.index)."
+        )
+    return np.array(pairs, dtype=np.int64)
@@ -0,0 +1,142 @@
+"""Compact storage dtypes of the copan:LPJmL world data."""
+
+import numpy as np
+
+
+def _kind(dtype):
+    """Kind of `dtype`, "integer", "float" or None for other dtypes."""
+    if np.issubdtype(dtype, np.integer):
+        return "integer"
+    if np.issubdtype(dtype, np.floating):
+        return "float"
+    return None
+
+
+class StoragePolicy:
+    """Storage dtypes of the world input and output variables.
+
+    The coupler delivers outputs as float64 or int64, which is several times
+    the memory needed for e.g. fractions or harvest dates over a long output
+    history. With a storage policy, the configured variables of
+    `world.input` and `world.output` are converted once to their (compact)
+    storage dtype before cells and history buffers are created, received
+    outputs are then cast on merge into the preallocated arrays.
+
+    Precision contract:
+
+    * The storage dtype has to be of the same kind (integer or floating
+      point) as the world variable, so that inputs are sent to LPJmL as
+      before (LPJmL receives int32 and float32 values).
+    * Floating point values are rounded to the nearest value of the
+      storage dtype (e.g. about 7 significant digits for float32).
+    * Integer values are stored exactly. Values outside of the range of the
+      storage dtype (finite values for floating point dtypes) and NaN for
+      integer dtypes raise a ValueError on conversion and on merge instead
+      of wrapping around or overflowing silently.
+    * Values assigned to compact input arrays by the Python side are cast
+      by numpy, they have to lie within the range of the storage dtype.
+
+    Parameters
+    ----------
+    dtypes : dict, optional
+        Variable name and storage dtype (e.g. ``{"cftfrac": "float32",
+        "hdate": "int16"}``), applies to the input and output variables of
+        the name.
+
+    Examples
+    --------
+    >>> policy = StoragePolicy({"cftfrac": "float32", "hdate": "int16"})
+    >>> policy.apply(world.output)
+    ['cftfrac', 'hdate']
+    """
+
+    def __init__(self, dtypes=None):
+        self.dtypes = {}
+        for name, dtype in (dtypes or {}).items():
+            dtype = np.dtype(dtype)
+            if _kind(dtype) is None:
+                raise ValueError(
+                    f"Storage dtype {dtype} of '{name}' must be an integer or"
+                    " floating point dtype."
+                )
+            self.dtypes[name] = dtype
+
+    def __len__(self):
+        return len(self.dtypes)
+
+    def _check_values(self, name, values):
+        """Raise a ValueError if `values` of variable `name` cannot be
+        stored in its storage dtype.
+        """
+        dtype = self.dtypes[name]
+        values = np.asarray(getattr(values, "values", values))
+        if values.size == 0 or np.can_cast(values.dtype, dtype, "safe"):
+            return
+        if _kind(dtype) == "integer":
+            info = np.iinfo(dtype)
+            if _kind(values.dtype) == "float" and np.isnan(values).any():
+                raise ValueError(
+                    f"Values of '{name}' contain NaN, which cannot be"
+                    f" stored as {dtype}."
+                )
+            low, high = values.min(), values.max()
+        else:
+            info = np.finfo(dtype)
+            high = np.max(np.abs(values), initial=0, where=np.isfinite(values))
+            low = -high
+        if low < info.min or high > info.max:
+            raise ValueError(
+                f"Values of '{name}' ({low} to {high}) exceed the range of"
+                f" the storage dtype {dtype}."
+            )
+
+    def check(self, data):
+        """Check the values of the variables of `data` (e.g. a received
+        output) with a storage dtype, see the precision contract.
+
+        Parameters
+        ----------
+        data : dict or xarray.Dataset
+            Variable name as key and array as value.
+        """
+        for name in self.dtypes:
+            if name in data:
+                self._check_values(name, data[name])
+
+    def apply(self, data):
+        """Convert the variables of `data` to their storage dtype.
+
+        Variables already stored in their storage dtype are kept, so that
+        the conversion only takes place once.
+
+        Parameters
+        ----------
+        data : xarray.Dataset or pycoupler.LPJmLDataSet
+            World input or output.
+
+        Returns
+        -------
+        list of str
+            Names of the converted variables.
+        """
+        converted = []
+        for name in data.data_vars:
+            dtype = self.dtypes.get(name)
+            variable = data.variables[name]
+            if dtype is None or variable.dtype == dtype:
+                continue
+            if _kind(variable.dtype) != _kind(dtype):
+                raise ValueError(
+                    f"Storage dtype {dtype} of '{name}' does not match the"
+                    f" kind of its {variable.dtype} values."
+                )
+            self._check_values(name, variable.values)
+            variable.data = variable.values.astype(dtype)
+            converted.append(name)
+        return converted
+
+    def __repr__(self):
+        dtypes = ", ".join(
+            f"{name}={dtype}" for name, dtype in self.dtypes.items()
+        )
+        return f"<{type(self).__name__} {dtypes}>"
@@ -1,10 +1,26 @@
 """Model mixin class to build copan:LPJmL models."""
 
+import os
 import sys
+
 import numpy as np
-import xarray as xr
+from concurrent.futures import ThreadPoolExecutor
+
 from pycoupler.coupler import LPJmLCoupler
 
+from . import memory
+from .cell import LazyCells
+from .checkpoint import Checkpoint
+from .compact import StoragePolicy
+from .country import code_names, decode
+from .history import OutputHistory, OutputSubscription, year_end
+from .inputs import InputTracker, cell_values, encode, use_send_values
+from .neighbourhood import Neighbourhood, neighbour_pairs
+from .scheduler import CellScheduler, partition_cells
+from .shared import WORLD_BUFFERS, SharedWorld
+from .store import OutputStore
+from .timing import PhaseTimer
+
 
 class Component:
     """An LPJmL-integrating mixin model component to build copan:LPJmL models.
@@ -29,6 +45,59 @@ class Component:
         Hostname of the LPJmL coupler.
     lpjml_port : int
         Port of the LPJmL coupler.
+    output_history : str, optional
+        Storage mode of the output history in `world.output`, see
+        `pycopanlpjml.OutputHistory`. "shift" (default) shifts the history
+        in the existing arrays each year, "ring" writes each year into a
+        preallocated ring buffer so that the cost of a step does not grow
+        with the length of the history (requires lazy cells, see
+        `init_cells`).
+    output_store : str, optional
+        File name of a netCDF file to stream the full output history to,
+        see `pycopanlpjml.store.OutputStore`. Each year's output is written
+        by a background thread, `output_store.open_dataset()` returns the
+        stored history as lazily loaded dataset. Defaults to None (no
+        on-disk history).
+    input_tracking : str, optional
+        Change detection of `world.input`, see
+        `pycopanlpjml.inputs.InputTracker`. If set ("compare" or "marked"),
+        the input is kept in cached wire buffers of which only the changed
+        cell blocks are re-encoded each year, and each input is sent to
+        LPJmL in one socket write. "compare" detects any write by comparing
+        the whole input each year, "marked" only sends writes set through
+        the cell views (``cell.input.with_tillage = 0``), the scheduler or
+        `input_tracker.mark_dirty` and requires lazy cells. Defaults to
+        None (the input is serialized value by value by pycoupler each
+        year).
+    timing : bool, optional
+        If True, the phases of the exchange with LPJmL are timed per
+        simulation year, see `timer`. Defaults to False.
+    country_encoding : str, optional
+        Storage of the countries (and regions) of the cells if
+        `country_code_to_name` is set in the coupled configuration.
+        "names" (default) stores the name (or ISO code) of each cell,
+        "codes" keeps compact integer codes with the lookup table
+        `country_names`, names are produced on demand (see
+        `pycopanlpjml.CountryIndex`).
+    country_cache : str or bool, optional
+        Directory to cache the code to name lookup tables in (True for
+        `pycopanlpjml.country.default_cache_dir`), keyed by the country and
+        region parameters of the configuration. Defaults to None (no
+        cache).
+    checkpoint_path : str, optional
+        Directory to save checkpoints to (see `save_checkpoint`) at the
+        restart year of LPJmL (`config.restart_year`) if LPJmL writes a
+        restart file (`config.write_restart`), as
+        ``checkpoint_path/checkpoint_<year>``. Defaults to None (no
+        automatic checkpoints).
+    storage_dtypes : dict, optional
+        Storage dtype of world input and output variables by name (e.g.
+        ``{"cftfrac": "float32", "hdate": "int16"}``), added to the
+        `storage_dtypes` of the `lpjml_settings` in the coupled
+        configuration. The variables are converted once before the cells
+        are initialized and received outputs are cast on merge, see
+        `pycopanlpjml.compact.StoragePolicy` for the precision contract.
+        Defaults to None (the dtypes delivered by the coupler).
     kwargs : dict, optional
         Additional keyword arguments.
 
@@ -86,11 +155,52 @@ class Component:
         lpjml_couplerversion=3,
         lpjml_host="localhost",
         lpjml_port=2042,
+        output_history="shift",
+        output_store=None,
+        input_tracking=None,
+        timing=False,
+        country_encoding="names",
+        country_cache=None,
+        checkpoint_path=None,
+        storage_dtypes=None,
         **kwargs,
     ):
 
         super().__init__(**kwargs)
 
+        self._output_history_mode = output_history
+        self._output_history = None
+        self._output_store_file = output_store
+        self._output_store = None
+        if input_tracking not in (None, "compare", "marked"):
+            raise ValueError(
+                f"Unknown input tracking '{input_tracking}', must be"
+                " 'compare' or 'marked'."
+            )
+        self._input_tracking = input_tracking
+        self._input_tracker = None
+        self.shared_world = None
+        self.scheduler = None
+        self._checkpoint_path = checkpoint_path
+        if country_encoding not in ("names", "codes"):
+            raise ValueError(
+                f"Unknown country encoding '{country_encoding}', must be"
+                " 'names' or 'codes'."
+            )
+        self._country_encoding = country_encoding
+        self._country_cache = country_cache
+        # lookup tables of the country and region names by code
+        self.country_names = None
+        self.region_names = None
+        # names of cell attributes stored in checkpoints
+        self.checkpoint_attributes = []
+        # outputs consumed by the Python side (all if empty)
+        self.output_subscriptions = {}
+        self._exchange = None
+        self._exchange_executor = None
+        # per-phase timings of the exchange, model spans can be added
+        self.timer = PhaseTimer(enabled=timing)
+
         if config_file is not None:
             # establish coupler connection to LPJmL
             self.lpjml = LPJmLCoupler(
@@ -104,19 +214,438 @@ class Component:
         else:
             raise ValueError("Either config_file or lpjml must be provided")
 
+        if input_tracking is not None:
+            # send the wire buffers in one write instead of value by value
+            #   (relies on pycoupler internals, checked by use_send_values)
+            use_send_values(self.lpjml)
+
         self._countries_as_names()
         self.config = self.lpjml.config
+        self.storage_policy = self._storage_policy(storage_dtypes)
 
-    def _countries_as_names(self):
-        """Convert country codes to names"""
+    @property
+    def output_history(self):
+        """Output history of `world.output`, initialized on first access."""
+        if (
+            self._output_history is None
+            or self._output_history.output is not self.world.output
+        ):
+            self._compact_world()
+            self._output_history = OutputHistory(
+                self.world.output,
+                mode=self._output_history_mode,
+                latest=[
+                    name
+                    for name, subscription in self.output_subscriptions.items()
+                    if subscription.latest
+                ],
+            )
+        return self._output_history
+
+    @property
+    def input_tracker(self):
+        """Change tracker of `world.input`
+        (`pycopanlpjml.inputs.InputTracker`) if `input_tracking` is set,
+        initialized on first access.
+        """
+        if self._input_tracking is None:
+            return None
         if (
-            self.lpjml.config.coupled_config.lpjml_settings.country_code_to_name  # noqa
-        ):  # noqa
-            self.lpjml.code_to_name(
-                self.lpjml.config.coupled_config.lpjml_settings.iso_country_code  # noqa
+            self._input_tracker is None
+            or self._input_tracker.input is not self.world.input
+        ):
+            self._compact_world()
+            self._input_tracker = InputTracker(
+                self.world.input, mode=self._input_tracking
+            )
+        return self._input_tracker
+
+    def _storage_policy(self, storage_dtypes):
+        """Storage policy of the `storage_dtypes` of the coupled
+        configuration updated by `storage_dtypes`.
+        """
+        settings = self.lpjml.config.coupled_config.lpjml_settings
+        dtypes = getattr(settings, "storage_dtypes", None) or {}
+        if hasattr(dtypes, "to_dict"):
+            dtypes = dtypes.to_dict()
+        return StoragePolicy({**dtypes, **(storage_dtypes or {})})
+
+    def _compact_world(self):
+        """Convert `world.input` and `world.output` to the dtypes of the
+        `storage_policy` (only once, converted variables are kept).
+        """
+        if not self.storage_policy:
+            return
+        for name in ("input", "output"):
+            data = getattr(self.world, name, None)
+            if data is not None:
+                self.storage_policy.apply(data)
+
+    def memory_report(self, cells=True, sample=None):
+        """Bytes held by the world (see `pycopanlpjml.World.memory_report`)
+        and the coupler buffers of the component (``coupler``: wire
+        buffers and compare copies of the `input_tracker`).
+
+        Parameters
+        ----------
+        cells : bool, default True
+            Whether to inspect the cell objects.
+        sample : int, optional
+            Only inspect every n-th cell and extrapolate.
+
+        Returns
+        -------
+        dict
+            Bytes by category, see `pycopanlpjml.memory.memory_report`.
+        """
+        report = self.world.memory_report(cells=cells, sample=sample)
+        del report["total"]
+        report["coupler"] = {}
+        tracker = self._input_tracker
+        if tracker is not None:
+            report["coupler"]["input_buffers"] = tracker.nbytes
+            report["coupler"]["input_copies"] = sum(
+                values.nbytes for values in tracker._last.values()
+            )
+        report["total"] = memory.total_bytes(report)
+        return report
+
+    def subscribe_output(self, names, every=1, latest=False):
+        """Declare outputs consumed by the Python side.
+
+        Once outputs are subscribed, all other outputs are removed from
+        `world.output` with the next exchange. Outputs are then received
+        from LPJmL as numpy arrays (without decoding them into xarray
+        objects) and only subscribed outputs that are due in a year are
+        merged into the output history, see
+        `pycopanlpjml.history.OutputSubscription`. The remaining outputs
+        are still read from the socket (drained), but dropped.
+
+        Parameters
+        ----------
+        names : str or list of str
+            Names of the outputs.
+        every : int, default 1
+            Merge the outputs every `every` years (counted from the first
+            coupled year), the latest values are carried forward in between.
+        latest : bool, default False
+            If True, only the latest values of the outputs are kept in
+            `world.output` instead of a history.
+
+        Examples
+        --------
+        >>> model.subscribe_output("hdate")
+        >>> model.subscribe_output("soilc_agr_layer", every=5, latest=True)
+        """
+        if self._exchange is not None:
+            raise RuntimeError(
+                "Cannot subscribe outputs during an exchange, call"
+                " finish_exchange() first."
+            )
+        if isinstance(names, str):
+            names = [names]
+        for name in names:
+            if name not in self.world.output.data_vars:
+                raise KeyError(f"Output '{name}' is not part of world.output.")
+            self.output_subscriptions[name] = OutputSubscription(
+                name,
+                every=every,
+                latest=latest,
+                start=self.lpjml.config.start_coupling,
+            )
+        self._output_history = None
+
+    def _drop_unsubscribed_output(self):
+        """Remove unsubscribed outputs from `world.output`."""
+        unsubscribed = [
+            name
+            for name in self.world.output.data_vars
+            if name not in self.output_subscriptions
+        ]
+        for name in unsubscribed:
+            del self.world.output[name]
+        if unsubscribed:
+            # rebuild the history of the subscribed outputs
+            self._output_history = None
+
+    def _subscribed_output(self, output, t):
+        """Subscribed outputs of `output` that are due in year `t`."""
+        return {
+            name: output[name]
+            for name, subscription in self.output_subscriptions.items()
+            if name in output and subscription.due(t)
+        }
+
+    @property
+    def output_store(self):
+        """On-disk output history (`pycopanlpjml.store.OutputStore`) if an
+        `output_store` file is set, created with the current history of
+        `world.output` on first access.
+        """
+        if self._output_store_file is None:
+            return None
+        if self._output_store is None:
+            self._output_store = OutputStore(
+                self._output_store_file, self.world.output
+            )
+        return self._output_store
+
+    def share_world(self, attributes=None):
+        """Back the world arrays with shared memory for worker processes.
+
+        See `pycopanlpjml.shared.SharedWorld`. Worker processes attach to
+        the world arrays zero-copy via `shared_world.handle.attach()`,
+        inputs written by the workers are sent with the next exchange. The
+        shared memory is released (the arrays are copied back into process
+        memory) after the last year.
+
+        Sharing rebinds the world variables to the shared memory block (and
+        back after the last year), so views of the previous arrays would
+        silently detach from the world. Cells have to resolve their data
+        lazily (``init_cells(lazy=True)`` or ``on_access=True``), sharing
+        a world of cells holding views of the shared attributes (created
+        by `init_cells` without `lazy`) raises a RuntimeError.
+
+        Parameters
+        ----------
+        attributes : list of str, optional
+            World attributes to share, defaults to `input`, `output`,
+            `grid`, `country` and `area` (if set).
+
+        Returns
+        -------
+        pycopanlpjml.shared.WorldHandle
+            Picklable handle to pass to worker processes.
+        """
+        if self.shared_world is not None:
+            raise RuntimeError("The world is already shared.")
+        if attributes is None:
+            attributes = [
+                attribute
+                for attribute in WORLD_BUFFERS
+                if getattr(self.world, attribute, None) is not None
+            ]
+        if self._cells_with_views(attributes):
+            raise RuntimeError(
+                "Cells hold views of the world arrays, which detach when the"
+                " world is shared. Initialize the cells with"
+                " init_cells(lazy=True) to share the world."
+            )
+        if self._output_history_mode == "ring" and "output" in attributes:
+            raise ValueError(
+                "The output of a 'ring' output history cannot be shared,"
+                " use output_history='shift'."
+            )
+        self._compact_world()
+        self.shared_world = SharedWorld(self.world, attributes=attributes)
+        return self.shared_world.handle
+
+    def _cells_with_views(self, attributes):
+        """Whether cells hold (eagerly created) views of the world
+        `attributes` instead of resolving them from the world.
+        """
+        return any(
+            attribute in cell.__dict__
+            for cell in memory._existing_cells(self.world)
+            for attribute in attributes
+        )
+
+    def init_scheduler(self, by="block", size=10.0, processes=None, seed=0):
+        """Initialize the `scheduler` to run cell level update functions in
+        parallel, see `pycopanlpjml.scheduler.CellScheduler`.
+
+        The cells are partitioned into spatial blocks or countries (see
+        `pycopanlpjml.scheduler.partition_cells`), the world is shared with
+        the worker processes (`share_world`) if not done before, which
+        requires lazily resolved cells (``init_cells(lazy=True)``). The
+        worker processes are shut down after the last year.
+
+        Parameters
+        ----------
+        by : str, default "block"
+            Partitioning of the cells, "block" or "country".
+        size : float, default 10.0
+            Edge length of the blocks in degrees.
+        processes : int, optional
+            Number of worker processes, defaults to the number of CPUs. 0
+            runs the update functions in the calling process.
+        seed : int, default 0
+            Seed of the random number generators of the partitions.
+
+        Returns
+        -------
+        pycopanlpjml.scheduler.CellScheduler
+            The scheduler.
+        """
+        if self.scheduler is not None:
+            self.scheduler.close()
+
+        if isinstance(self.world.neighbourhood, Neighbourhood):
+            neighbourhood = Neighbourhood(
+                self.world.neighbourhood.indptr,
+                self.world.neighbourhood.indices,
+            )
+        else:
+            neighbourhood = Neighbourhood.from_neighbour_matrix(
+                self.lpjml.grid.get_neighbourhood(id=False)
+            )
+
+        handle = None
+        if processes != 0:
+            if self.shared_world is None:
+                self.share_world()
+            handle = self.shared_world.handle
+
+        self.scheduler = CellScheduler(
+            self.world,
+            partition_cells(self.world, by=by, size=size),
+            neighbourhood,
+            handle=handle,
+            processes=processes,
+            seed=seed,
+            tracker=self.input_tracker,
+        )
+        return self.scheduler
+
+    def save_checkpoint(self, path, cell_attributes=None):
+        """Save the Python side state to a binary checkpoint.
+
+        Stores `world.input` and `world.output` (incl. the time axes), the
+        neighbourhood of the cells and the cell attributes named in
+        `checkpoint_attributes` (of the cells with a position,
+        `cell.index`) as uncompressed arrays that can be memory mapped, see
+        `pycopanlpjml.checkpoint.Checkpoint`. The year of the
+        checkpoint is the last year of the output history.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the checkpoint.
+        cell_attributes : list of str, optional
+            Cell attributes to store, defaults to `checkpoint_attributes`.
+
+        Returns
+        -------
+        pycopanlpjml.checkpoint.Checkpoint
+            The saved checkpoint.
+        """
+        if self._exchange is not None:
+            raise RuntimeError(
+                "Cannot save a checkpoint during an exchange, call"
+                " finish_exchange() first."
+            )
+        if cell_attributes is None:
+            cell_attributes = self.checkpoint_attributes
+        return Checkpoint.write(
+            path,
+            self.world,
+            self.output_history.years[-1],
+            cells=self._sorted_cells(),
+            cell_attributes=cell_attributes,
+        )
+
+    def load_checkpoint(
+        self, path, cell_class=None, world_views=None, strict=True, **kwargs
+    ):
+        """Restore the Python side state from a checkpoint.
+
+        Copies the stored input and output into the world arrays in place
+        and sets the stored cell attributes. If `cell_class` is given, the
+        cells are created lazily (see `init_cells`) with the stored
+        neighbourhood as `pycopanlpjml.Neighbourhood`, so that `init_cells`
+        can be skipped on resume.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the checkpoint.
+        cell_class : Cell, optional
+            Cell class to create the cells with. Defaults to None (cells
+            created before via `init_cells` are restored).
+        world_views : list, optional
+            World views of the created cells, see `init_cells`.
+        strict : bool, default True
+            If True, the checkpoint year has to be the year before the
+            first simulation year of LPJmL (its restart year).
+        kwargs : dict, optional
+            Additional keyword arguments for cell instances.
+
+        Returns
+        -------
+        pycopanlpjml.checkpoint.Checkpoint
+            The loaded checkpoint.
+        """
+        checkpoint = Checkpoint.read(path)
+        if strict and checkpoint.year != self.lpjml.sim_year - 1:
+            raise ValueError(
+                f"Checkpoint of year {checkpoint.year} does not match the"
+                f" LPJmL simulation starting in {self.lpjml.sim_year}."
             )
+        self._compact_world()
+        checkpoint.restore_world(self.world)
+        if self.input_tracker is not None:
+            self.input_tracker.mark_dirty()
+        # rebuild the output history from the restored output
+        self._output_history = None
+
+        if cell_class is not None:
+            cells = self._init_lazy_cells(cell_class, world_views, **kwargs)
+            self.world.neighbourhood = checkpoint.neighbourhood(nodes=cells)
+        else:
+            cells = self._sorted_cells()
+        checkpoint.restore_cells(cells)
+        return checkpoint
 
-    def init_cells(self, cell_class, world_views=None, **kwargs):
+    def _sorted_cells(self):
+        """Cells of the world with a position (`cell.index`) ordered by
+        position, cells without a position are skipped.
+        """
+        return sorted(
+            (
+                cell
+                for cell in getattr(self.world, "cells", ())
+                if cell.index is not None
+            ),
+            key=lambda cell: cell.index,
+        )
+
+    def _countries_as_names(self):
+        """Convert country (and region) codes to names or compact codes"""
+        settings = self.lpjml.config.coupled_config.lpjml_settings
+        if not settings.country_code_to_name:
+            return
+        for static in ("country", "region"):
+            data = getattr(self.lpjml, static, None)
+            if data is None:
+                continue
+            # cached lookup table instead of lpjml.code_to_name
+            names = code_names(
+                self.lpjml.config,
+                static,
+                iso=settings.iso_country_code,
+                cache_dir=self._country_cache,
+            )
+            setattr(self, f"{static}_names", names)
+            if self._country_encoding == "codes":
+                data.values = data.values.astype(np.int16)
+            else:
+                data.values = decode(data.values, names)
+                data.attrs["long_name"] = (
+                    f"{static} iso alpha-3 code"
+                    if static == "country" and settings.iso_country_code
+                    else f"{static} name"
+                )
+
+    def init_cells(
+        self,
+        cell_class,
+        world_views=None,
+        lazy=False,
+        neighbourhood="networkx",
+        select=None,
+        on_access=False,
+        **kwargs,
+    ):
         """Initialize cell instances for each corresponding cell via numpy
             views.
 
@@ -129,20 +658,181 @@ class Component:
             xarray.DataSet, pycoupler.LPJmLData or pycoupler.LPJmLDataSet
             to generate cell views from, to access corresponding cell entity
             data.
+        lazy : bool, optional
+            If True, cells only hold their index and resolve `input`,
+            `output`, `grid`, `country`, `area` and the `world_views` on
+            access as numpy views into the world buffers instead of creating
+            xarray views for each cell upfront. This reduces the startup
+            time and the memory footprint per cell considerably for large
+            grids. Required for a shared world (`share_world`,
+            `init_scheduler`) and a "ring" output history. Defaults to
+            False.
+        neighbourhood : str, optional
+            Backend of the world neighbourhood. "networkx" (default) builds
+            a `networkx.Graph` of the cells, "csr" stores the neighbourhood
+            compactly as `pycopanlpjml.Neighbourhood` (CSR index arrays)
+            with vectorized neighbour reductions and builds the networkx
+            graph only on demand.
+        select : array_like, list of str, dict or callable, optional
+            Only create cells of a selection of the cells (a boolean mask,
+            cell positions, countries, a lat/lon box or a predicate on the
+            world, see `pycopanlpjml.World.select_cells`). The neighbourhood
+            only connects selected cells. `world.input` and `world.output`
+            still cover all cells of LPJmL. Defaults to None (all cells).
+        on_access : bool, optional
+            If True, the (selected) cells are only created on first access
+            via ``world.cells[index]`` (see `pycopanlpjml.cell.LazyCells`),
+            iterating over `world.cells` creates all of them. Cells are lazy
+            (see `lazy`), requires ``neighbourhood="csr"``. Defaults to
+            False.
         kwargs : dict, optional
             Additional keyword arguments for cell instances.
 
+        Examples
+        --------
+        >>> model.init_cells(
+        ...     cell_class=lpjml.Cell,
+        ...     select=["DEU", "FRA"],
+        ...     on_access=True,
+        ...     neighbourhood="csr",
+        ... )
+        >>> cell = model.world.cells[27410]
         """
         # https://docs.xarray.dev/en/stable/user-guide/indexing.html#copies-vs-views
 
+        # compact storage before cells hold views of the world arrays
+        self._compact_world()
+        if self._input_tracking == "marked" and not (lazy or on_access):
+            raise ValueError(
+                "Writes to the input views of cells are not tracked in"
+                " 'marked' input tracking, use init_cells(lazy=True)."
+            )
+        if self._output_history_mode == "ring" and not (lazy or on_access):
+            raise ValueError(
+                "Output views of cells go stale with a 'ring' output history,"
+                " which rebinds the output arrays each year, use"
+                " init_cells(lazy=True)."
+            )
+        if self.shared_world is not None and not (lazy or on_access):
+            raise RuntimeError(
+                "Cells of a shared world have to resolve their data lazily,"
+                " use init_cells(lazy=True)."
+            )
+
         # Get neighbourhood of surrounding cells as matrix
         #   (cell, neighbour cells)
         neighbour_matrix = self.lpjml.grid.get_neighbourhood(id=False)
 
+        positions = None
+        if select is not None:
+            positions = self.world.select_cells(select)
+
         # Create cell instances
-        cells = [
+        if on_access:
+            if neighbourhood != "csr":
+                raise ValueError(
+                    "Cells created on access require the 'csr' neighbourhood."
+                )
+            self._register_cell_views(world_views)
+            if positions is None:
+                positions = np.arange(self.lpjml.ncell)
+            cells = LazyCells(
+                lambda index: cell_class(
+                    world=self.world, index=index, **kwargs
+                ),
+                positions,
+            )
+            # keep cells registered before
+            for cell in self.world.cells:
+                cells.add(cell)
+            self.world._cells = cells
+        elif lazy:
+            cells = self._init_lazy_cells(
+                cell_class, world_views, positions=positions, **kwargs
+            )
+        else:
+            cells = self._init_cell_views(
+                cell_class, world_views, positions=positions, **kwargs
+            )
+
+        if positions is not None and not on_access:
+            # nodes by position
+            cells = dict(zip(positions.tolist(), cells))
+        self._init_neighbourhood(
+            cells, neighbour_matrix, neighbourhood, positions=positions
+        )
+
+    def _register_cell_views(self, world_views):
+        """Register world views to be resolved by lazy cells on access and
+        mark inputs set through the cell views for the `input_tracker`.
+        """
+        self.world._cell_views = tuple(
+            view for view in world_views or () if hasattr(self.world, view)
+        )
+        if self._input_tracking is not None:
+            self.world._write_hooks = {"input": self._mark_input}
+
+    def _mark_input(self, name, index):
+        """Mark input `name` of the cell at `index` as changed."""
+        self.input_tracker.mark_dirty(name, index)
+
+    def _init_lazy_cells(
+        self, cell_class, world_views=None, positions=None, **kwargs
+    ):
+        """Create cell instances holding only their index."""
+        self._register_cell_views(world_views)
+        if positions is None:
+            positions = self.lpjml.get_cells(id=False)
+        return [
+            cell_class(world=self.world, index=icell, **kwargs)
+            for icell in positions
+        ]
+
+    def _init_neighbourhood(
+        self, cells, neighbour_matrix, backend, positions=None
+    ):
+        """Build the world neighbourhood of `cells` (cell at each position
+        or mapping of position and cell) from the neighbour matrix with the
+        given backend ("networkx" or "csr"), connecting only the cells at
+        `positions` if given.
+        """
+        if backend not in ("networkx", "csr"):
+            raise ValueError(
+                f"Unknown neighbourhood backend '{backend}', must be"
+                " 'networkx' or 'csr'."
+            )
+        pairs = neighbour_pairs(neighbour_matrix)
+        if positions is not None:
+            selected = np.zeros(np.shape(neighbour_matrix)[0], dtype=bool)
+            selected[positions] = True
+            pairs = pairs[selected[pairs].all(axis=1)]
+
+        if backend == "csr":
+            self.world.neighbourhood = Neighbourhood.from_pairs(
+                pairs, np.shape(neighbour_matrix)[0], nodes=cells
+            )
+            return
+
+        # Build neighbourhood graph nodes from cells
+        self.world.neighbourhood.add_nodes_from(
+            cells.values() if isinstance(cells, dict) else cells
+        )
+
+        # Create neighbourhood graph edges from neighbour matrix in one bulk
+        #   operation, cells resolve their neighbours from the graph
+        self.world.neighbourhood.add_edges_from(
+            (cells[icell], cells[neighbour])
+            for icell, neighbour in pairs.tolist()
+        )
+
+    def _init_cell_views(
+        self, cell_class, world_views=None, positions=None, **kwargs
+    ):
+        """Create cell instances holding xarray views of the world data."""
+        return [
             cell_class(
                 world=self.world,
+                index=icell,
                 input=self.world.input.isel(cell=icell),
                 output=self.world.output.isel(cell=icell),
                 grid=self.world.grid.isel(cell=icell),
@@ -167,70 +857,340 @@ class Component:
                 ),
                 **kwargs,
             )
-            for icell in self.lpjml.get_cells(id=False)
+            for icell in (
+                self.lpjml.get_cells(id=False)
+                if positions is None
+                else positions
+            )
         ]
-        # Build neighbourhood graph nodes from cells
-        self.world.neighbourhood.add_nodes_from(cells)
 
-        # Create neighbourhood graph edges from neighbour matrix
-        for icell in self.lpjml.get_cells(id=False):
-            for neighbour in neighbour_matrix.isel(cell=icell).values:
-                if neighbour >= 0:  # Ignore negative values (-1 or NaN)
-                    self.world.neighbourhood.add_edge(
-                        cells[icell], cells[neighbour]
-                    )  # noqa
+    @property
+    def exchange_pending(self):
+        """Whether an exchange with LPJmL has begun but not yet finished."""
+        return self._exchange is not None
 
-        # Add neighbourhood subgraph for each cell
-        for icell in self.lpjml.get_cells(id=False):
-            cells[icell].neighbourhood = self.world.neighbourhood.neighbors(
-                cells[icell]
-            )
+    @property
+    def exchange_future(self):
+        """Future of the output of the pending exchange (None if no
+        exchange is pending), done once the output has been received.
+        """
+        return None if self._exchange is None else self._exchange[1]
 
-    def update_lpjml(self, t):
-        """Exchange input and output data with LPJmL. Update output in world.
-        Update corresponding time stamps in input and output attributes.
+    def begin_exchange(self, t):
+        """Begin the exchange of input and output data with LPJmL.
+
+        Sends the input of year `t` to LPJmL and starts receiving and
+        decoding the output of year `t` on a background thread, so that
+        Python side work that does not depend on the output of year `t` can
+        run while LPJmL simulates the year. The exchange is completed by
+        `finish_exchange`, which is the synchronization point: `world.output`
+        is only updated there and holds the output history up to the
+        previous year until then. `world.input` can be modified as soon as
+        this method returns.
 
         Parameters
         ----------
         t : int
             Current time step (year) to exchange data with LPJmL.
 
+        Examples
+        --------
+        >>> model.begin_exchange(t)
+        >>> model.update_social_system(t)  # overlaps with LPJmL
+        >>> model.finish_exchange()  # world.output is up to date for year t
+        """
+        self._send_input(t)
+
+        if self._exchange_executor is None:
+            self._exchange_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="lpjml-exchange"
+            )
+        self._exchange = (
+            t,
+            self._exchange_executor.submit(self._receive_output, t),
+        )
+
+    def _send_input(self, t):
+        """Update the input time values and send the input of year `t` to
+        LPJmL.
         """
+        if self._exchange is not None:
+            raise RuntimeError(
+                f"Exchange of year {self._exchange[0]} has not been finished,"
+                " call finish_exchange() first."
+            )
+
+        if self.output_subscriptions:
+            self._drop_unsubscribed_output()
+
+        # create the on-disk history with the history before the exchange
+        self.output_store
 
         # update input time values
-        self.world.input.time.values[0] = np.datetime64(f"{t+1}-12-31")
+        with self.timer.span("time_update"):
+            self.world.input.time.values[0] = year_end(t + 1)
+
+        inputs = self.world.input
+        if self.input_tracker is not None:
+            # re-encode the changed cells into the wire buffers
+            with self.timer.span("encode_input"):
+                inputs = self.input_tracker.update()
 
         if not hasattr(sys, "_called_from_test"):
             # send input data to lpjml
-            self.lpjml.send_input(self.world.input, t)
-
-            # read output data from lpjml
-            for name, output in self.lpjml.read_output(t).items():
-                self.world.output[name].values[:] = (
-                    xr.concat([self.world.output[name], output[:]], dim="time")
-                    .drop_isel(time=0)
-                    .values[:]
+            with self.timer.span("send_input"):
+                self.lpjml.send_input(inputs, t)
+
+    def _receive_output(self, t):
+        """Read (and decode) the output of year `t` from LPJmL."""
+        with self.timer.span("read_output"):
+            if hasattr(sys, "_called_from_test"):
+                # only update output time values for testing
+                return {}
+            if not self.output_subscriptions:
+                return self.lpjml.read_output(t)
+            # numpy arrays only, unsubscribed outputs are dropped
+            return self._subscribed_output(
+                self.lpjml.read_output(t, to_xarray=False), t
+            )
+
+    def finish_exchange(self):
+        """Finish the exchange begun with `begin_exchange`.
+
+        Blocks until the output of the current year has been received,
+        appends it to the output history in `world.output` (updates output
+        time values) and to the `output_store` (if set) and closes the
+        connection to LPJmL (and releases the `scheduler` and
+        `shared_world`) after the last year. Errors raised while receiving
+        the output are raised here. Completes the year of `timer`.
+
+        Returns
+        -------
+        int
+            Time step (year) of the finished exchange.
+        """
+        if self._exchange is None:
+            raise RuntimeError(
+                "No exchange has been begun, call begin_exchange(t) first."
+            )
+        t, receive = self._exchange
+        try:
+            with self.timer.span("wait_output"):
+                output = receive.result()
+        finally:
+            self._exchange = None
+
+        self._merge_output(output, t)
+        return t
+
+    def _merge_output(self, output, t):
+        """Append the received `output` of year `t` to the output history
+        and the `output_store` and finish year `t`.
+        """
+        with self.timer.span("history_merge"):
+            self.storage_policy.check(output)
+            self.output_history.merge(output)
+        with self.timer.span("time_update"):
+            self.output_history.update_time(t)
+
+        if self._output_store is not None:
+            with self.timer.span("output_store"):
+                # received arrays are not reused, carried forward variables
+                #   are copied from the history
+                self._output_store.append(
+                    {
+                        name: (
+                            output[name]
+                            if name in output
+                            else self.output_history.latest(name).copy()
+                        )
+                        for name in self._output_store.names
+                    },
+                    t,
                 )
 
-            # update output time values
-            self.world.output.time.values[:] = np.array(
-                [
-                    np.datetime64(f"{year}-12-31")
-                    for year in range(
-                        t + 1 - len(self.world.output.time), t + 1
-                    )  # noqa
-                ]
+        self._finish_year(t)
+
+    def _checkpoint_due(self, t):
+        """Whether a checkpoint is saved automatically after year `t`."""
+        return (
+            self._checkpoint_path is not None
+            and self.lpjml.config.write_restart
+            and t == self.lpjml.config.restart_year
+        )
+
+    def _finish_year(self, t):
+        """Save the automatic checkpoint and release the connection and
+        resources after the last year, completes year `t` of `timer`.
+        """
+        if self._checkpoint_due(t):
+            self.save_checkpoint(
+                os.path.join(self._checkpoint_path, f"checkpoint_{t}")
             )
 
-            if t == self.lpjml.config.lastyear:
+        if t == self.lpjml.config.lastyear:
+            if self._exchange_executor is not None:
+                self._exchange_executor.shutdown()
+                self._exchange_executor = None
+            if self._output_store is not None:
+                self._output_store.close()
+            if self.scheduler is not None:
+                self.scheduler.close()
+                self.scheduler = None
+            if self.shared_world is not None:
+                self.shared_world.close()
+                self.shared_world = None
+            if not hasattr(sys, "_called_from_test"):
                 self.lpjml.close()
-        else:
-            # only update output time values for testing
-            self.world.output.time.values[:] = np.array(
-                [
-                    np.datetime64(f"{year}-12-31")
-                    for year in range(
-                        t + 1 - len(self.world.output.time), t + 1
-                    )  # noqa
-                ]
+
+        self.timer.finish_year(t)
+
+    def advance(self, until, t=None, chunk=None):
+        """Fast-forward the coupled simulation with the current input.
+
+        Exchanges the years `t` to `until` with LPJmL in a tight loop while
+        the social model is idle: the current `world.input` is encoded once
+        (or taken from the `input_tracker` buffers) and sent every year,
+        the outputs are received as numpy arrays (without xarray decoding
+        and without the exchange thread) and appended to the output history
+        in batched writes (`pycopanlpjml.OutputHistory.extend`) of `chunk`
+        years each, so that at most `chunk` outputs are held in memory.
+        Control is handed back after year `until`, `world.output` is then
+        up to date as after `update_lpjml(until)`.
+
+        Automatic checkpoints (`checkpoint_path`) are still saved at the
+        restart year, the span is split there. The `timer` records the
+        phases of the whole span as year `until`.
+
+        Parameters
+        ----------
+        until : int
+            Last year to exchange with LPJmL.
+        t : int, optional
+            First year to exchange, has to be the current simulation year
+            of LPJmL (`lpjml.sim_year`, the default).
+        chunk : int, optional
+            Number of years merged into the output history at once,
+            defaults to the length of the output history.
+
+        Returns
+        -------
+        int
+            The last exchanged year (`until`).
+
+        Examples
+        --------
+        >>> year = model.lpjml.sim_year
+        >>> while year <= model.config.lastyear:
+        ...     if model.policy_active(year):
+        ...         model.update(year)
+        ...     else:
+        ...         year = model.advance(until=model.next_policy_year)
+        ...     year += 1
+        """
+        if self._exchange is not None:
+            raise RuntimeError(
+                f"Exchange of year {self._exchange[0]} has not been finished,"
+                " call finish_exchange() first."
             )
+        if t is None:
+            t = self.lpjml.sim_year
+        elif t != self.lpjml.sim_year:
+            raise ValueError(
+                f"Year {t} does not match the simulation year"
+                f" {self.lpjml.sim_year} of LPJmL."
+            )
+        if until < t or until > self.lpjml.config.lastyear:
+            raise ValueError(
+                f"Year {until} is not within the simulation years {t} to"
+                f" {self.lpjml.config.lastyear}."
+            )
+        if chunk is None:
+            chunk = self.output_history.length
+        if chunk < 1:
+            raise ValueError(f"Chunk of {chunk} years must be positive.")
+
+        restart_year = self.lpjml.config.restart_year
+        if self._checkpoint_due(restart_year) and t <= restart_year < until:
+            self._advance(t, restart_year, chunk)
+            t = restart_year + 1
+        return self._advance(t, until, chunk)
+
+    def _advance(self, t, until, chunk):
+        """Exchange the years `t` to `until` with the current input, see
+        `advance`.
+        """
+        if self.output_subscriptions:
+            self._drop_unsubscribed_output()
+        self.output_store
+
+        if self.input_tracker is not None:
+            with self.timer.span("encode_input"):
+                inputs = self.input_tracker.update()
+        else:
+            inputs = {
+                name: encode(cell_values(self.world.input.variables[name]))
+                for name in self.world.input.data_vars
+            }
+
+        for start in range(t, until + 1, chunk):
+            years = list(range(start, min(start + chunk, until + 1)))
+            outputs = []
+            for year in years:
+                if hasattr(sys, "_called_from_test"):
+                    outputs.append({})
+                    continue
+                with self.timer.span("send_input"):
+                    self.lpjml.send_input(inputs, year)
+                with self.timer.span("read_output"):
+                    output = self.lpjml.read_output(year, to_xarray=False)
+                    if self.output_subscriptions:
+                        output = self._subscribed_output(output, year)
+                    outputs.append(output)
+
+            if self._output_store is not None:
+                with self.timer.span("output_store"):
+                    self._store_outputs(outputs, years)
+
+            with self.timer.span("history_merge"):
+                for output in outputs:
+                    self.storage_policy.check(output)
+                self.output_history.extend(outputs, years)
+        with self.timer.span("time_update"):
+            self.world.input.time.values[0] = year_end(until + 1)
+
+        self._finish_year(until)
+        return until
+
+    def _store_outputs(self, outputs, years):
+        """Append the outputs of `years` to the `output_store`, carrying
+        the values of variables missing in an output forward.
+        """
+        previous = {
+            name: self.output_history.latest(name).copy()
+            for name in self._output_store.names
+        }
+        for output, year in zip(outputs, years):
+            values = {
+                name: output[name] if name in output else previous[name]
+                for name in self._output_store.names
+            }
+            self._output_store.append(values, year)
+            previous = values
+
+    def update_lpjml(self, t):
+        """Exchange input and output data with LPJmL. Update output in world.
+        Update corresponding time stamps in input and output attributes.
+
+        Sends the input and reads the output in the calling thread, the
+        result equals `begin_exchange` directly followed by
+        `finish_exchange`.
+
+        Parameters
+        ----------
+        t : int
+            Current time step (year) to exchange data with LPJmL.
+
+        """
+        self._send_input(t)
+        self._merge_output(self._receive_output(t), t)
@@ -0,0 +1,369 @@
+"""Country index and country names of the copan:LPJmL world."""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import xarray as xr
+
+# reductions of CountryIndex.aggregate (ufunc applied via reduceat)
+_REDUCTIONS = {
+    "sum": np.add,
+    "mean": np.add,
+    "min": np.minimum,
+    "max": np.maximum,
+}
+
+
+def _cell_values(values, ncell):
+    """Values of a world array (with the cell dimension first for numpy
+    arrays) as numpy array of one value per cell.
+    """
+    values = np.asarray(getattr(values, "values", values))
+    return values.reshape(ncell)
+
+
+def default_cache_dir():
+    """Directory of the copan:LPJmL cache (``$PYCOPANLPJML_CACHE_DIR`` or
+    ``$XDG_CACHE_HOME/pycopanlpjml``, defaults to ``~/.cache``).
+    """
+    cache_dir = os.environ.get("PYCOPANLPJML_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = os.path.join(
+            os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+            "pycopanlpjml",
+        )
+    return cache_dir
+
+
+def _par_names(config, static):
+    """Code and name of each entry of the ``countrypar``/``regionpar``
+    parameters of the LPJmL configuration.
+    """
+    par = getattr(config, f"{static}par", None)
+    if par is None:
+        par = config.to_dict()[f"{static}par"]
+    return [(int(_get(reg, "id")), str(_get(reg, "name"))) for reg in par]
+
+
+def _get(entry, name):
+    """Item `name` of a dict or attribute of a config entry."""
+    return entry[name] if isinstance(entry, dict) else getattr(entry, name)
+
+
+def _cache_key(par_names, static, iso):
+    """Cache key of the names of `static` ("country" or "region"): the
+    codes and names of the parameters and, for ISO codes, the version of
+    the pycoupler country table.
+    """
+    iso = bool(iso) and static == "country"
+    key = [static, par_names, iso]
+    if iso:
+        import pycoupler
+
+        key.append(getattr(pycoupler, "__version__", None))
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()
+
+
+def code_names(config, static="country", iso=False, cache_dir=None):
+    """Lookup table of the names of the LPJmL country (or region) codes.
+
+    The table is read from the parameters of the LPJmL configuration
+    (``countrypar``/``regionpar``) as in
+    `pycoupler.LPJmLCoupler.code_to_name`. If a `cache_dir` is given, the
+    table is cached on disk keyed by the codes and names of the
+    parameters and the kind of names, so that repeated launches skip the
+    conversion to ISO codes.
+
+    Parameters
+    ----------
+    config : pycoupler.LpjmlConfig
+        LPJmL configuration.
+    static : str, default "country"
+        "country" or "region".
+    iso : bool, default False
+        If True, country names are ISO alpha-3 codes.
+    cache_dir : str or bool, optional
+        Cache directory, True for `default_cache_dir`. Defaults to None
+        (no cache).
+
+    Returns
+    -------
+    numpy.ndarray
+        Names indexed by code.
+    """
+    if cache_dir is True:
+        cache_dir = default_cache_dir()
+    par_names = _par_names(config, static)
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(
+            cache_dir,
+            f"{static}_names_{_cache_key(par_names, static, iso)}.json",
+        )
+        if os.path.exists(cache_file):
+            with open(cache_file) as file:
+                return np.array(json.load(file)["names"])
+
+    names = dict(par_names)
+    if static == "country" and iso:
+        from pycoupler.utils import get_countries
+
+        countries = get_countries()
+        names = {code: countries[name]["code"] for code, name in names.items()}
+    table = [names.get(code, str(code)) for code in range(max(names) + 1)]
+
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write atomically, launches on several nodes may share the cache
+        temp_file = f"{cache_file}.{os.getpid()}"
+        with open(temp_file, "w") as file:
+            json.dump({"static": static, "iso": iso, "names": table}, file)
+        os.replace(temp_file, cache_file)
+    return np.array(table)
+
+
+def decode(codes, names):
+    """Names of `codes` from lookup table `names` (vectorized), codes that
+    are not part of the table are returned as string.
+    """
+    codes = np.asarray(codes)
+    known = (codes >= 0) & (codes < len(names))
+    decoded = names[np.where(known, codes, 0)]
+    if not known.all():
+        decoded = decoded.astype(np.result_type(decoded, codes.astype(str)))
+        decoded[~known] = codes[~known].astype(str)
+    return decoded
+
+
+class CountryIndex:
+    """Index of the cells of each country.
+
+    The cells are grouped by country once: `countries` holds the (sorted)
+    unique countries, `codes` the position of the country of each cell and
+    ``cells[indptr[i]:indptr[i + 1]]`` the (sorted) cell positions of
+    country ``i``. This allows vectorized per-country reductions of world
+    arrays (`aggregate`) and broadcasting per-country values back onto the
+    cell axis (`broadcast`), e.g. to write them into `world.input`.
+
+    If the countries are given as integer codes, a lookup table of the
+    country `names` (see `code_names`) can be supplied, countries are then
+    addressed and labelled by name, the names of the cells are only
+    produced on demand (`cell_names`).
+
+    Parameters
+    ----------
+    country : pycoupler.LPJmLData or numpy.ndarray
+        Country of each cell (one value per cell, e.g. with dimensions
+        (cell, band) of length 1).
+    names : numpy.ndarray, optional
+        Lookup table of the names of the country codes.
+
+    Examples
+    --------
+    >>> index = world.country_index
+    >>> harvest = index.aggregate(
+    ...     world.output.pft_harvestc, how="sum", weights=world.area
+    ... )
+    >>> world.input.with_tillage.values[:, 0, 0] = index.broadcast(
+    ...     {"DEU": 0}, fill_value=1
+    ... )
+    """
+
+    def __init__(self, country, names=None):
+        self.table = names
+        values = np.asarray(getattr(country, "values", country))
+        ncell = values.shape[0]
+        self.countries, codes = np.unique(
+            values.reshape(ncell, -1)[:, 0], return_inverse=True
+        )
+        self.codes = codes.reshape(ncell)
+        self.cells = np.argsort(self.codes, kind="stable")
+        self.indptr = np.zeros(len(self.countries) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.codes, minlength=len(self.countries)),
+            out=self.indptr[1:],
+        )
+
+    @property
+    def ncell(self):
+        """Number of cells."""
+        return len(self.codes)
+
+    @property
+    def ncountry(self):
+        """Number of countries."""
+        return len(self.countries)
+
+    @property
+    def names(self):
+        """Names of the `countries` (the countries without lookup table)."""
+        if self.table is None:
+            return self.countries
+        return decode(self.countries, self.table)
+
+    def cell_names(self):
+        """Country name of each cell."""
+        return self.names[self.codes]
+
+    @property
+    def sizes(self):
+        """Number of cells of each country."""
+        return np.diff(self.indptr)
+
+    def position(self, country):
+        """Position of `country` (name or code) in `countries`."""
+        if self.table is not None and isinstance(country, str):
+            matches = np.flatnonzero(self.names == country)
+            if len(matches) == 0:
+                raise KeyError(
+                    f"Country '{country}' is not part of the index."
+                )
+            return int(matches[0])
+        position = np.searchsorted(self.countries, country)
+        if position == self.ncountry or self.countries[position] != country:
+            raise KeyError(f"Country '{country}' is not part of the index.")
+        return int(position)
+
+    def __getitem__(self, country):
+        """Cell positions of `country`."""
+        position = self.position(country)
+        start, end = self.indptr[position], self.indptr[position + 1]
+        return self.cells[start:end]
+
+    def __contains__(self, country):
+        try:
+            self.position(country)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.names.tolist())
+
+    def partitions(self):
+        """Cell positions of each country as list of arrays."""
+        return np.split(self.cells, self.indptr[1:-1])
+
+    def aggregate(self, values, how="sum", weights=None):
+        """Reduce `values` over the cells of each country.
+
+        Parameters
+        ----------
+        values : numpy.ndarray or xarray.DataArray
+            World array with the cell dimension (first axis for numpy
+            arrays).
+        how : str, default "sum"
+            Reduction, "sum", "mean", "min" or "max".
+        weights : numpy.ndarray or xarray.DataArray, optional
+            Weight of each cell (e.g. `world.area`). "sum" sums the
+            weighted values, "mean" returns the weighted mean. Ignored for
+            "min" and "max".
+
+        Returns
+        -------
+        numpy.ndarray or xarray.DataArray
+            Array with the country dimension (first axis for numpy arrays)
+            instead of the cell dimension, data arrays get the country
+            `names` as coordinate.
+        """
+        if how not in _REDUCTIONS:
+            raise ValueError(
+                f"Unknown aggregation '{how}', must be one of"
+                f" {list(_REDUCTIONS)}."
+            )
+        dims = getattr(values, "dims", None)
+        if dims is not None:
+            axis = values.get_axis_num("cell")
+            data = np.moveaxis(values.values, axis, 0)
+        else:
+            data = np.asarray(values)
+        if data.shape[0] != self.ncell:
+            raise ValueError(
+                f"Length of cell dimension ({data.shape[0]}) does not match"
+                f" the number of cells ({self.ncell})."
+            )
+
+        # contiguous cells of each country
+        data = data[self.cells]
+        shape = (-1,) + (1,) * (data.ndim - 1)
+        if weights is not None and how in ("sum", "mean"):
+            cell_weights = _cell_values(weights, self.ncell)[self.cells]
+            data = data * cell_weights.reshape(shape)
+
+        result = _REDUCTIONS[how].reduceat(data, self.indptr[:-1], axis=0)
+        if how == "mean":
+            if weights is None:
+                total = self.sizes
+            else:
+                total = np.add.reduceat(cell_weights, self.indptr[:-1])
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result = result / total.reshape(shape)
+
+        if dims is None:
+            return result
+        result = np.moveaxis(result, 0, axis)
+        coords = {
+            name: coord
+            for name, coord in values.coords.items()
+            if "cell" not in coord.dims
+        }
+        coords["country"] = self.names
+        return xr.DataArray(
+            result,
+            dims=tuple("country" if dim == "cell" else dim for dim in dims),
+            coords=coords,
+            name=values.name,
+            attrs=values.attrs,
+        )
+
+    def broadcast(self, country_values, fill_value=np.nan):
+        """Broadcast per-country values onto the cell axis.
+
+        Parameters
+        ----------
+        country_values : array_like, xarray.DataArray or dict
+            Values of each country (in the order of `countries`, along the
+            first axis), a data array with the country dimension (labelled
+            by `names`) or a dict of country (name or code) and value,
+            countries that are not part of the index raise a KeyError.
+        fill_value : scalar, default numpy.nan
+            Value of the cells of countries missing in a dict.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array with the cell dimension as first axis.
+        """
+        if isinstance(country_values, dict):
+            values = np.asarray(list(country_values.values()))
+            dtype = np.result_type(values, fill_value)
+            data = np.full(
+                (self.ncountry,) + values.shape[1:], fill_value, dtype
+            )
+            for country, value in country_values.items():
+                data[self.position(country)] = value
+        elif getattr(country_values, "dims", None) is not None:
+            data = np.moveaxis(
+                country_values.sel(country=self.names).values,
+                country_values.get_axis_num("country"),
+                0,
+            )
+        else:
+            data = np.asarray(country_values)
+        if data.shape[0] != self.ncountry:
+            raise ValueError(
+                f"Length of country dimension ({data.shape[0]}) does not"
+                f" match the number of countries ({self.ncountry})."
+            )
+        return data[self.codes]
+
+    def __len__(self):
+        return self.ncountry
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} ncountry={self.ncountry}"
+            f" ncell={self.ncell}>"
+        )
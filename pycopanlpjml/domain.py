@@ -0,0 +1,514 @@
+"""Domain decomposition of the copan:LPJmL world across processes."""
+
+import multiprocessing
+import traceback
+
+import numpy as np
+
+from .cell import Cell
+from .history import OutputHistory
+from .neighbourhood import Neighbourhood
+from .scheduler import _take_cells, partition_cells
+from .world import World
+
+# world attributes sliced into the domains (if set)
+DOMAIN_DATA = ("input", "output", "grid", "country", "area")
+
+
+def decompose(partitions, ndomain):
+    """Group partitions of cells into `ndomain` domains of similar size.
+
+    Consecutive partitions (e.g. spatial blocks of `partition_cells`) are
+    assigned to the same domain, so that domains stay spatially compact.
+
+    Parameters
+    ----------
+    partitions : list of numpy.ndarray
+        Cell positions of each partition.
+    ndomain : int
+        Number of domains.
+
+    Returns
+    -------
+    numpy.ndarray
+        Domain of each cell.
+    """
+    if ndomain > len(partitions):
+        raise ValueError(
+            f"Cannot decompose {len(partitions)} partitions into {ndomain}"
+            " domains, use smaller partitions."
+        )
+    sizes = np.array([len(cells) for cells in partitions])
+    total = sizes.sum()
+    domains = np.zeros(len(partitions), dtype=np.int64)
+    domain, before = 0, 0
+    for ipartition, size in enumerate(sizes):
+        if ipartition > 0 and domain < ndomain - 1:
+            left = len(partitions) - ipartition
+            # next domain if the partition's center is beyond the share of
+            #   the domain or every remaining domain needs a partition
+            if (
+                before + size / 2 > (domain + 1) * total / ndomain
+                or left == ndomain - domain - 1
+            ):
+                domain += 1
+        domains[ipartition] = domain
+        before += size
+    owner = np.empty(sizes.sum(), dtype=np.int64)
+    for cells, domain in zip(partitions, domains):
+        owner[cells] = domain
+    return owner
+
+
+class Domain:
+    """Cells of a rank of a `DomainDecomposition`.
+
+    The local cells of a domain are its owned `cells` followed by its
+    `halo`, the neighbouring cells owned by other domains. Local positions
+    index the cell dimension of the world slices of the rank.
+
+    Attributes
+    ----------
+    rank : int
+        Rank (position) of the domain.
+    cells : numpy.ndarray
+        Sorted (global) positions of the owned cells.
+    halo : numpy.ndarray
+        Sorted (global) positions of the halo cells.
+    neighbourhood : pycopanlpjml.Neighbourhood
+        Neighbourhood of the local cells (local positions), complete for
+        the owned cells.
+    send : dict
+        Rank of each neighbouring domain as key and local positions of the
+        owned cells in its halo as value.
+    recv : dict
+        Rank of each neighbouring domain as key and local positions of the
+        halo cells it owns as value.
+    """
+
+    def __init__(self, rank, cells, halo, neighbourhood, send, recv):
+        self.rank = rank
+        self.cells = cells
+        self.halo = halo
+        self.neighbourhood = neighbourhood
+        self.send = send
+        self.recv = recv
+
+    @classmethod
+    def build(cls, owner, neighbourhood):
+        """Domains of all ranks from the domain of each cell (`owner`) and
+        the neighbourhood of all cells.
+        """
+        ndomain = int(owner.max()) + 1
+        pairs = neighbourhood.pairs
+        source = np.repeat(np.arange(len(owner)), neighbourhood.degree)
+        domains = []
+        for rank in range(ndomain):
+            cells = np.flatnonzero(owner == rank)
+            outside = (owner[source] == rank) & (
+                owner[neighbourhood.indices] != rank
+            )
+            halo = np.unique(neighbourhood.indices[outside])
+            positions = np.concatenate([cells, halo])
+            local = np.full(len(owner), -1, dtype=np.int64)
+            local[positions] = np.arange(len(positions))
+
+            # neighbour pairs with an owned cell
+            owned = (owner[pairs[:, 0]] == rank) | (owner[pairs[:, 1]] == rank)
+            domains.append(
+                (
+                    cells,
+                    halo,
+                    local,
+                    Neighbourhood.from_pairs(
+                        local[pairs[owned]], len(positions)
+                    ),
+                )
+            )
+
+        result = []
+        for rank, (cells, halo, local, local_neighbourhood) in enumerate(
+            domains
+        ):
+            recv = {
+                other: local[halo[owner[halo] == other]]
+                for other in np.unique(owner[halo]).tolist()
+            }
+            send = {}
+            for other, (_, other_halo, _, _) in enumerate(domains):
+                needed = other_halo[owner[other_halo] == rank]
+                if other != rank and len(needed):
+                    send[other] = local[needed]
+            result.append(
+                cls(rank, cells, halo, local_neighbourhood, send, recv)
+            )
+        return result
+
+    @property
+    def positions(self):
+        """(Global) positions of the local cells, owned cells first."""
+        return np.concatenate([self.cells, self.halo])
+
+    @property
+    def peers(self):
+        """Ranks of the neighbouring domains."""
+        return sorted(set(self.send) | set(self.recv))
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} rank={self.rank} ncell={len(self.cells)}"
+            f" nhalo={len(self.halo)}>"
+        )
+
+
+class DomainRank:
+    """The domain of a rank within its process.
+
+    Passed to the step function of a `DomainDecomposition`.
+
+    Attributes
+    ----------
+    domain : Domain
+        The domain of the rank.
+    world : pycopanlpjml.World
+        World of the local cells (owned cells first, then the halo), with
+        the neighbourhood of the local cells.
+    cells : list
+        Cell instances of the owned cells (lazy cells of `world`).
+    halo_cells : list
+        Cell instances of the halo cells. Their world data is updated with
+        the outputs of each year and by `exchange_halo`, other attributes
+        are not synchronized.
+    t : int or None
+        Current time step (year).
+    """
+
+    def __init__(self, domain, world, cell_class, peers):
+        self.domain = domain
+        self.world = world
+        self.t = None
+        self._peers = peers
+        self.world._cell_views = ()
+        cells = [
+            cell_class(world=world, index=index)
+            for index in range(len(domain.cells) + len(domain.halo))
+        ]
+        self.cells = cells[: len(domain.cells)]
+        self.halo_cells = cells[len(domain.cells) :]  # noqa
+        world.neighbourhood = Neighbourhood(
+            domain.neighbourhood.indptr,
+            domain.neighbourhood.indices,
+            nodes=cells,
+            pairs=domain.neighbourhood.pairs,
+        )
+        self.history = OutputHistory(world.output)
+
+    @property
+    def rank(self):
+        """Rank of the domain."""
+        return self.domain.rank
+
+    @property
+    def ncell(self):
+        """Number of owned cells."""
+        return len(self.domain.cells)
+
+    def exchange_halo(self, values):
+        """Fill the halo of `values` with the values of the owning ranks.
+
+        All ranks have to call `exchange_halo` in the same order.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            Array of the local cells (first axis), updated in place.
+
+        Returns
+        -------
+        numpy.ndarray
+            `values`.
+        """
+        # pairwise exchanges in the same order on all ranks (lower rank
+        #   sends first), so that full pipes cannot block each other
+        for other in self.domain.peers:
+            connection = self._peers[other]
+            send = self.domain.send.get(other)
+            if self.rank < other:
+                connection.send(None if send is None else values[send])
+            received = connection.recv()
+            if self.rank > other:
+                connection.send(None if send is None else values[send])
+            if received is not None:
+                values[self.domain.recv[other]] = received
+        return values
+
+    def exchange_input(self, *names):
+        """Fill the halo of the `world.input` variables `names` (defaults
+        to all inputs) with the values of the owning ranks.
+        """
+        for name in names or list(self.world.input.data_vars):
+            variable = self.world.input.variables[name]
+            self.exchange_halo(
+                np.moveaxis(variable.values, variable.get_axis_num("cell"), 0)
+            )
+
+    def _inputs(self):
+        """Input values of the owned cells."""
+        return {
+            name: _take_cells(
+                variable.values,
+                variable.get_axis_num("cell"),
+                slice(None, self.ncell),
+            )
+            for name, variable in self.world.input.data_vars.items()
+        }
+
+    def __repr__(self):
+        return f"<{type(self).__name__} rank={self.rank} ncell={self.ncell}>"
+
+
+def _run_rank(domain, data, cell_class, step, init, connection, peers):
+    """Event loop of a rank process."""
+    try:
+        rank = DomainRank(domain, World(**data), cell_class, peers)
+        if init is not None:
+            init(rank)
+        connection.send(("ready", None))
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+        return
+
+    while True:
+        message, *args = connection.recv()
+        if message == "stop":
+            break
+        try:
+            if message == "output":
+                rank.history.append(*args)
+                result = None
+            elif message == "step":
+                t, output, year = args
+                if output is not None:
+                    rank.history.append(output, year)
+                rank.t = t
+                step(rank, t)
+                result = rank._inputs()
+            elif message == "call":
+                func, kwargs = args
+                result = func(rank, **kwargs)
+            connection.send(("done", result))
+        except Exception:
+            connection.send(("error", traceback.format_exc()))
+
+
+class DomainDecomposition:
+    """Run the social model of a world split into domains on several
+    processes.
+
+    The cells are grouped into `ndomain` spatially compact domains (see
+    `decompose`), each owned by a rank process that holds the `Cell`
+    instances and the slices of the world arrays of its cells and of
+    their neighbours in other domains (halo). The model process
+    (coordinator) keeps the connection to LPJmL: per year it scatters the
+    latest output to the ranks, runs `step(rank, t)` on all ranks in
+    parallel, gathers the input of the owned cells of each rank into
+    `world.input` and exchanges it with LPJmL (`Component.update_lpjml`).
+
+    Within `step`, neighbour data at domain boundaries is exchanged
+    directly between the ranks (`DomainRank.exchange_halo` and
+    `DomainRank.exchange_input`). Ranks communicate via
+    `multiprocessing` pipes, so that decompositions can be run (and
+    tested) on a single node.
+
+    Parameters
+    ----------
+    model : pycopanlpjml.Component
+        Model with the world (`input`, `output`, `grid`, ...).
+    ndomain : int
+        Number of domains (rank processes).
+    step : callable
+        Function ``step(rank, t)`` updating the owned cells of a
+        `DomainRank` (e.g. writing `rank.world.input`), has to be picklable
+        for process start methods other than "fork".
+    cell_class : type, default pycopanlpjml.Cell
+        Cell class of the rank cells (created lazily).
+    init : callable, optional
+        Function ``init(rank)`` run once on each rank, e.g. to initialize
+        cell attributes.
+    by : str, default "block"
+        Partitioning of the cells into domains, "block" or "country", see
+        `pycopanlpjml.scheduler.partition_cells`.
+    size : float, default 10.0
+        Edge length of the blocks in degrees.
+    context : str, optional
+        `multiprocessing` start method, defaults to the platform default.
+
+    Examples
+    --------
+    >>> def step(rank, t):
+    ...     rank.exchange_input("with_tillage")
+    ...     tillage = rank.world.neighbourhood.neighbour_mean(
+    ...         rank.world.input.with_tillage
+    ...     )
+    ...     rank.world.input.with_tillage.values[: rank.ncell] = (
+    ...         tillage[: rank.ncell] > 0.5
+    ...     )
+    >>> with DomainDecomposition(model, ndomain=4, step=step) as domains:
+    ...     for year in model.lpjml.get_sim_years():
+    ...         domains.update(year)
+    """
+
+    def __init__(
+        self,
+        model,
+        ndomain,
+        step,
+        cell_class=Cell,
+        init=None,
+        by="block",
+        size=10.0,
+        context=None,
+    ):
+        self.model = model
+        world = model.world
+        if isinstance(world.neighbourhood, Neighbourhood):
+            neighbourhood = world.neighbourhood
+        else:
+            neighbourhood = Neighbourhood.from_neighbour_matrix(
+                model.lpjml.grid.get_neighbourhood(id=False)
+            )
+        self.owner = decompose(
+            partition_cells(world, by=by, size=size), ndomain
+        )
+        self.domains = Domain.build(self.owner, neighbourhood)
+        self._output_year = None
+
+        context = multiprocessing.get_context(context)
+        pipes = {}
+        for domain in self.domains:
+            for other in domain.peers:
+                if domain.rank < other:
+                    pipes[domain.rank, other] = context.Pipe()
+        self._connections = []
+        self._processes = []
+        for domain in self.domains:
+            peers = {
+                other: pipes[min(domain.rank, other), max(domain.rank, other)][
+                    int(domain.rank > other)
+                ]
+                for other in domain.peers
+            }
+            positions = domain.positions
+            data = {
+                attribute: getattr(world, attribute).isel(cell=positions)
+                for attribute in DOMAIN_DATA
+                if getattr(world, attribute, None) is not None
+            }
+            data["country_names"] = getattr(model, "country_names", None)
+            connection, child = context.Pipe()
+            process = context.Process(
+                target=_run_rank,
+                args=(domain, data, cell_class, step, init, child, peers),
+                name=f"lpjml-domain-{domain.rank}",
+                daemon=True,
+            )
+            process.start()
+            self._connections.append(connection)
+            self._processes.append(process)
+        self._collect()
+
+    @property
+    def ndomain(self):
+        """Number of domains."""
+        return len(self.domains)
+
+    def _collect(self):
+        """Results of all ranks, raises errors of the ranks."""
+        results, errors = [], []
+        for rank, connection in enumerate(self._connections):
+            status, result = connection.recv()
+            if status == "error":
+                errors.append(f"Rank {rank}:\n{result}")
+            results.append(result)
+        if errors:
+            self.close()
+            raise RuntimeError("\n".join(errors))
+        return results
+
+    def _scatter_output(self, domain):
+        """Latest output of the local cells of `domain` (None if the ranks
+        hold the latest output).
+        """
+        if self._output_year is None:
+            return None
+        history = self.model.output_history
+        output = {}
+        for name in history.output.data_vars:
+            variable = history.output.variables[name]
+            dims = [dim for dim in variable.dims if dim != "time"]
+            output[name] = np.take(
+                history.latest(name), domain.positions, axis=dims.index("cell")
+            )
+        return output
+
+    def update(self, t):
+        """Run the step of year `t` on all ranks, gather the input and
+        exchange it with LPJmL.
+        """
+        for domain, connection in zip(self.domains, self._connections):
+            connection.send(
+                ("step", t, self._scatter_output(domain), self._output_year)
+            )
+        self._output_year = None
+        inputs = self._collect()
+
+        for domain, values in zip(self.domains, inputs):
+            for name, rank_values in values.items():
+                variable = self.model.world.input.variables[name]
+                axis = variable.get_axis_num("cell")
+                variable.values[(slice(None),) * axis + (domain.cells,)] = (
+                    rank_values
+                )
+        self.model.update_lpjml(t)
+        self._output_year = t
+
+    def call(self, func, **kwargs):
+        """Run ``func(rank, **kwargs)`` on all ranks.
+
+        Returns
+        -------
+        list
+            Results of the ranks (picklable).
+        """
+        if self._output_year is not None:
+            # the ranks work on the latest output
+            for domain, connection in zip(self.domains, self._connections):
+                connection.send(
+                    ("output", self._scatter_output(domain), self._output_year)
+                )
+            self._output_year = None
+            self._collect()
+        for connection in self._connections:
+            connection.send(("call", func, kwargs))
+        return self._collect()
+
+    def close(self):
+        """Stop the rank processes."""
+        for connection in self._connections:
+            try:
+                connection.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"<{type(self).__name__} ndomain={self.ndomain}>"
@@ -0,0 +1,267 @@
+"""Ensembles of concurrently coupled copan:LPJmL simulations."""
+
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def free_port(host="localhost"):
+    """Port on `host` that is currently not in use."""
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class EnsembleMember:
+    """A coupled simulation of an `Ensemble`.
+
+    Attributes
+    ----------
+    name : str
+        Name of the member.
+    port : int or None
+        Port of the LPJmL coupler (None for attached models).
+    model : pycopanlpjml.Component or None
+        The model, set once connected.
+    years : list of int
+        Simulation years to exchange.
+    completed : int
+        Number of exchanged years.
+    error : Exception or None
+        Error that stopped the member.
+    """
+
+    def __init__(self, name, model=None, factory=None, port=None):
+        self.name = name
+        self.model = model
+        self.factory = factory
+        self.port = port
+        self.years = []
+        self.completed = 0
+        self.error = None
+        self.step_seconds = 0.0
+        self._start = None
+        self._end = None
+
+    @property
+    def done(self):
+        """Whether all years are exchanged (or the member failed)."""
+        return self.error is not None or self.completed == len(self.years)
+
+    @property
+    def seconds(self):
+        """Wall clock time of the member's run in seconds."""
+        if self._start is None:
+            return 0.0
+        end = time.perf_counter() if self._end is None else self._end
+        return end - self._start
+
+    @property
+    def years_per_second(self):
+        """Throughput of the member in simulation years per second."""
+        seconds = self.seconds
+        return self.completed / seconds if seconds > 0 else 0.0
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} name='{self.name}'"
+            f" completed={self.completed}/{len(self.years)}>"
+        )
+
+
+class Ensemble:
+    """Drive the exchanges of several coupled simulations concurrently.
+
+    Each member is a `pycopanlpjml.Component` connected to its own LPJmL
+    instance. Members are given as model (attached to a running coupler)
+    or as factory called with a free port (allocated by the ensemble) that
+    creates the model, optionally after starting LPJmL via `launch`. The
+    factories are called concurrently, so that the couplers wait for their
+    LPJmL instances in parallel (`connect`).
+
+    `run` drives all members through their simulation years with an event
+    loop on the calling thread: the exchange of each member is begun with
+    `Component.begin_exchange` and the member whose LPJmL instance
+    delivers its output first is finished (`Component.finish_exchange`)
+    and continued with its next year. Slow members therefore do not hold
+    back the others and the Python side work of a member (`step`) overlaps
+    with the simulation of the other members. All model code runs on the
+    calling thread.
+
+    Parameters
+    ----------
+    members : dict
+        Member name as key and `pycopanlpjml.Component` or callable
+        ``factory(port)`` returning the model as value.
+    step : callable, optional
+        Function ``step(model, year)`` run before the exchange of each year
+        (e.g. the social model update, without `update_lpjml`).
+    launch : callable, optional
+        Function ``launch(name, port)`` run before the factory of a member,
+        e.g. to start LPJmL (`pycoupler.run_lpjml`) or a stand-in.
+    host : str, default "localhost"
+        Host to allocate the ports on.
+
+    Examples
+    --------
+    >>> def member(rate):
+    ...     return lambda port: Model(
+    ...         config_file=f"config_{rate}.json", rate=rate, lpjml_port=port
+    ...     )
+    >>> ensemble = Ensemble(
+    ...     {f"rate_{rate}": member(rate) for rate in (0.5, 1.0, 1.5)},
+    ...     step=lambda model, year: model.update_social(year),
+    ...     launch=start_lpjml,
+    ... )
+    >>> ensemble.run()
+    >>> ensemble.report()
+    """
+
+    def __init__(self, members, step=None, launch=None, host="localhost"):
+        self.step = step
+        self.launch = launch
+        self.members = {}
+        for name, member in members.items():
+            if hasattr(member, "begin_exchange"):
+                self.members[name] = EnsembleMember(name, model=member)
+            else:
+                self.members[name] = EnsembleMember(
+                    name, factory=member, port=free_port(host)
+                )
+
+    @property
+    def ports(self):
+        """Allocated coupler port of each member with a factory."""
+        return {
+            name: member.port
+            for name, member in self.members.items()
+            if member.port is not None
+        }
+
+    @property
+    def models(self):
+        """Model of each member."""
+        return {name: member.model for name, member in self.members.items()}
+
+    def _create(self, member):
+        if self.launch is not None:
+            self.launch(member.name, member.port)
+        return member.factory(member.port)
+
+    def connect(self):
+        """Create the models of all members with a factory concurrently."""
+        pending = [
+            member
+            for member in self.members.values()
+            if member.model is None and member.error is None
+        ]
+        if not pending:
+            return
+        with ThreadPoolExecutor(
+            max_workers=len(pending), thread_name_prefix="ensemble-connect"
+        ) as executor:
+            futures = {
+                member: executor.submit(self._create, member)
+                for member in pending
+            }
+        for member, future in futures.items():
+            try:
+                member.model = future.result()
+            except Exception as error:
+                member.error = error
+
+    def _begin(self, member):
+        """Run the step of the next year of `member` and begin its
+        exchange, returns the future of the exchange.
+        """
+        year = member.years[member.completed]
+        start = time.perf_counter()
+        if self.step is not None:
+            self.step(member.model, year)
+        member.step_seconds += time.perf_counter() - start
+        member.model.begin_exchange(year)
+        return member.model.exchange_future
+
+    def run(self, raise_errors=True):
+        """Exchange all simulation years of all members.
+
+        Parameters
+        ----------
+        raise_errors : bool, default True
+            If True, a RuntimeError is raised after all other members have
+            finished if members failed. Otherwise the errors are only
+            reported (see `report`).
+
+        Returns
+        -------
+        dict
+            Report of the members, see `report`.
+        """
+        self.connect()
+        pending = {}
+        for member in self.members.values():
+            if member.error is not None:
+                continue
+            member.years = list(member.model.lpjml.get_sim_years())
+            member.completed = 0
+            member._start = time.perf_counter()
+            self._advance(member, pending)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                member = pending.pop(future)
+                try:
+                    member.model.finish_exchange()
+                except Exception as error:
+                    member.error = error
+                    member._end = time.perf_counter()
+                    continue
+                member.completed += 1
+                self._advance(member, pending)
+
+        failed = {
+            name: member.error
+            for name, member in self.members.items()
+            if member.error is not None
+        }
+        if failed and raise_errors:
+            raise RuntimeError(
+                f"Ensemble members {list(failed)} failed."
+            ) from next(iter(failed.values()))
+        return self.report()
+
+    def _advance(self, member, pending):
+        """Begin the next year of `member` or mark it as finished."""
+        if member.done:
+            member._end = time.perf_counter()
+            return
+        try:
+            pending[self._begin(member)] = member
+        except Exception as error:
+            member.error = error
+            member._end = time.perf_counter()
+
+    def report(self):
+        """Throughput of each member.
+
+        Returns
+        -------
+        dict
+            Member name as key and dict of the exchanged `years`, the total
+            `seconds`, the `step_seconds` spent in `step`, the
+            `years_per_second` and the `error` (or None) as value.
+        """
+        return {
+            name: {
+                "years": member.completed,
+                "seconds": member.seconds,
+                "step_seconds": member.step_seconds,
+                "years_per_second": member.years_per_second,
+                "error": member.error,
+            }
+            for name, member in self.members.items()
+        }
+
+    def __repr__(self):
+        return f"<{type(self).__name__} members={list(self.members)}>"
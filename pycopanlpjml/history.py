@@ -0,0 +1,301 @@
+"""Output history of the copan:LPJmL world."""
+
+import numpy as np
+
+
+def year_end(years):
+    """Get the last day of each year (31 December) as numpy.datetime64.
+
+    Parameters
+    ----------
+    years : int or array_like
+        Year(s) to get the last day of.
+
+    Returns
+    -------
+    numpy.datetime64 or numpy.ndarray
+        Date(s) of the last day of the year(s).
+    """
+    next_year = (np.asarray(years) - 1969).astype("datetime64[Y]")
+    return next_year.astype("datetime64[D]") - np.timedelta64(1, "D")
+
+
+def _take(axis, index):
+    """Indexing tuple to select `index` along `axis`."""
+    return (slice(None),) * axis + (index,)
+
+
+class OutputHistory:
+    """Time history of LPJmL outputs held in the world output dataset.
+
+    Appends the output of each simulation year to the (fixed length) time
+    series of the world output dataset in place, dropping the oldest year,
+    and updates the time coordinate accordingly.
+
+    Two storage modes are available:
+
+    * ``"shift"`` (default): the history is shifted by one year in the
+      existing arrays. The arrays (and hence cell views created via
+      `isel`) stay the same, the cost of a step grows with the length of
+      the history.
+    * ``"ring"``: each variable is backed by a preallocated ring buffer
+      holding the history twice (a mirrored buffer, with time as slowest
+      axis). A new year is written into the slot of the oldest year (and
+      its mirror) and the head index is advanced, the world output
+      variables are rebound to the contiguous, time ordered window of the
+      buffer without copying. The
+      cost of a step does not depend on the length of the history. Since
+      the variables are rebound, cells should resolve their output lazily
+      (``Component.init_cells(lazy=True)``) instead of holding `isel`
+      views.
+
+    Variables named in `latest` keep no history: only their latest time
+    step is updated in place (the earlier time steps are not maintained),
+    which saves shifting (or buffering) them every year.
+
+    Parameters
+    ----------
+    output : pycoupler.LPJmLDataSet
+        World output dataset with a time dimension.
+    mode : str, optional
+        Storage mode, "shift" (default) or "ring".
+    latest : list of str, optional
+        Variables of which only the latest time step is kept.
+    """
+
+    def __init__(self, output, mode="shift", latest=()):
+        if mode not in ("shift", "ring"):
+            raise ValueError(
+                f"Unknown output history mode '{mode}', must be 'shift' or"
+                " 'ring'."
+            )
+        self.output = output
+        self.mode = mode
+        self.length = output.sizes["time"]
+        self.latest_only = frozenset(latest)
+
+        if mode == "ring":
+            # mirrored buffers: the window [head, head + length) is always
+            #   the time ordered history
+            self._head = 0
+            self._buffers = {}
+            for name in output.data_vars:
+                if name in self.latest_only:
+                    continue
+                variable = output.variables[name]
+                axis = variable.get_axis_num("time")
+                # time as first (slowest) axis, each slot is contiguous
+                values = np.moveaxis(variable.values, axis, 0)
+                buffer = np.empty(
+                    (2 * self.length,) + values.shape[1:], dtype=values.dtype
+                )
+                buffer[: self.length] = values  # noqa
+                buffer[self.length :] = values  # noqa
+                self._buffers[name] = (buffer, axis)
+            times = output.time.values
+            self._times = np.concatenate([times, times])
+            self._bind()
+
+    @property
+    def years(self):
+        """Simulation years of the history."""
+        years = self.output.time.values.astype("datetime64[Y]")
+        return years.astype(int) + 1970
+
+    def window(self, name):
+        """Time ordered history of variable `name` as numpy view."""
+        if self.mode == "shift" or name in self.latest_only:
+            return self.output.variables[name].values
+        buffer, axis = self._buffers[name]
+        window = buffer[self._head : self._head + self.length]  # noqa
+        return np.moveaxis(window, 0, axis)
+
+    def latest(self, name):
+        """Latest year of variable `name` as numpy view."""
+        return self.window(name)[
+            _take(self.output.variables[name].get_axis_num("time"), -1)
+        ]
+
+    def _bind_values(self):
+        """Rebind the world output variables to the current ring window."""
+        for name in self._buffers:
+            self.output.variables[name].data = self.window(name)
+
+    def _bind_time(self):
+        """Set the world output time values to the current ring window."""
+        window = slice(self._head, self._head + self.length)
+        self.output.time.values[:] = self._times[window]
+
+    def _bind(self):
+        self._bind_values()
+        self._bind_time()
+
+    def append(self, output, year):
+        """Append the output of `year` to the history.
+
+        Equals `merge` followed by `update_time`.
+
+        Parameters
+        ----------
+        output : dict or pycoupler.LPJmLDataSet
+            Output of a single year, variable name as key and array of
+            dimensions (cell, band[, time]) as value. Variables that are
+            not included in `output` carry their latest values forward,
+            variables that are not part of the history are ignored.
+        year : int
+            Simulation year of the output.
+        """
+        self.merge(output)
+        self.update_time(year)
+
+    def merge(self, output):
+        """Append the values of a year to the history, dropping the oldest
+        year. See `append` for `output`.
+        """
+        for name in self.latest_only.intersection(output):
+            self._write_latest(name, output[name])
+
+        if self.mode == "ring":
+            slot = self._head
+            for name, (buffer, axis) in self._buffers.items():
+                if name in output:
+                    values = output[name]
+                    values = np.asarray(getattr(values, "values", values))
+                    if values.ndim == buffer.ndim:
+                        values = np.moveaxis(values, axis, 0)
+                    buffer[slot] = values.reshape(buffer.shape[1:])
+                else:
+                    buffer[slot] = buffer[slot - 1 + self.length]
+                buffer[slot + self.length] = buffer[slot]
+            self._head = (slot + 1) % self.length
+            self._bind_values()
+        else:
+            for name in self.output.data_vars:
+                if name in self.latest_only:
+                    continue
+                variable = self.output.variables[name]
+                axis = variable.get_axis_num("time")
+                history = variable.values
+                history[_take(axis, slice(None, -1))] = history[
+                    _take(axis, slice(1, None))
+                ]
+                # the latest values remain if no output is supplied
+                if name in output:
+                    self._write_latest(name, output[name])
+
+    def extend(self, outputs, years):
+        """Append the outputs of consecutive `years` to the history in one
+        step.
+
+        In "shift" mode the history is shifted once by the number of years
+        instead of once per year. Variables that are not included in an
+        output carry the values of the previous year forward.
+
+        Parameters
+        ----------
+        outputs : list of dict
+            Output of each year, see `append`.
+        years : list of int
+            Consecutive simulation years of the outputs.
+        """
+        if len(outputs) != len(years):
+            raise ValueError(
+                f"Number of outputs ({len(outputs)}) does not match the"
+                f" number of years ({len(years)})."
+            )
+        if not outputs:
+            return
+        if self.mode == "ring":
+            # writing a slot does not depend on the length of the history
+            for output in outputs:
+                self.merge(output)
+            self._write_ring_times(years)
+            return
+
+        nyear = len(outputs)
+        for name in self.output.data_vars:
+            if name in self.latest_only:
+                for output in reversed(outputs):
+                    if name in output:
+                        self._write_latest(name, output[name])
+                        break
+                continue
+            variable = self.output.variables[name]
+            axis = variable.get_axis_num("time")
+            history = variable.values
+            keep = max(self.length - nyear, 0)
+            previous = self.latest(name).copy()
+            if keep:
+                history[_take(axis, slice(None, keep))] = history[
+                    _take(axis, slice(self.length - keep, None))
+                ]
+            # years before the history window only carry values forward
+            for iyear, output in enumerate(outputs):
+                if name in output:
+                    previous = output[name]
+                slot = keep + iyear - max(nyear - self.length, 0)
+                if slot >= keep:
+                    values = np.asarray(getattr(previous, "values", previous))
+                    target = history[_take(axis, slot)]
+                    target[...] = values.reshape(target.shape)
+        self.update_time(years[-1])
+
+    def _write_ring_times(self, years):
+        """Set the time values of the ring slots of the latest `years`."""
+        for iyear, year in enumerate(reversed(years)):
+            if iyear == self.length:
+                break
+            slot = (self._head - 1 - iyear) % self.length
+            self._times[[slot, slot + self.length]] = year_end(year)
+        self._bind_time()
+
+    def _write_latest(self, name, values):
+        """Write `values` into the latest time step of variable `name`."""
+        values = np.asarray(getattr(values, "values", values))
+        latest = self.latest(name)
+        latest[...] = values.reshape(latest.shape)
+
+    def update_time(self, year):
+        """Update the time coordinate after merging the output of `year`."""
+        if self.mode == "ring":
+            self._write_ring_times([year])
+        else:
+            self.output.time.values[:] = year_end(
+                np.arange(year + 1 - self.length, year + 1)
+            )
+
+
+class OutputSubscription:
+    """Declared use of an LPJmL output by the Python side.
+
+    Parameters
+    ----------
+    name : str
+        Name of the output.
+    every : int, default 1
+        Merge the output into the history every `every` years (counted from
+        `start`). In the years in between, the received output is dropped
+        and the latest values are carried forward.
+    latest : bool, default False
+        If True, only the latest value of the output is kept (no history).
+    start : int, default 0
+        First year of the interval of `every`.
+    """
+
+    def __init__(self, name, every=1, latest=False, start=0):
+        if every < 1:
+            raise ValueError(f"Interval of output '{name}' must be >= 1.")
+        self.name = name
+        self.every = every
+        self.latest = latest
+        self.start = start
+
+    def due(self, year):
+        """Whether the output of `year` is merged."""
+        return (year - self.start) % self.every == 0
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} name='{self.name}' every={self.every}"
+            f" latest={self.latest}>"
+        )
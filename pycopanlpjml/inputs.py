@@ -0,0 +1,226 @@
+"""Change tracking and wire buffers of the copan:LPJmL world input."""
+
+import functools
+
+import numpy as np
+
+# default number of cells per tracked block
+BLOCK_SIZE = 1024
+
+
+def wire_dtype(dtype):
+    """Dtype of values of `dtype` on the coupler socket (native int32 for
+    integers as `pycoupler.coupler.send_int`, float32 otherwise as
+    `pycoupler.coupler.send_float`).
+    """
+    if np.issubdtype(dtype, np.integer):
+        return np.dtype(np.int32)
+    return np.dtype(np.float32)
+
+
+def encode(values):
+    """Input values as contiguous wire array of shape (ncell, nband).
+
+    The bytes of the array are the values in the order in which pycoupler
+    sends them (cell by cell, bands within each cell). Wire arrays (e.g.
+    `InputTracker.buffers`) are returned without copying.
+    """
+    values = np.asarray(values)
+    values = values.reshape(values.shape[0], -1)
+    return np.ascontiguousarray(values, dtype=wire_dtype(values.dtype))
+
+
+def cell_values(variable):
+    """Values of an input variable with the cell dimension first as array
+    of shape (ncell, nvalue) (a view if possible).
+    """
+    values = np.moveaxis(variable.values, variable.get_axis_num("cell"), 0)
+    return values.reshape(values.shape[0], -1)
+
+
+def send_values(lpjml, data):
+    """Send input values to LPJmL in one socket write.
+
+    Drop-in for `pycoupler.LPJmLCoupler._send_input_values`, which sends
+    each value separately.
+    """
+    lpjml._channel.sendall(encode(data).data)
+
+
+def use_send_values(lpjml):
+    """Let the coupler `lpjml` send each input in one socket write (see
+    `send_values`).
+
+    pycoupler has no public hook to send encoded inputs, so this replaces
+    the private `LPJmLCoupler._send_input_values` and writes to the private
+    socket `LPJmLCoupler._channel` (as of the pycoupler versions pinned in
+    ``pyproject.toml``). Raises a RuntimeError if the coupler lacks either
+    attribute instead of falling back to sending value by value or writing
+    a wrong wire format.
+    """
+    missing = [
+        name
+        for name in ("_send_input_values", "_channel")
+        if not hasattr(lpjml, name)
+    ]
+    if missing:
+        raise RuntimeError(
+            f"Coupler {type(lpjml).__name__} has no {', '.join(missing)},"
+            " input tracking requires a supported pycoupler version (see"
+            " pyproject.toml)."
+        )
+    lpjml._send_input_values = functools.partial(send_values, lpjml)
+
+
+class InputTracker:
+    """Track changes of `world.input` and keep its wire buffers.
+
+    Each input variable is encoded once into a wire buffer (see `encode`)
+    that is sent to LPJmL instead of serializing the input every year. The
+    cells are tracked in blocks of `block_size` cells, `update` re-encodes
+    only the dirty blocks, so that the bytes encoded per year scale with
+    the changed cells instead of the grid size.
+
+    Two modes of detecting changes are available:
+
+    * ``"compare"`` (default): the input is compared block by block with a
+      copy of the last encoded values (vectorized). This detects any
+      write, through the world arrays, cell views (xarray or lazy numpy
+      views), shared memory workers or the `pycopanlpjml.scheduler`, but
+      the comparison reads the whole input every year and the copy doubles
+      its memory (only the encoding scales with the changed cells).
+    * ``"marked"``: only blocks marked via `mark_dirty` are re-encoded, no
+      copy of the input is kept and unchanged inputs are not read at all,
+      so that the cost per year scales with the changed cells. Only marked
+      writes are sent: writes set through the cell views of lazy cells
+      (``cell.input.with_tillage = 0``, see `pycopanlpjml.cell.CellView`)
+      and of the scheduler are marked, direct writes to `world.input` (or
+      into the numpy views of cells, ``cell.input.with_tillage[:] = 0``)
+      have to be marked via `mark_dirty`.
+
+    Parameters
+    ----------
+    input : pycoupler.LPJmLDataSet
+        World input dataset with the cell dimension.
+    mode : str, optional
+        Change detection, "compare" (default) or "marked".
+    block_size : int, optional
+        Number of cells per block, defaults to `BLOCK_SIZE`.
+
+    Examples
+    --------
+    >>> tracker = InputTracker(model.world.input)
+    >>> model.world.input.with_tillage.values[:100] = 0
+    >>> buffers = tracker.update()  # re-encodes the first block only
+    >>> tracker.encoded_bytes
+    4096
+    """
+
+    def __init__(self, input, mode="compare", block_size=BLOCK_SIZE):
+        if mode not in ("compare", "marked"):
+            raise ValueError(
+                f"Unknown input tracking mode '{mode}', must be 'compare' or"
+                " 'marked'."
+            )
+        if block_size < 1:
+            raise ValueError("Block size must be a positive integer.")
+        self.input = input
+        self.mode = mode
+        self.block_size = int(block_size)
+        self.ncell = input.sizes["cell"]
+        self.nblock = -(-self.ncell // self.block_size)
+        self.buffers = {}
+        self._last = {}
+        self._dirty = {}
+        for name in input.data_vars:
+            buffer = encode(self._cell_values(name))
+            if np.may_share_memory(buffer, input.variables[name].values):
+                buffer = buffer.copy()
+            self.buffers[name] = buffer
+            self._dirty[name] = np.zeros(self.nblock, dtype=bool)
+            if mode == "compare":
+                self._last[name] = self._cell_values(name).copy()
+        # bytes of the wire buffers (re-)encoded with the last update
+        self.encoded_bytes = self.nbytes
+
+    @property
+    def nbytes(self):
+        """Size of all wire buffers in bytes."""
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def _cell_values(self, name):
+        """Values of input `name` with the cell dimension first as array of
+        shape (ncell, nvalue).
+        """
+        return cell_values(self.input.variables[name])
+
+    def mark_dirty(self, name=None, cells=None):
+        """Mark cells of an input to be re-encoded with the next `update`.
+
+        Parameters
+        ----------
+        name : str, optional
+            Name of the input, defaults to all inputs.
+        cells : int, slice or array_like, optional
+            Cell positions (or boolean mask along the cell dimension),
+            defaults to all cells.
+        """
+        names = list(self.buffers) if name is None else [name]
+        for name in names:
+            if name not in self.buffers:
+                raise KeyError(f"Input '{name}' is not tracked.")
+            if cells is None:
+                self._dirty[name][:] = True
+                continue
+            positions = np.arange(self.ncell)[cells]
+            self._dirty[name][
+                np.atleast_1d(positions) // self.block_size
+            ] = True
+
+    def dirty_blocks(self, name):
+        """Blocks of input `name` to be re-encoded (boolean mask), the
+        marked blocks and (in "compare" mode) the changed blocks.
+        """
+        dirty = self._dirty[name].copy()
+        if self.mode != "compare":
+            return dirty
+        values, last = self._cell_values(name), self._last[name]
+        changed = values != last
+        if np.issubdtype(values.dtype, np.floating):
+            changed &= ~(np.isnan(values) & np.isnan(last))
+        starts = np.arange(0, self.ncell, self.block_size)
+        dirty |= np.logical_or.reduceat(changed.any(axis=1), starts)
+        return dirty
+
+    def update(self):
+        """Re-encode the dirty blocks of all inputs.
+
+        Returns
+        -------
+        dict
+            Wire buffer of each input, pass to
+            `pycoupler.LPJmLCoupler.send_input`.
+        """
+        if set(self.input.data_vars) != set(self.buffers):
+            raise ValueError(
+                f"Inputs {list(self.input.data_vars)} do not match the"
+                f" tracked inputs {list(self.buffers)}."
+            )
+        self.encoded_bytes = 0
+        for name, buffer in self.buffers.items():
+            dirty = self.dirty_blocks(name)
+            if dirty.any():
+                cells = np.repeat(dirty, self.block_size)[: self.ncell]
+                values = self._cell_values(name)[cells]
+                buffer[cells] = values
+                if self.mode == "compare":
+                    self._last[name][cells] = values
+                self.encoded_bytes += values.shape[0] * buffer[0].nbytes
+            self._dirty[name][:] = False
+        return self.buffers
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} mode='{self.mode}'"
+            f" inputs={list(self.buffers)} nblock={self.nblock}>"
+        )
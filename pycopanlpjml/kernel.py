@@ -0,0 +1,253 @@
+"""Distance-weighted interaction kernels of the copan:LPJmL world."""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .neighbourhood import Neighbourhood
+
+try:
+    from scipy import sparse
+except ModuleNotFoundError:  # pragma: no cover
+    # products are computed with numpy
+    sparse = None
+
+# maximum number of gathered (weight, value) products summed at once
+_CHUNK_SIZE = 2**22
+
+# decay of the weights with the distance d (km) for radius r and scale s
+DECAYS = {
+    "uniform": lambda d, r, s: np.ones_like(d),
+    "linear": lambda d, r, s: 1 - d / r if r > 0 else np.ones_like(d),
+    "exponential": lambda d, r, s: np.exp(-d / s),
+    "gaussian": lambda d, r, s: np.exp(-0.5 * (d / s) ** 2),
+}
+
+
+class DistanceKernel(Neighbourhood):
+    """Sparse distance-weighted interaction kernel of the cells.
+
+    The kernel links each cell with all cells within a great-circle radius,
+    weighted by a decay function of their distance. It is stored as CSR
+    weight matrix (the `Neighbourhood` index arrays and `weights`), so that
+    `apply` computes the weighted sums over the kernel of all cells as one
+    sparse matrix product with any world array (with `scipy.sparse` if it
+    is installed, otherwise with numpy). The unweighted `Neighbourhood`
+    reductions are available as well.
+
+    Use `pycopanlpjml.World.distance_kernel` (or a `KernelCache`) to
+    build a kernel only once per grid and parameters.
+
+    Parameters
+    ----------
+    indptr : numpy.ndarray
+        Index pointer array of length ncell + 1.
+    indices : numpy.ndarray
+        Positions of the cells in the kernel of all cells.
+    weights : numpy.ndarray
+        Weight of each entry of `indices`.
+    distances : numpy.ndarray, optional
+        Distance in km of each entry of `indices`.
+
+    Examples
+    --------
+    >>> kernel = world.distance_kernel(radius_km=200, decay="exponential")
+    >>> pressure = kernel.apply(world.output.cftfrac.isel(time=-1))
+    """
+
+    def __init__(self, indptr, indices, weights, distances=None):
+        super().__init__(indptr, indices)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.distances = distances
+        self._matrix = None
+        if self.weights.shape != self.indices.shape:
+            raise ValueError(
+                f"Number of weights ({self.weights.size}) does not match the"
+                f" number of kernel entries ({self.indices.size})."
+            )
+
+    @classmethod
+    def from_grid_index(
+        cls,
+        index,
+        radius_km,
+        decay="exponential",
+        scale_km=None,
+        include_self=True,
+        normalize=False,
+    ):
+        """Build the kernel of all cells of a grid.
+
+        Parameters
+        ----------
+        index : pycopanlpjml.spatial.GridIndex
+            Spatial index of the grid.
+        radius_km : float
+            Radius of the kernel in km.
+        decay : str or callable, default "exponential"
+            Decay of the weights with the distance, "uniform", "linear"
+            (to 0 at the radius), "exponential" (``exp(-d / scale_km)``),
+            "gaussian" (``exp(-(d / scale_km) ** 2 / 2)``) or a function
+            ``decay(distances_km)`` returning the weights.
+        scale_km : float, optional
+            Decay length in km, defaults to half of the radius.
+        include_self : bool, default True
+            Whether each cell is part of its own kernel.
+        normalize : bool, default False
+            If True, the weights of each cell sum up to 1, `apply` then
+            computes weighted means.
+
+        Returns
+        -------
+        DistanceKernel
+            Kernel of all cells.
+        """
+        if scale_km is None:
+            scale_km = radius_km / 2
+        if not callable(decay) and decay not in DECAYS:
+            raise ValueError(
+                f"Unknown decay '{decay}', must be one of {list(DECAYS)} or"
+                " callable."
+            )
+        if scale_km <= 0 and decay in ("exponential", "gaussian"):
+            raise ValueError(f"Decay scale {scale_km} must be positive.")
+
+        indptr, indices, distances = index.cells_within(
+            index.lon, index.lat, radius_km, return_distance=True
+        )
+        cells = np.repeat(np.arange(index.ncell), np.diff(indptr))
+        if not include_self:
+            others = indices != cells
+            cells, indices = cells[others], indices[others]
+            distances = distances[others]
+            np.cumsum(
+                np.bincount(cells, minlength=index.ncell), out=indptr[1:]
+            )
+
+        if callable(decay):
+            weights = np.asarray(decay(distances), dtype=np.float64)
+        else:
+            weights = DECAYS[decay](distances, radius_km, scale_km)
+        if normalize:
+            totals = np.bincount(cells, weights, minlength=index.ncell)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                weights = weights / totals[cells]
+        return cls(indptr, indices, weights, distances=distances)
+
+    @property
+    def nnz(self):
+        """Number of kernel entries."""
+        return self.indices.size
+
+    def apply(self, values):
+        """Weighted sums of `values` over the kernel of each cell.
+
+        Parameters
+        ----------
+        values : numpy.ndarray or xarray.DataArray
+            World array with the cell dimension (first axis for numpy
+            arrays).
+
+        Returns
+        -------
+        numpy.ndarray or xarray.DataArray
+            Array of the same shape (and type) as `values`, cells with an
+            empty kernel are 0.
+        """
+        data, restore = self._cell_data(values)
+        flat = data.reshape(self.ncell, -1)
+        if sparse is not None:
+            if self._matrix is None:
+                self._matrix = sparse.csr_matrix(
+                    (self.weights, self.indices, self.indptr),
+                    shape=(self.ncell, self.ncell),
+                )
+            result = self._matrix @ flat
+        else:
+            result = self._product(flat)
+        return restore(result.reshape(data.shape))
+
+    def _product(self, flat):
+        """Weighted sums of `flat` (ncell, nvalue) with numpy."""
+        result = np.zeros(flat.shape, dtype=np.result_type(flat, self.weights))
+        degree = self.degree
+
+        # cells in chunks of a bounded number of gathered values
+        chunk = max(1, _CHUNK_SIZE // max(flat.shape[1], 1))
+        start = 0
+        while start < self.ncell:
+            limit = self.indptr[start] + chunk
+            end = int(np.searchsorted(self.indptr, limit, "right")) - 1
+            end = min(max(end, start + 1), self.ncell)
+            first, last = self.indptr[start], self.indptr[end]
+            if last > first:
+                products = (
+                    flat[self.indices[first:last]]
+                    * self.weights[first:last, np.newaxis]
+                )
+                # reduce the segments of cells with a non-empty kernel only,
+                #   cells with an empty kernel stay 0
+                rows = start + np.flatnonzero(degree[start:end])
+                result[rows] = np.add.reduceat(
+                    products, self.indptr[rows] - first, axis=0
+                )
+            start = end
+        return result
+
+    def __repr__(self):
+        return f"<{type(self).__name__} ncell={self.ncell} nnz={self.nnz}>"
+
+
+class KernelCache:
+    """Kernels of a grid by kernel parameters, bounded to the `size` most
+    recently used kernels.
+
+    Kernels with a callable `decay` are not cached, since the function
+    cannot be compared (e.g. a new lambda on each call).
+
+    Parameters
+    ----------
+    index : pycopanlpjml.spatial.GridIndex
+        Spatial index of the grid.
+    size : int, default 8
+        Maximum number of cached kernels.
+    """
+
+    def __init__(self, index, size=8):
+        self.index = index
+        self.size = size
+        self.kernels = OrderedDict()
+
+    def get(self, radius_km, **kwargs):
+        """Kernel of the grid built once per kernel parameters, see
+        `DistanceKernel.from_grid_index` for the parameters.
+        """
+        if callable(kwargs.get("decay")):
+            return DistanceKernel.from_grid_index(
+                self.index, radius_km, **kwargs
+            )
+        key = (float(radius_km),) + tuple(sorted(kwargs.items()))
+        kernel = self.kernels.get(key)
+        if kernel is not None:
+            self.kernels.move_to_end(key)
+            return kernel
+        kernel = DistanceKernel.from_grid_index(
+            self.index, radius_km, **kwargs
+        )
+        self.kernels[key] = kernel
+        while len(self.kernels) > self.size:
+            self.kernels.popitem(last=False)
+        return kernel
+
+    def clear(self):
+        """Remove all cached kernels."""
+        self.kernels.clear()
+
+    def __len__(self):
+        return len(self.kernels)
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} ncell={self.index.ncell}"
+            f" kernels={len(self)} size={self.size}>"
+        )
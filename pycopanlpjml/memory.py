@@ -0,0 +1,339 @@
+"""Memory accounting of the copan:LPJmL world."""
+
+import sys
+
+import numpy as np
+import xarray as xr
+
+from .cell import CellView, LazyCells, _WorldView
+
+# world attributes holding the LPJmL data
+WORLD_DATA = ("input", "output", "grid", "country", "area")
+
+
+def _owner(array):
+    """Array owning the memory of `array` (the end of its base chain)."""
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def _nbytes(*arrays):
+    """Bytes of the numpy arrays among `arrays`."""
+    return sum(
+        array.nbytes for array in arrays if isinstance(array, np.ndarray)
+    )
+
+
+def _data_arrays(data):
+    """Numpy arrays of the data variables of `data` by label."""
+    if isinstance(data, xr.Dataset):
+        return {name: data.variables[name] for name in data.data_vars}
+    if isinstance(data, xr.DataArray):
+        return {None: data.variable}
+    if isinstance(data, np.ndarray):
+        return {None: data}
+    return {}
+
+
+def _values(variable):
+    """Numpy array of an xarray variable (or the array itself)."""
+    data = getattr(variable, "data", variable)
+    return data if isinstance(data, np.ndarray) else None
+
+
+def world_buffers(world):
+    """Buffers of the world data by owning array.
+
+    Returns
+    -------
+    dict
+        ``id`` of the owning array as key and tuple of the label of the
+        world variable (e.g. "output.hdate"), the variable and the owning
+        array as value.
+    """
+    buffers = {}
+    names = WORLD_DATA + tuple(getattr(world, "_cell_views", ()))
+    for name in dict.fromkeys(names):
+        data = getattr(world, name, None)
+        for var, variable in _data_arrays(data).items():
+            values = _values(variable)
+            if values is None:
+                continue
+            owner = _owner(values)
+            label = name if var is None else f"{name}.{var}"
+            buffers.setdefault(id(owner), (label, variable, owner))
+    return buffers
+
+
+def _graph_bytes(graph):
+    """Approximate bytes of a `networkx.Graph` (node and adjacency dicts,
+    one data dict per edge).
+    """
+    adjacency, nodes = graph._adj, graph._node
+    nbytes = sys.getsizeof(adjacency) + sys.getsizeof(nodes)
+    nbytes += sum(sys.getsizeof(adj) for adj in adjacency.values())
+    nbytes += sum(sys.getsizeof(data) for data in nodes.values())
+    return nbytes + graph.number_of_edges() * sys.getsizeof({})
+
+
+def neighbourhood_bytes(neighbourhood):
+    """Approximate bytes of a world neighbourhood (networkx graph or CSR
+    `pycopanlpjml.Neighbourhood` incl. its graph if built).
+    """
+    if neighbourhood is None:
+        return 0
+    if hasattr(neighbourhood, "_adj"):
+        return _graph_bytes(neighbourhood)
+    nbytes = _nbytes(
+        neighbourhood.indptr,
+        neighbourhood.indices,
+        neighbourhood._pairs,
+        neighbourhood._padded_sum,
+        neighbourhood._padded_repeat,
+    )
+    if neighbourhood._graph is not None:
+        nbytes += _graph_bytes(neighbourhood._graph)
+    return nbytes
+
+
+def _kernel_bytes(distance_kernel):
+    """Bytes of a `pycopanlpjml.kernel.DistanceKernel` incl. its sparse
+    matrix if built.
+    """
+    nbytes = neighbourhood_bytes(distance_kernel) + _nbytes(
+        distance_kernel.weights, distance_kernel.distances
+    )
+    matrix = distance_kernel._matrix
+    if matrix is not None:
+        nbytes += _nbytes(matrix.data, matrix.indices, matrix.indptr)
+    return nbytes
+
+
+def _xarray_overhead(data):
+    """Approximate bytes of the Python objects of an xarray object
+    (without the data of its variables).
+    """
+    variables = data.variables if isinstance(data, xr.Dataset) else {}
+    if isinstance(data, xr.DataArray):
+        variables = dict(data.coords.variables, data=data.variable)
+    nbytes = sys.getsizeof(data) + sys.getsizeof(variables)
+    for variable in variables.values():
+        nbytes += sys.getsizeof(variable) + sys.getsizeof(variable.attrs)
+        values = _values(variable)
+        # coordinates created for the object (e.g. by isel)
+        if values is not None and values.base is None:
+            nbytes += values.nbytes
+    return nbytes
+
+
+def _classify(value, buffers, copied):
+    """Kind ("view" or "copy"), object bytes and copied data bytes of a
+    cell attribute, kind None for attributes not holding world data.
+    """
+    if isinstance(value, CellView):
+        return "view", sys.getsizeof(value), 0
+    if isinstance(value, np.ndarray):
+        arrays, overhead = {None: value}, sys.getsizeof(value)
+    elif isinstance(value, (xr.Dataset, xr.DataArray)):
+        arrays, overhead = _data_arrays(value), _xarray_overhead(value)
+    else:
+        return None, 0, 0
+    kind, nbytes = "view", 0
+    for variable in arrays.values():
+        values = _values(variable)
+        if values is None:
+            continue
+        owner = _owner(values)
+        if id(owner) in buffers:
+            continue
+        kind = "copy"
+        # count buffers shared by several attributes once
+        if id(owner) not in copied:
+            copied.add(id(owner))
+            nbytes += owner.nbytes
+    return kind, overhead, nbytes
+
+
+def _lazy_attributes(cell_class):
+    """Names of the attributes of `cell_class` resolved from the world."""
+    return {
+        name
+        for cls in cell_class.__mro__
+        for name, attribute in vars(cls).items()
+        if isinstance(attribute, _WorldView)
+    }
+
+
+def _existing_cells(world):
+    """Cells of `world` without creating lazy cells."""
+    cells = getattr(world, "_cells", None) or ()
+    if isinstance(cells, LazyCells):
+        return cells.existing
+    return list(cells)
+
+
+def cell_report(world, sample=None):
+    """Memory of the cell objects of `world`.
+
+    Parameters
+    ----------
+    world : pycopanlpjml.World
+        World of the cells.
+    sample : int, optional
+        Only inspect every n-th cell and extrapolate the bytes to all
+        cells, defaults to all cells.
+
+    Returns
+    -------
+    dict
+        ``count`` of cells, bytes of the cell ``objects`` (instances and
+        their attribute dicts), of the ``views`` (view objects of world
+        data) and of the ``copies`` (data of cell attributes not backed by
+        the world buffers incl. their objects) and per attribute the
+        number of ``views``, ``copies`` and ``lazy`` (resolved on access)
+        cells and the copied ``bytes``.
+    """
+    cells = _existing_cells(world)
+    inspected = cells[:: sample or 1]
+    scale = len(cells) / len(inspected) if inspected else 0
+    buffers = world_buffers(world)
+    copied = set()
+    objects = views = copies = 0
+    attributes = {}
+    lazy_attributes = {}
+    for cell in inspected:
+        state = cell.__dict__
+        objects += sys.getsizeof(cell) + sys.getsizeof(state)
+        for name, value in state.items():
+            kind, overhead, nbytes = _classify(value, buffers, copied)
+            if kind is None:
+                continue
+            entry = attributes.setdefault(
+                name, {"views": 0, "copies": 0, "lazy": 0, "bytes": 0}
+            )
+            if kind == "view":
+                entry["views"] += 1
+                views += overhead
+            else:
+                entry["copies"] += 1
+                entry["bytes"] += overhead + nbytes
+                copies += overhead + nbytes
+        cell_class = type(cell)
+        if cell_class not in lazy_attributes:
+            lazy_attributes[cell_class] = _lazy_attributes(cell_class)
+        for name in lazy_attributes[cell_class]:
+            if name not in state and getattr(world, name, None) is not None:
+                entry = attributes.setdefault(
+                    name, {"views": 0, "copies": 0, "lazy": 0, "bytes": 0}
+                )
+                entry["lazy"] += 1
+
+    for entry in attributes.values():
+        for key in entry:
+            entry[key] = int(round(entry[key] * scale))
+    return {
+        "count": len(cells),
+        "objects": int(round(objects * scale)),
+        "views": int(round(views * scale)),
+        "copies": int(round(copies * scale)),
+        "attributes": attributes,
+    }
+
+
+def index_report(world):
+    """Bytes of the indexes derived from the world data (country index,
+    spatial index, aggregation weights and distance kernels of the grid).
+    """
+    report = {}
+    country_index = getattr(world, "country_index", None)
+    if country_index is not None:
+        report["country_index"] = _nbytes(
+            country_index.countries,
+            country_index.codes,
+            country_index.cells,
+            country_index.indptr,
+            country_index.table,
+        )
+    _, grid_index = getattr(world, "_grid_index", (None, None))
+    if grid_index is not None:
+        report["grid_index"] = _nbytes(
+            grid_index.table,
+            grid_index.lon,
+            grid_index.lat,
+            grid_index._lon_rad,
+            grid_index._lat_rad,
+            grid_index._cos_lat,
+        )
+    _, kernel_cache = getattr(world, "_kernel_cache", (None, None))
+    if kernel_cache is not None:
+        report["kernels"] = sum(
+            _kernel_bytes(distance_kernel)
+            for distance_kernel in kernel_cache.kernels.values()
+        )
+    _, aggregator = getattr(world, "_aggregator", (None, None))
+    if aggregator is not None:
+        report["aggregator"] = _nbytes(aggregator.area) + sum(
+            _nbytes(*groups.values()) for groups in aggregator._groups.values()
+        )
+    return report
+
+
+def memory_report(world, cells=True, sample=None):
+    """Memory of the world data, history, cells and neighbourhood.
+
+    The bytes of each world buffer are counted once (variables sharing a
+    buffer are attributed to the first). Outputs with a time dimension are
+    split into the latest time step (``world``) and the remaining buffer
+    (``history``), incl. the mirror of ring buffers.
+
+    Parameters
+    ----------
+    world : pycopanlpjml.World
+        World to report.
+    cells : bool, default True
+        Whether to inspect the cell objects (see `cell_report`).
+    sample : int, optional
+        Only inspect every n-th cell, see `cell_report`.
+
+    Returns
+    -------
+    dict
+        Bytes by ``world`` variable (e.g. "output.hdate"), by ``history``
+        variable, the ``cells`` (see `cell_report`), the ``neighbourhood``
+        and the ``indexes`` (see `index_report`) and the ``total`` bytes.
+    """
+    report = {"world": {}, "history": {}}
+    for label, variable, owner in world_buffers(world).values():
+        values = _values(variable)
+        dims = getattr(variable, "dims", ())
+        ntime = dict(zip(dims, values.shape)).get("time", 1)
+        latest = values.nbytes // ntime
+        if label.startswith("output.") and owner.nbytes > latest:
+            report["world"][label] = latest
+            report["history"][label] = owner.nbytes - latest
+        else:
+            report["world"][label] = owner.nbytes
+    if cells:
+        report["cells"] = cell_report(world, sample=sample)
+    report["neighbourhood"] = neighbourhood_bytes(
+        getattr(world, "neighbourhood", None)
+    )
+    report["indexes"] = index_report(world)
+    report["total"] = total_bytes(report)
+    return report
+
+
+def total_bytes(report):
+    """Total bytes of a memory report (without its ``total``)."""
+    total = 0
+    for key, value in report.items():
+        if key == "total":
+            continue
+        if key == "cells":
+            total += value["objects"] + value["views"] + value["copies"]
+        elif isinstance(value, dict):
+            total += sum(value.values())
+        else:
+            total += value
+    return total
@@ -0,0 +1,331 @@
+"""Neighbourhood structures of the copan:LPJmL world."""
+
+import numpy as np
+
+
+def neighbour_pairs(neighbour_matrix):
+    """Get the unique undirected neighbour pairs of a neighbour matrix.
+
+    Negative entries (e.g. -1 or -9999 for missing neighbours) are masked
+    and symmetric pairs are reduced to their first occurrence in row-major
+    order, which equals the order in which the pairs would be added by
+    iterating the matrix cell by cell.
+
+    Parameters
+    ----------
+    neighbour_matrix : numpy.ndarray or xarray.DataArray
+        Matrix of neighbour cell indices with dimensions (cell, neighbour),
+        as returned by `pycoupler.LPJmLData.get_neighbourhood(id=False)`.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (npair, 2) with the cell indices of each pair.
+    """
+    matrix = np.asarray(getattr(neighbour_matrix, "values", neighbour_matrix))
+    ncell, nneighbour = matrix.shape
+
+    rows = np.repeat(np.arange(ncell), nneighbour)
+    cols = matrix.ravel()
+
+    # mask negative values (-1 or NaN)
+    valid = cols >= 0
+    rows, cols = rows[valid], cols[valid].astype(np.int64)
+
+    # dedupe symmetric pairs, keep first occurrence in row-major order
+    keys = np.minimum(rows, cols) * ncell + np.maximum(rows, cols)
+    _, first = np.unique(keys, return_index=True)
+    first.sort()
+
+    return np.stack([rows[first], cols[first]], axis=1)
+
+
+class Neighbourhood:
+    """Compact neighbourhood of cells stored as CSR index arrays.
+
+    The neighbours of the cell at position ``i`` are stored in
+    ``indices[indptr[i]:indptr[i + 1]]`` (compressed sparse row format). This
+    allows vectorized reductions over the neighbours of all cells at once
+    (`neighbour_sum`, `neighbour_mean`, `neighbour_max`, `neighbour_min`)
+    for any world array with the cell dimension. A `networkx.Graph` of the
+    neighbourhood is only built on demand via `graph`.
+
+    Parameters
+    ----------
+    indptr : numpy.ndarray
+        Index pointer array of length ncell + 1.
+    indices : numpy.ndarray
+        Neighbour cell positions of all cells.
+    nodes : list, optional
+        Node objects (e.g. cell instances) at each cell position (or a
+        mapping of position and node for a subset of the cells). Used as
+        nodes of `graph` and returned by `neighbors`. Defaults to the cell
+        positions.
+    pairs : numpy.ndarray, optional
+        Unique undirected neighbour pairs in insertion order as returned by
+        :func:`neighbour_pairs`, used to build `graph`.
+
+    Examples
+    --------
+    >>> neighbourhood = Neighbourhood.from_neighbour_matrix(
+    ...     lpjml.grid.get_neighbourhood(id=False)
+    ... )
+    >>> mean_harvest = neighbourhood.neighbour_mean(
+    ...     world.output.pft_harvestc
+    ... )
+    """
+
+    def __init__(self, indptr, indices, nodes=None, pairs=None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.nodes = nodes
+        self._pairs = pairs
+        self._graph = None
+        self._padded_sum = None
+        self._padded_repeat = None
+
+    @classmethod
+    def from_neighbour_matrix(cls, neighbour_matrix, nodes=None):
+        """Build the neighbourhood from a neighbour matrix.
+
+        Parameters
+        ----------
+        neighbour_matrix : numpy.ndarray or xarray.DataArray
+            Matrix of neighbour cell indices with dimensions
+            (cell, neighbour), negative values mark missing neighbours.
+        nodes : list, optional
+            Node objects (e.g. cell instances) at each cell position.
+
+        Returns
+        -------
+        Neighbourhood
+            Symmetric neighbourhood of all cells.
+        """
+        return cls.from_pairs(
+            neighbour_pairs(neighbour_matrix),
+            np.shape(neighbour_matrix)[0],
+            nodes=nodes,
+        )
+
+    @classmethod
+    def from_pairs(cls, pairs, ncell, nodes=None):
+        """Build the neighbourhood from unique undirected neighbour pairs.
+
+        Parameters
+        ----------
+        pairs : numpy.ndarray
+            Array of shape (npair, 2) with the cell positions of each pair
+            in insertion order, as returned by :func:`neighbour_pairs`.
+        ncell : int
+            Number of cells.
+        nodes : list, optional
+            Node objects (e.g. cell instances) at each cell position.
+
+        Returns
+        -------
+        Neighbourhood
+            Symmetric neighbourhood of all cells.
+        """
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+
+        # both directions of each pair in insertion order, sorted stable by
+        #   source to keep the order of neighbours of the networkx graph
+        source = pairs.ravel()
+        target = pairs[:, ::-1].ravel()
+        order = np.argsort(source, kind="stable")
+
+        indptr = np.zeros(ncell + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source, minlength=ncell), out=indptr[1:])
+
+        return cls(indptr, target[order], nodes=nodes, pairs=pairs)
+
+    @property
+    def ncell(self):
+        """Number of cells in the neighbourhood."""
+        return len(self.indptr) - 1
+
+    @property
+    def degree(self):
+        """Number of neighbours of each cell."""
+        return np.diff(self.indptr)
+
+    def neighbours(self, index):
+        """Positions of the neighbouring cells of the cell at `index`."""
+        start, end = self.indptr[index], self.indptr[index + 1]
+        return self.indices[start:end]
+
+    def _position(self, node):
+        """Cell position of `node` (a cell instance or position)."""
+        if self.nodes is None:
+            return int(node)
+        index = getattr(node, "index", None)
+        if index is None or self.nodes[index] is not node:
+            raise KeyError(f"{node} is not part of the neighbourhood")
+        return index
+
+    def __contains__(self, node):
+        try:
+            self._position(node)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return False
+        return True
+
+    def neighbors(self, node):
+        """Iterate over the neighbours of `node` (networkx compatible)."""
+        neighbours = self.neighbours(self._position(node)).tolist()
+        if self.nodes is None:
+            return iter(neighbours)
+        return (self.nodes[index] for index in neighbours)
+
+    @property
+    def pairs(self):
+        """Unique undirected neighbour pairs as array of shape (npair, 2)."""
+        if self._pairs is None:
+            # every undirected edge once (source < target)
+            source = np.repeat(np.arange(self.ncell), self.degree)
+            pairs = np.stack([source, self.indices], axis=1)
+            self._pairs = pairs[source <= self.indices]
+        return self._pairs
+
+    @property
+    def graph(self):
+        """The neighbourhood as `networkx.Graph`, built on first access."""
+        if self._graph is None:
+            import networkx as nx
+
+            nodes = self.nodes if self.nodes is not None else range(self.ncell)
+            graph = nx.Graph()
+            graph.add_nodes_from(
+                nodes.values() if isinstance(nodes, dict) else nodes
+            )
+            graph.add_edges_from(
+                (nodes[source], nodes[target])
+                for source, target in self.pairs.tolist()
+            )
+            self._graph = graph
+        return self._graph
+
+    def _cell_data(self, values):
+        """Get `values` as numpy array with the cell dimension first and a
+        function to restore the original type and dimension order.
+        """
+        if getattr(values, "dims", None) is not None:
+            axis = values.get_axis_num("cell")
+            data = np.moveaxis(values.values, axis, 0)
+
+            def restore(result):
+                return values.copy(data=np.moveaxis(result, 0, axis))
+
+        else:
+            data = np.asarray(values)
+
+            def restore(result):
+                return result
+
+        if data.shape[0] != self.ncell:
+            raise ValueError(
+                f"Length of cell dimension ({data.shape[0]}) does not match"
+                f" the number of cells ({self.ncell})."
+            )
+        return data, restore
+
+    def _padded(self, missing):
+        """Neighbour positions padded to a (max degree, ncell) array.
+
+        Missing neighbour slots point to position `missing` or, if None, to
+        the first neighbour of the cell (neutral for min/max reductions).
+        """
+        degree = self.degree
+        slot = np.arange(degree.max(initial=0))[:, np.newaxis]
+        last = np.maximum(degree - 1, 0)
+        positions = self.indptr[:-1] + np.minimum(slot, last)
+        padded = self.indices[np.minimum(positions, len(self.indices) - 1)]
+        if missing is not None:
+            padded[slot >= degree] = missing
+        return padded
+
+    def _reduce(self, data, ufunc, fill_value):
+        """Reduce `data` over the neighbours of each cell with `ufunc`.
+
+        Iterates over the neighbour slots (at most the maximum degree, e.g.
+        8) instead of the cells, each step being one vectorized gather and
+        `ufunc` application over all cells.
+        """
+        dtype = np.result_type(data, fill_value)
+        if len(self.indices) == 0:
+            return np.full(data.shape, fill_value, dtype)
+
+        if ufunc is np.add:
+            # missing neighbours point to an appended row of zeros
+            if self._padded_sum is None:
+                self._padded_sum = self._padded(missing=self.ncell)
+            padded = self._padded_sum
+            data = np.concatenate([data, np.zeros_like(data[:1])])
+        else:
+            if self._padded_repeat is None:
+                self._padded_repeat = self._padded(missing=None)
+            padded = self._padded_repeat
+
+        result = data[padded[0]].astype(dtype, copy=False)
+        for slot in padded[1:]:
+            ufunc(result, data[slot], out=result)
+        result[self.degree == 0] = fill_value
+        return result
+
+    def neighbour_sum(self, values):
+        """Sum of `values` over the neighbours of each cell.
+
+        Parameters
+        ----------
+        values : numpy.ndarray or xarray.DataArray
+            World array with the cell dimension (first axis for numpy
+            arrays).
+
+        Returns
+        -------
+        numpy.ndarray or xarray.DataArray
+            Array of the same shape (and type) as `values`, cells without
+            neighbours are 0.
+        """
+        data, restore = self._cell_data(values)
+        return restore(self._reduce(data, np.add, 0))
+
+    def neighbour_mean(self, values):
+        """Mean of `values` over the neighbours of each cell.
+
+        Cells without neighbours are NaN. See `neighbour_sum` for
+        parameters.
+        """
+        data, restore = self._cell_data(values)
+        degree = self.degree
+        mean = self._reduce(data, np.add, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean /= degree.reshape((-1,) + (1,) * (data.ndim - 1))
+        return restore(mean)
+
+    def neighbour_max(self, values, fill_value=np.nan):
+        """Maximum of `values` over the neighbours of each cell.
+
+        Cells without neighbours are set to `fill_value`. See
+        `neighbour_sum` for parameters.
+        """
+        data, restore = self._cell_data(values)
+        return restore(self._reduce(data, np.maximum, fill_value))
+
+    def neighbour_min(self, values, fill_value=np.nan):
+        """Minimum of `values` over the neighbours of each cell.
+
+        Cells without neighbours are set to `fill_value`. See
+        `neighbour_sum` for parameters.
+        """
+        data, restore = self._cell_data(values)
+        return restore(self._reduce(data, np.minimum, fill_value))
+
+    def __len__(self):
+        return self.ncell
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} ncell={self.ncell}"
+            f" nedge={len(self.indices) // 2}>"
+        )
@@ -0,0 +1,338 @@
+"""Parallel scheduling of cell level updates of copan:LPJmL models."""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .neighbourhood import Neighbourhood
+from .shared import WORLD_BUFFERS, SharedArrays, _variables
+
+
+def partition_cells(world, by="block", size=10.0):
+    """Partition the world cells into contiguous spatial or country groups.
+
+    Parameters
+    ----------
+    world : pycopanlpjml.World
+        World with `grid` (and `country_index` for ``by="country"``).
+    by : str, default "block"
+        "block" groups the cells into tiles of `size` x `size` degrees
+        (ordered by latitude and longitude of the tile), "country" groups
+        the cells by their country.
+    size : float, default 10.0
+        Edge length of the tiles in degrees (``by="block"``).
+
+    Returns
+    -------
+    list of numpy.ndarray
+        Sorted cell positions of each (non empty) partition.
+    """
+    if by == "block":
+        lon = np.asarray(world.grid.coords["lon"].values)
+        lat = np.asarray(world.grid.coords["lat"].values)
+        ncol = int(np.ceil(360 / size))
+        keys = np.floor((lat + 90) / size).astype(np.int64) * ncol
+        keys += np.floor((lon + 180) / size).astype(np.int64)
+    elif by == "country":
+        return world.country_index.partitions()
+    else:
+        raise ValueError(
+            f"Unknown partitioning '{by}', must be 'block' or 'country'."
+        )
+    _, keys = np.unique(keys, return_inverse=True)
+    order = np.argsort(keys.ravel(), kind="stable")
+    bounds = np.cumsum(np.bincount(keys.ravel()))[:-1]
+    return np.split(order, bounds)
+
+
+def _take_cells(values, axis, cells):
+    """Select `cells` along `axis` of `values`."""
+    return values[(slice(None),) * axis + (cells,)]
+
+
+class CellData:
+    """Data of a single cell in a scheduled per-cell function.
+
+    The world attributes (`input`, `output`, `grid`, `country`, ...) are
+    available as `SharedArrays` of numpy views of the cell, the
+    neighbouring cell positions via `neighbours` and the arrays of all
+    cells via `world` (e.g. ``cell.world.output.hdate[cell.neighbours]``).
+    """
+
+    def __init__(self, world, neighbourhood, index):
+        self.world = world
+        self.index = index
+        self._neighbourhood = neighbourhood
+
+    @property
+    def neighbours(self):
+        """Positions of the neighbouring cells."""
+        return self._neighbourhood.neighbours(self.index)
+
+    def __getattr__(self, name):
+        arrays = self.__dict__["world"].__dict__.get(name)
+        if not isinstance(arrays, SharedArrays):
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        return SharedArrays(
+            {
+                variable: _take_cells(
+                    values, arrays.cell_axis(variable), self.index
+                )
+                for variable, values in arrays.items()
+            },
+            arrays.dims,
+        )
+
+    def __repr__(self):
+        return f"<{type(self).__name__} index={self.index}>"
+
+
+class Partition:
+    """A partition of cells passed to a scheduled partition function.
+
+    Attributes
+    ----------
+    id : int
+        Position of the partition.
+    cells : numpy.ndarray
+        Sorted cell positions of the partition.
+    t : int
+        Current time step (year).
+    rng : numpy.random.Generator
+        Random number generator seeded by the scheduler seed, `t` and `id`.
+    world : object
+        World arrays of all cells as `SharedArrays` per attribute (e.g.
+        ``partition.world.output.hdate``), as of the start of the step.
+    neighbourhood : pycopanlpjml.Neighbourhood
+        Neighbourhood of all cells (positions as nodes).
+    """
+
+    def __init__(self, id, cells, t, seed, world, neighbourhood):
+        self.id = id
+        self.cells = cells
+        self.t = t
+        self.rng = np.random.default_rng([seed, t, id])
+        self.world = world
+        self.neighbourhood = neighbourhood
+
+    def iter_cells(self):
+        """Iterate over the cells of the partition as `CellData`."""
+        for index in self.cells.tolist():
+            yield CellData(self.world, self.neighbourhood, index)
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} id={self.id} t={self.t}"
+            f" ncell={len(self.cells)}>"
+        )
+
+
+class _LocalWorld:
+    """World arrays of the current process in the layout of an attached
+    shared world.
+    """
+
+    def __init__(self, world, attributes):
+        for attribute in attributes:
+            variables = _variables(getattr(world, attribute))
+            setattr(
+                self,
+                attribute,
+                SharedArrays(
+                    {name: var.values for name, var in variables.items()},
+                    {name: tuple(var.dims) for name, var in variables.items()},
+                ),
+            )
+
+
+# world and neighbourhood of a worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(handle, indptr, indices):
+    """Attach a worker process to the shared world."""
+    _worker["world"] = handle.attach()
+    _worker["neighbourhood"] = Neighbourhood(indptr, indices)
+
+
+def _run_partition(func, per_cell, id, cells, t, seed, local=None):
+    """Run `func` for a partition in a worker or, with the `local` world
+    and neighbourhood, in the calling process.
+    """
+    world, neighbourhood = local or (
+        _worker["world"],
+        _worker["neighbourhood"],
+    )
+    partition = Partition(id, cells, t, seed, world, neighbourhood)
+    if not per_cell:
+        return func(partition)
+
+    results = {}
+    for cell in partition.iter_cells():
+        for name, value in (func(cell, t, partition.rng) or {}).items():
+            results.setdefault(name, []).append(value)
+    return results
+
+
+class CellScheduler:
+    """Run cell level update functions on partitions of the world cells.
+
+    The cells are split into partitions (see `partition_cells`) that are
+    processed by a pool of worker processes attached to the shared world
+    (see `pycopanlpjml.SharedWorld`) or, with ``processes=0``, in the
+    calling process.
+
+    Scheduled functions read the world as of the start of the step and
+    return their results, which are written into `world.input` after all
+    partitions have finished (synchronous update). Reads of neighbouring
+    cells in other partitions therefore always see the state before the
+    step, independent of the order in which the partitions are processed.
+    Each partition gets a random number generator seeded by `seed`, the
+    time step and the partition position, so that runs are reproducible
+    regardless of the number of processes.
+
+    Parameters
+    ----------
+    world : pycopanlpjml.World
+        World to update.
+    partitions : list of numpy.ndarray
+        Cell positions of each partition.
+    neighbourhood : pycopanlpjml.Neighbourhood
+        Neighbourhood of the cells (positions as nodes).
+    handle : pycopanlpjml.shared.WorldHandle, optional
+        Handle of the shared world, required for ``processes > 0``.
+    processes : int, optional
+        Number of worker processes, defaults to the number of CPUs. 0 runs
+        the functions in the calling process.
+    seed : int, default 0
+        Seed of the random number generators.
+    tracker : pycopanlpjml.inputs.InputTracker, optional
+        Input tracker to mark the written cells dirty in.
+
+    Examples
+    --------
+    >>> def stop_tillage(cell, t, rng):
+    ...     if cell.output.hdate.mean() > 200 and rng.random() < 0.1:
+    ...         return {"with_tillage": 0}
+    >>> model.init_scheduler(by="country", processes=8)
+    >>> model.scheduler.map_cells(stop_tillage, t)
+    """
+
+    def __init__(
+        self,
+        world,
+        partitions,
+        neighbourhood,
+        handle=None,
+        processes=None,
+        seed=0,
+        tracker=None,
+    ):
+        self.world = world
+        self.partitions = partitions
+        self.neighbourhood = neighbourhood
+        self.seed = seed
+        self.tracker = tracker
+        self._executor = None
+        self._processes = 0
+        if processes != 0:
+            if handle is None:
+                raise ValueError(
+                    "A shared world handle is required for worker processes."
+                )
+            self._executor = ProcessPoolExecutor(
+                max_workers=processes,
+                initializer=_init_worker,
+                initargs=(handle, neighbourhood.indptr, neighbourhood.indices),
+            )
+            self._processes = processes or os.cpu_count()
+
+    @property
+    def processes(self):
+        """Number of worker processes (0 if run in the calling process)."""
+        return self._processes
+
+    def map_partitions(self, func, t):
+        """Run `func(partition)` for every `Partition` of cells.
+
+        `func` has to be picklable (defined at module level) and returns a
+        dict of `world.input` variable names and arrays with the values of
+        the partition's cells along the cell axis (or None).
+
+        Parameters
+        ----------
+        func : callable
+            Partition function.
+        t : int
+            Current time step (year).
+        """
+        self._write(self._run(func, False, t), stack=False)
+
+    def map_cells(self, func, t):
+        """Run `func(cell, t, rng)` for every cell (`CellData`).
+
+        `func` has to be picklable (defined at module level) and returns a
+        dict of `world.input` variable names and the values of the cell (or
+        None). Cells of a partition are processed in ascending order and
+        share the random number generator of the partition. Variables have
+        to be returned for all cells of a partition or none.
+
+        Parameters
+        ----------
+        func : callable
+            Per-cell function.
+        t : int
+            Current time step (year).
+        """
+        self._write(self._run(func, True, t), stack=True)
+
+    def _run(self, func, per_cell, t):
+        tasks = [
+            (func, per_cell, id, cells, t, self.seed)
+            for id, cells in enumerate(self.partitions)
+        ]
+        if self._executor is None:
+            attributes = [
+                attribute
+                for attribute in WORLD_BUFFERS
+                if getattr(self.world, attribute, None) is not None
+            ]
+            local = (_LocalWorld(self.world, attributes), self.neighbourhood)
+            return [_run_partition(*task, local=local) for task in tasks]
+        futures = [
+            self._executor.submit(_run_partition, *task) for task in tasks
+        ]
+        return [future.result() for future in futures]
+
+    def _write(self, results, stack):
+        """Write the results of all partitions into `world.input`."""
+        for cells, result in zip(self.partitions, results):
+            for name, values in (result or {}).items():
+                variable = self.world.input.variables[name]
+                axis = variable.get_axis_num("cell")
+                if stack:
+                    # per-cell values (scalars broadcast to the cell shape)
+                    shape = list(variable.shape)
+                    del shape[axis]
+                    values = np.stack(
+                        [np.broadcast_to(value, shape) for value in values],
+                        axis=axis,
+                    )
+                variable.values[(slice(None),) * axis + (cells,)] = values
+                if self.tracker is not None:
+                    self.tracker.mark_dirty(name, cells)
+
+    def close(self):
+        """Shut down the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} partitions={len(self.partitions)}"
+            f" processes={self.processes}>"
+        )
@@ -0,0 +1,273 @@
+"""Shared memory buffers of the copan:LPJmL world."""
+
+import inspect
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# world attributes backed by shared memory by default (if set)
+WORLD_BUFFERS = ("input", "output", "grid", "country", "area")
+
+# alignment of the arrays in the shared memory block (cache line)
+_ALIGNMENT = 64
+
+# attaching processes must not unlink the block on exit (python >= 3.13)
+_UNTRACKED = (
+    {"track": False}
+    if "track" in inspect.signature(shared_memory.SharedMemory).parameters
+    else {}
+)
+
+
+def _variables(data):
+    """Variables of a world attribute as dict of name and xarray.Variable.
+
+    Datasets hold their data variables, data arrays (and numpy arrays) a
+    single variable named None.
+    """
+    if hasattr(data, "data_vars"):
+        return {name: data.variables[name] for name in data.data_vars}
+    return {None: data}
+
+
+class SharedArrays(dict):
+    """Arrays of a world attribute attached from shared memory.
+
+    A dict of variable name and numpy array (the single array of a data
+    array is stored with the key None and available via `values`). The
+    dimension names of each array are available via `dims`.
+    """
+
+    def __init__(self, arrays, dims):
+        super().__init__(arrays)
+        self.dims = dims
+
+    @property
+    def values(self):
+        """The array of an attached data array."""
+        return self[None]
+
+    def cell_axis(self, name=None):
+        """Axis of the cell dimension of variable `name`."""
+        return self.dims[name].index("cell")
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            ) from None
+
+
+class WorldHandle:
+    """Picklable handle to the world buffers in shared memory.
+
+    The handle only holds the name of the shared memory block and the
+    layout of the arrays, so that it can be passed cheaply to worker
+    processes (e.g. as argument of `multiprocessing.Pool.map`), which
+    `attach` to the buffers without copying.
+
+    Parameters
+    ----------
+    name : str
+        Name of the shared memory block.
+    layout : dict
+        Layout of the arrays as ``{attribute: {variable: (offset, shape,
+        dtype, dims)}}``.
+    """
+
+    def __init__(self, name, layout):
+        self.name = name
+        self.layout = layout
+
+    def attach(self):
+        """Attach to the shared world buffers.
+
+        Returns
+        -------
+        AttachedWorld
+            World arrays as numpy arrays into the shared memory block.
+        """
+        return AttachedWorld(self)
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} name='{self.name}'"
+            f" attributes={list(self.layout)}>"
+        )
+
+
+class AttachedWorld:
+    """World arrays of a `WorldHandle` attached in a (worker) process.
+
+    Each shared world attribute (e.g. `input`, `output`) is available as
+    `SharedArrays` of numpy arrays into the shared memory block. Writes
+    (e.g. to a slice of cells of an input) modify the world of the parent
+    process in place and are sent to LPJmL with its next `send_input`.
+    Time coordinates are not shared.
+
+    Examples
+    --------
+    >>> def stop_tillage(handle, cells):
+    ...     with handle.attach() as world:
+    ...         world.input.with_tillage[cells] = 0
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+        self._shm = shared_memory.SharedMemory(name=handle.name, **_UNTRACKED)
+        for attribute, variables in handle.layout.items():
+            arrays, dims = {}, {}
+            for name, (offset, shape, dtype, var_dims) in variables.items():
+                arrays[name] = np.ndarray(
+                    shape, dtype=dtype, buffer=self._shm.buf, offset=offset
+                )
+                dims[name] = var_dims
+            setattr(self, attribute, SharedArrays(arrays, dims))
+
+    def close(self):
+        """Detach from the shared memory block.
+
+        The arrays must not be used afterwards.
+        """
+        for attribute in self.handle.layout:
+            self.__dict__.pop(attribute, None)
+        self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} name='{self.handle.name}'"
+            f" attributes={list(self.handle.layout)}>"
+        )
+
+
+class SharedWorld:
+    """Back the arrays of a world with one shared memory block.
+
+    The data variables of the world attributes (by default `input`,
+    `output`, `grid`, `country` and `area` if set) are copied into a
+    `multiprocessing.shared_memory.SharedMemory` block once and the world
+    variables are rebound to numpy arrays into that block, so that the
+    world keeps working as before. Worker processes attach to the block
+    zero-copy via the picklable `handle` to read outputs and to write
+    (their slice of) inputs in place, which are sent with the next
+    exchange without copying.
+
+    The output history has to be updated in place ("shift" mode of
+    `pycopanlpjml.OutputHistory`), views created before (e.g. cell views
+    via `isel`) still point to the previous arrays. Create cells lazily
+    (``Component.init_cells(lazy=True)``) or share the world before
+    initializing the cells.
+
+    Parameters
+    ----------
+    world : pycopanlpjml.World
+        World to share the arrays of.
+    attributes : list of str, optional
+        World attributes to share. Defaults to `WORLD_BUFFERS` that are
+        set on the world.
+
+    Examples
+    --------
+    >>> shared = SharedWorld(model.world)
+    >>> with multiprocessing.Pool(4) as pool:
+    ...     pool.starmap(stop_tillage, [(shared.handle, cells) for cells in
+    ...                                 np.array_split(range(ncell), 4)])
+    >>> model.update_lpjml(t)  # sends the input written by the workers
+    >>> shared.close()
+    """
+
+    def __init__(self, world, attributes=None):
+        if attributes is None:
+            attributes = [
+                attribute
+                for attribute in WORLD_BUFFERS
+                if getattr(world, attribute, None) is not None
+            ]
+        self.world = world
+
+        layout = {}
+        size = 0
+        for attribute in attributes:
+            layout[attribute] = {}
+            variables = _variables(getattr(world, attribute))
+            for name, variable in variables.items():
+                values = np.asarray(variable.values)
+                if values.dtype.hasobject:
+                    raise ValueError(
+                        f"Variable '{name or attribute}' of world.{attribute}"
+                        f" has dtype {values.dtype} which cannot be shared."
+                    )
+                size = -(-size // _ALIGNMENT) * _ALIGNMENT
+                layout[attribute][name] = (
+                    size,
+                    values.shape,
+                    values.dtype.str,
+                    tuple(variable.dims),
+                )
+                size += values.nbytes
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.handle = WorldHandle(self._shm.name, layout)
+
+        # copy into and rebind the world variables to the shared block
+        for attribute, variables in layout.items():
+            data = getattr(world, attribute)
+            for name, (offset, shape, dtype, _) in variables.items():
+                variable = data if name is None else data.variables[name]
+                array = np.ndarray(
+                    shape, dtype=dtype, buffer=self._shm.buf, offset=offset
+                )
+                array[...] = variable.values
+                variable.data = array
+
+    @property
+    def name(self):
+        """Name of the shared memory block."""
+        return self._shm.name
+
+    @property
+    def nbytes(self):
+        """Size of the shared memory block in bytes."""
+        return self._shm.size
+
+    def close(self):
+        """Copy the world arrays back into process memory and release the
+        shared memory block.
+
+        Attached workers have to be detached before.
+        """
+        if self._shm is None:
+            return
+        for attribute, variables in self.handle.layout.items():
+            data = getattr(self.world, attribute)
+            for name in variables:
+                variable = data if name is None else data.variables[name]
+                variable.data = np.array(variable.values)
+        shm, self._shm = self._shm, None
+        shm.unlink()
+        try:
+            shm.close()
+        except BufferError:
+            # views created before still reference the block, it is
+            #   unmapped once they are garbage collected
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} name='{self.handle.name}'"
+            f" attributes={list(self.handle.layout)}>"
+        )
@@ -0,0 +1,427 @@
+"""Spatial index of the copan:LPJmL world grid."""
+
+import hashlib
+
+import numpy as np
+
+# mean earth radius in km
+EARTH_RADIUS = 6371.0088
+
+# maximum number of (point, cell) candidate pairs evaluated at once
+_CHUNK_SIZE = 2**22
+
+# rings of cells searched around points before comparing with all cells
+_MAX_RING = 8
+
+
+def haversine(lon1, lat1, lon2, lat2, radius=EARTH_RADIUS):
+    """Great-circle distance in km between points given in degrees
+    (vectorized, broadcasting).
+    """
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    hav = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * radius * np.arcsin(np.sqrt(np.minimum(hav, 1)))
+
+
+def _infer_cellsize(coord):
+    """Smallest positive distance of the (sorted) unique coordinates."""
+    steps = np.diff(np.unique(coord))
+    if steps.size == 0:
+        raise ValueError(
+            "Cell size cannot be inferred from a single row or column of"
+            " cells, supply the cellsize."
+        )
+    return float(steps.min())
+
+
+def _grid_cellsize(grid):
+    """Cell size (lon, lat) of an LPJmL grid from its attributes."""
+    attrs = grid.attrs
+    if "cellsize" in attrs:
+        return attrs["cellsize"]
+    if "cellsize_lon" in attrs and "cellsize_lat" in attrs:
+        return attrs["cellsize_lon"], attrs["cellsize_lat"]
+    return None
+
+
+class GridIndex:
+    """Spatial index of the cells of a regular lon/lat grid.
+
+    The cells are hashed into a dense lookup table of the grid rows and
+    columns (derived from the `cellsize`), so that the cell containing a
+    point is found by rounding its coordinates. Queries are vectorized over
+    arrays of points and only evaluate the great-circle distances
+    (`haversine`) to the cells of the table window around each point.
+
+    `nearest_cell` searches rings of cells around each point until no cell
+    further away can be nearer and compares with all cells only for points
+    far off the grid cells (e.g. in the open ocean). `cells_within`
+    evaluates the rows and (latitude dependent) columns that can be within
+    the radius.
+    Longitudes wrap around the antimeridian if 360 degrees are a multiple
+    of the cell size.
+
+    Parameters
+    ----------
+    lon : array_like
+        Longitude of each cell centre in degrees.
+    lat : array_like
+        Latitude of each cell centre in degrees.
+    cellsize : float or tuple of float, optional
+        Cell size in degrees (or longitude and latitude cell size),
+        inferred from the coordinates by default.
+
+    Examples
+    --------
+    >>> index = GridIndex.from_grid(world.grid)
+    >>> index.nearest_cell(lon=[13.4, 2.35], lat=[52.52, 48.86])
+    array([27538, 24863])
+    >>> indptr, cells = index.cells_within(
+    ...     lon=[13.4, 2.35], lat=[52.52, 48.86], radius_km=100
+    ... )
+    >>> cells[indptr[0] : indptr[1]]  # cells within 100 km of Berlin
+    """
+
+    def __init__(self, lon, lat, cellsize=None):
+        self.lon = np.asarray(lon, dtype=np.float64).reshape(-1)
+        self.lat = np.asarray(lat, dtype=np.float64).reshape(-1)
+        if self.lon.size == 0 or self.lon.size != self.lat.size:
+            raise ValueError(
+                f"Longitudes ({self.lon.size}) and latitudes"
+                f" ({self.lat.size}) must be of the same non-zero length."
+            )
+        if cellsize is None:
+            cellsize = (_infer_cellsize(self.lon), _infer_cellsize(self.lat))
+        dlon, dlat = np.broadcast_to(np.asarray(cellsize, dtype=float), (2,))
+        if dlon <= 0 or dlat <= 0:
+            raise ValueError(f"Cell size {cellsize} must be positive.")
+        self.cellsize = (float(dlon), float(dlat))
+        self.origin = (float(self.lon.min()), float(self.lat.min()))
+
+        # longitudes wrap around if the grid columns can span the globe
+        period = 360 / dlon
+        self.period = (
+            int(round(period)) if np.isclose(period, round(period)) else None
+        )
+        rows, cols = self._hash(self.lon, self.lat)
+        nrow = int(rows.max()) + 1
+        ncol = self.period or int(cols.max()) + 1
+        self.table = np.full((nrow, ncol), -1, dtype=np.int32)
+        self.table[rows, cols] = np.arange(self.ncell, dtype=np.int32)
+        if np.count_nonzero(self.table >= 0) != self.ncell:
+            raise ValueError(
+                f"Cells do not lie on a regular grid of cell size"
+                f" {self.cellsize}, several cells share a grid position."
+            )
+
+        self._lon_rad = np.radians(self.lon)
+        self._lat_rad = np.radians(self.lat)
+        self._cos_lat = np.cos(self._lat_rad)
+        self._hash_value = None
+
+    @classmethod
+    def from_grid(cls, grid):
+        """Index of an LPJmL grid (`pycoupler.LPJmLData` with the
+        coordinates ``lon`` and ``lat`` and the ``cellsize`` attribute).
+        """
+        if "lon" in grid.coords and "lat" in grid.coords:
+            lon, lat = grid.coords["lon"].values, grid.coords["lat"].values
+        else:
+            lon = grid.sel(band="lon").values
+            lat = grid.sel(band="lat").values
+        return cls(lon, lat, cellsize=_grid_cellsize(grid))
+
+    @property
+    def ncell(self):
+        """Number of cells."""
+        return self.lon.size
+
+    @property
+    def hash(self):
+        """Hash of the cell coordinates and the cell size (e.g. to cache
+        data derived from the grid).
+        """
+        if self._hash_value is None:
+            digest = hashlib.sha1(np.asarray(self.cellsize).tobytes())
+            digest.update(self.lon.tobytes())
+            digest.update(self.lat.tobytes())
+            self._hash_value = digest.hexdigest()
+        return self._hash_value
+
+    def _hash(self, lon, lat):
+        """Table row and column of points (may be outside of the table)."""
+        lon0, lat0 = self.origin
+        # longitudes within +-180 degrees of the grid origin
+        lon = (lon - lon0 + 180) % 360 - 180
+        cols = np.rint(lon / self.cellsize[0]).astype(np.int64)
+        rows = np.rint((lat - lat0) / self.cellsize[1]).astype(np.int64)
+        if self.period is not None:
+            cols %= self.period
+        return rows, cols
+
+    def _lookup(self, rows, cols):
+        """Cell positions at table rows and columns, -1 for none."""
+        nrow, ncol = self.table.shape
+        if self.period is not None:
+            cols = cols % self.period
+        inside = (rows >= 0) & (rows < nrow) & (cols >= 0) & (cols < ncol)
+        cells = np.full(rows.shape, -1, dtype=np.int64)
+        cells[inside] = self.table[rows[inside], cols[inside]]
+        return cells
+
+    def _distance(self, lon, lat, cells):
+        """Great-circle distance in km of points (in radians) to cells."""
+        hav = (
+            np.sin((self._lat_rad[cells] - lat) / 2) ** 2
+            + np.cos(lat)
+            * self._cos_lat[cells]
+            * np.sin((self._lon_rad[cells] - lon) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(hav, 1)))
+
+    def _ring_bound(self, lat, ring):
+        """Lower bound of the distance in km of points (latitude in
+        radians) to the cells `ring` or more rows or columns away from the
+        cells of the points.
+        """
+        dlon, dlat = np.radians(self.cellsize)
+        lat_bound = EARTH_RADIUS * (ring - 0.5) * dlat
+        # cells of fewer rows away are at most at this latitude
+        cell_lat = np.minimum(
+            np.abs(lat) + (ring - 0.5) * dlat, np.abs(self._lat_rad).max()
+        )
+        lon_bound = (
+            2
+            * EARTH_RADIUS
+            * np.arcsin(
+                np.sqrt(np.cos(lat) * np.cos(cell_lat))
+                * np.sin(min((ring - 0.5) * dlon, np.pi) / 2)
+            )
+        )
+        return np.minimum(lat_bound, lon_bound)
+
+    def _ring_offsets(self, ring):
+        """Row and column offsets of the cells `ring` rows or columns
+        away.
+        """
+        offsets = np.arange(-ring, ring + 1)
+        rows, cols = np.meshgrid(offsets, offsets, indexing="ij")
+        edge = np.maximum(np.abs(rows), np.abs(cols)) == ring
+        return rows[edge], cols[edge]
+
+    def _nearest_exhaustive(self, lon, lat):
+        """Nearest cells of points (in radians) compared with all cells."""
+        cells = np.empty(lon.size, dtype=np.int64)
+        distances = np.empty(lon.size)
+        chunk = max(1, _CHUNK_SIZE // self.ncell)
+        every = np.arange(self.ncell)
+        for start in range(0, lon.size, chunk):
+            part = slice(start, start + chunk)
+            dist = self._distance(
+                lon[part, None], lat[part, None], every[None, :]
+            )
+            cells[part] = np.argmin(dist, axis=1)
+            distances[part] = dist[np.arange(dist.shape[0]), cells[part]]
+        return cells, distances
+
+    def nearest_cell(self, lon, lat, return_distance=False):
+        """Positions of the cells nearest to points (great-circle distance).
+
+        Parameters
+        ----------
+        lon : float or array_like
+            Longitude of the points in degrees.
+        lat : float or array_like
+            Latitude of the points in degrees (broadcast against `lon`).
+        return_distance : bool, default False
+            If True, the distances in km are returned as well.
+
+        Returns
+        -------
+        numpy.ndarray or int
+            Cell position of each point (in the shape of the points).
+        numpy.ndarray or float, optional
+            Distance in km of each point to its cell.
+        """
+        lon, lat = np.broadcast_arrays(
+            np.asarray(lon, dtype=np.float64),
+            np.asarray(lat, dtype=np.float64),
+        )
+        shape = lon.shape
+        lon, lat = lon.reshape(-1), lat.reshape(-1)
+        rows, cols = self._hash(lon, lat)
+        lon_rad, lat_rad = np.radians(lon), np.radians(lat)
+
+        # search rings of cells around the points until no cell further
+        #   away can be nearer
+        cells = np.full(lon.size, -1, dtype=np.int64)
+        distances = np.full(lon.size, np.inf)
+        points = np.arange(lon.size)
+        for ring in range(_MAX_RING + 1):
+            row_offsets, col_offsets = self._ring_offsets(ring)
+            candidates = self._lookup(
+                rows[points, None] + row_offsets[None, :],
+                cols[points, None] + col_offsets[None, :],
+            )
+            found = np.where(
+                candidates >= 0,
+                self._distance(
+                    lon_rad[points, None],
+                    lat_rad[points, None],
+                    np.maximum(candidates, 0),
+                ),
+                np.inf,
+            )
+            best = np.argmin(found, axis=1)
+            found = found[np.arange(points.size), best]
+            nearer = found < distances[points]
+            cells[points[nearer]] = candidates[nearer, best[nearer]]
+            distances[points[nearer]] = found[nearer]
+            points = points[
+                ~(
+                    distances[points]
+                    <= self._ring_bound(lat_rad[points], ring + 1)
+                )
+            ]
+            if points.size == 0:
+                break
+
+        # compare the points far off the grid with all cells
+        if points.size:
+            cells[points], distances[points] = self._nearest_exhaustive(
+                lon_rad[points], lat_rad[points]
+            )
+
+        cells, distances = cells.reshape(shape), distances.reshape(shape)
+        if not shape:
+            cells, distances = int(cells), float(distances)
+        if return_distance:
+            return cells, distances
+        return cells
+
+    def _windows(self, lon, lat, radius):
+        """First table row and column and number of rows and columns of
+        the window of each point (in degrees) that covers `radius` (km).
+        """
+        nrow, ncol = self.table.shape
+        dlon, dlat = self.cellsize
+        rows, cols = self._hash(lon, lat)
+        angle = radius / EARTH_RADIUS
+
+        reach = int(np.floor(np.degrees(angle) / dlat + 0.5))
+        row_start = np.maximum(rows - reach, 0)
+        nrows = np.maximum(
+            np.minimum(rows + reach, nrow - 1) - row_start + 1, 0
+        )
+
+        # widest longitude difference of the points within the radius
+        cos_lat = np.cos(np.radians(lat))
+        full = np.sin(angle) >= cos_lat
+        with np.errstate(divide="ignore", invalid="ignore"):
+            width = np.degrees(
+                np.arcsin(np.clip(np.sin(angle) / cos_lat, 0, 1))
+            )
+        reach = np.floor(width / dlon + 0.5).astype(np.int64)
+        if self.period is not None:
+            full |= 2 * reach + 1 >= self.period
+            col_start = np.where(full, 0, cols - reach)
+            ncols = np.where(full, self.period, 2 * reach + 1)
+        else:
+            reach = np.where(full, ncol, reach)
+            col_start = np.maximum(cols - reach, 0)
+            ncols = np.maximum(
+                np.minimum(cols + reach, ncol - 1) - col_start + 1, 0
+            )
+        return row_start, nrows, col_start, ncols
+
+    def cells_within(self, lon, lat, radius_km, return_distance=False):
+        """Positions of the cells within a great-circle distance of points.
+
+        Parameters
+        ----------
+        lon : float or array_like
+            Longitude of the points in degrees.
+        lat : float or array_like
+            Latitude of the points in degrees (broadcast against `lon`).
+        radius_km : float
+            Radius in km (cells at exactly the radius are included).
+        return_distance : bool, default False
+            If True, the distances in km are returned as well.
+
+        Returns
+        -------
+        indptr : numpy.ndarray
+            Only for arrays of points: the cells of point ``i`` (of the
+            flattened points) are ``cells[indptr[i]:indptr[i + 1]]``.
+        cells : numpy.ndarray
+            Sorted cell positions within the radius of each point.
+        distances : numpy.ndarray, optional
+            Distance in km of each point to each of its cells.
+        """
+        if radius_km < 0:
+            raise ValueError(f"Radius {radius_km} must not be negative.")
+        scalar = np.ndim(lon) == 0 and np.ndim(lat) == 0
+        lon, lat = np.broadcast_arrays(
+            np.asarray(lon, dtype=np.float64),
+            np.asarray(lat, dtype=np.float64),
+        )
+        lon, lat = lon.reshape(-1), lat.reshape(-1)
+        row_start, nrows, col_start, ncols = self._windows(lon, lat, radius_km)
+        counts = nrows * ncols
+        lon_rad, lat_rad = np.radians(lon), np.radians(lat)
+
+        # chunks of points with a bounded number of candidates
+        total = np.cumsum(counts)
+        all_points = [np.empty(0, dtype=np.int64)]
+        all_cells = [np.empty(0, dtype=np.int64)]
+        all_distances = [np.empty(0)]
+        start = 0
+        while start < lon.size:
+            done = total[start - 1] if start else 0
+            end = max(
+                int(np.searchsorted(total, done + _CHUNK_SIZE, "right")),
+                start + 1,
+            )
+            count = counts[start:end]
+            points = np.repeat(np.arange(start, end), count)
+            # position of each candidate within the window of its point
+            offset = np.arange(count.sum()) - np.repeat(
+                np.cumsum(count) - count, count
+            )
+            width = ncols[points]
+            cells = self._lookup(
+                row_start[points] + offset // width,
+                col_start[points] + offset % width,
+            )
+            points, cells = points[cells >= 0], cells[cells >= 0]
+            distances = self._distance(lon_rad[points], lat_rad[points], cells)
+            within = distances <= radius_km
+            all_points.append(points[within])
+            all_cells.append(cells[within])
+            all_distances.append(distances[within])
+            start = end
+
+        points = np.concatenate(all_points)
+        cells = np.concatenate(all_cells)
+        distances = np.concatenate(all_distances)
+        order = np.lexsort((cells, points))
+        cells, distances = cells[order], distances[order]
+        indptr = np.zeros(lon.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(points, minlength=lon.size), out=indptr[1:])
+
+        result = (cells,) if scalar else (indptr, cells)
+        if return_distance:
+            result += (distances,)
+        return result[0] if len(result) == 1 else result
+
+    def __len__(self):
+        return self.ncell
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} ncell={self.ncell}"
+            f" cellsize={self.cellsize}>"
+        )
@@ -0,0 +1,539 @@
+"""Local stand-in for LPJmL speaking the coupler socket protocol.
+
+The stand-in connects to the coupler (`pycoupler.coupler.LPJmLCoupler`,
+e.g. of a `pycopanlpjml.Component`) as LPJmL would and either replays a
+recorded exchange (such as ``tests/data/test_receive.txt``) or generates a
+synthetic grid and outputs of configurable size. This allows to run,
+profile and load test the full send/receive/merge path of
+`Component.update_lpjml` without LPJmL.
+
+Usage (stand-in in a separate process)::
+
+    python -m pycopanlpjml.standin synthetic config_coupled.json \\
+        --ncell 67420 --workspace ./standin --port 2042
+    python -m pycopanlpjml.standin replay tests/data/test_receive.txt
+"""
+
+import argparse
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+import xarray as xr
+
+# coupler tokens (pycoupler.coupler.LPJmLToken)
+SEND_INPUT = 0
+READ_OUTPUT = 1
+SEND_INPUT_SIZE = 2
+READ_OUTPUT_SIZE = 3
+GET_STATUS = 5
+
+# LPJmL value types (pycoupler.coupler.LPJmlValueType) with their socket
+#   encoding, doubles are sent as floats as the coupler reads them as such
+VALUE_TYPES = {"byte": 0, "short": 1, "int": 2, "float": 3, "double": 4}
+_DTYPES = {
+    0: np.dtype("=i1"),
+    1: np.dtype("=i2"),
+    2: np.dtype("=i4"),
+    3: np.dtype("=f4"),
+    4: np.dtype("=f4"),
+}
+
+# inputs with integer values (pycoupler.data.LPJmLInputType.type)
+_INT_INPUTS = ("with_tillage", "sdate")
+
+# outputs that are sent once at the start of the simulation
+_STATIC_OUTPUTS = ("grid", "country", "region", "terr_area", "lake_area")
+
+
+def synthetic_grid(ncell, cellsize=0.5):
+    """Regular land grid of `ncell` cells filled row by row.
+
+    Parameters
+    ----------
+    ncell : int
+        Number of cells.
+    cellsize : float, default 0.5
+        Cell size in degree.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Longitude and latitude of the cell centres.
+    """
+    ncol = int(360 / cellsize)
+    icell = np.arange(ncell)
+    lon = -180 + cellsize / 2 + (icell % ncol) * cellsize
+    # rows from the southernmost latitude of the LPJmL land grid
+    lat = -55.75 + (icell // ncol) * cellsize
+    return lon, lat
+
+
+def read_recording(file_name):
+    """Read a recorded exchange of LPJmL with the coupler.
+
+    The recording holds every value LPJmL sent to the coupler in order, one
+    value per line, as written by pycoupler in test mode. Value types are
+    inferred from the protocol position.
+
+    Parameters
+    ----------
+    file_name : str
+        File name of the recording, e.g. ``tests/data/test_receive.txt``.
+
+    Returns
+    -------
+    dict
+        Keyword arguments of `LPJmLStandIn`.
+    """
+    with open(file_name) as file:
+        lines = iter(file.read().split())
+
+    def take(count=None):
+        if count is None:
+            return int(next(lines))
+        return [next(lines) for _ in range(count)]
+
+    # handshake (known integer, number of tasks) and header
+    take(), take()
+    version, ncell, ninput, noutput = take(), take(), take(), take()
+
+    inputs = {}
+    for _ in range(ninput):
+        _check_token(take(), SEND_INPUT_SIZE)
+        index = take()
+        inputs[index] = take()
+
+    outputs = {}
+    for _ in range(noutput):
+        _check_token(take(), READ_OUTPUT_SIZE)
+        index = take()
+        outputs[index] = (take(), take(), take())
+    _check_token(take(), GET_STATUS)
+
+    def values(index, count):
+        dtype = _DTYPES[outputs[index][2]]
+        return np.array(take(count), dtype=float).astype(dtype)
+
+    static = []
+    nstatic = sum(steps == 0 for steps, _, _ in outputs.values())
+    for _ in range(nstatic):
+        _check_token(take(), READ_OUTPUT)
+        index = take()
+        static.append((index, values(index, outputs[index][1] * ncell)))
+
+    exchanges = []
+    while True:
+        try:
+            token = take()
+        except StopIteration:
+            break
+        index, year = take(), take()
+        if token == SEND_INPUT:
+            exchanges.append((token, index, year, None))
+        else:
+            _check_token(token, READ_OUTPUT)
+            steps, bands, _ = outputs[index]
+            count = ncell if steps > 1 and bands == 1 else bands * ncell
+            exchanges.append((token, index, year, values(index, count)))
+
+    return dict(
+        version=version,
+        ncell=ncell,
+        inputs=inputs,
+        outputs=outputs,
+        static=static,
+        exchanges=exchanges,
+    )
+
+
+def _check_token(token, expected):
+    if token != expected:
+        raise ValueError(f"Received token {token}, expected {expected}.")
+
+
+class LPJmLStandIn:
+    """Stand-in for LPJmL speaking the coupler socket protocol.
+
+    Connects to the coupler as LPJmL does, negotiates the inputs and
+    outputs, sends the static outputs (grid, country, ...) and then works
+    through the `exchanges`: for each input request it receives the input
+    values from the coupler, for each output it sends the given values.
+    Use `replay` or `synthetic` to create a stand-in.
+
+    Parameters
+    ----------
+    ncell : int
+        Number of cells.
+    inputs : dict
+        Input index as key and value type (see `VALUE_TYPES`) as value.
+    outputs : dict
+        Output index as key and tuple of (steps, bands, value type) as value
+        in the order of the protocol. Static outputs have 0 steps.
+    static : list
+        Tuples of (output index, values) of the static outputs, values are
+        sent cell by cell.
+    exchanges : iterable
+        Tuples of (token, index, year, values) with token `SEND_INPUT`
+        (values None) or `READ_OUTPUT` (values sent band by band).
+    version : int, default 3
+        Coupler protocol version.
+    host : str, default "localhost"
+        Host of the coupler.
+    port : int, default 2042
+        Port of the coupler.
+    timeout : float, default 60
+        Seconds to wait for the coupler to accept the connection.
+
+    Attributes
+    ----------
+    config_file : str or None
+        LPJmL configuration file to initialize the coupler with (set by
+        `synthetic`).
+    inputs_received : dict
+        Latest input values of shape (ncell, nband) received per input
+        index.
+    outputs_sent : dict
+        Latest output values of shape (ncell, bands) sent per output index.
+
+    Examples
+    --------
+    >>> with LPJmLStandIn.synthetic(
+    ...     "config_coupled.json", ncell=67420, workspace="standin"
+    ... ) as standin:
+    ...     model = Model(config_file=standin.config_file)
+    ...     for year in model.lpjml.get_sim_years():
+    ...         model.update(year)
+    """
+
+    def __init__(
+        self,
+        ncell,
+        inputs,
+        outputs,
+        static,
+        exchanges,
+        version=3,
+        host="localhost",
+        port=2042,
+        timeout=60,
+    ):
+        self.ncell = ncell
+        self.inputs = inputs
+        self.outputs = outputs
+        self.static = static
+        self.exchanges = exchanges
+        self.version = version
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.config_file = None
+        self.inputs_received = {}
+        self.outputs_sent = {}
+        self._thread = None
+        self._error = None
+
+    @classmethod
+    def replay(cls, file_name, **kwargs):
+        """Stand-in replaying a recorded exchange, see `read_recording`.
+
+        The coupler has to be initialized with the configuration of the
+        recorded simulation.
+        """
+        return cls(**read_recording(file_name), **kwargs)
+
+    @classmethod
+    def synthetic(cls, config_file, ncell, workspace, seed=0, **kwargs):
+        """Stand-in with a synthetic grid and random outputs.
+
+        Derives a configuration of `ncell` cells on a regular grid from the
+        coupled LPJmL configuration `config_file` and writes it together
+        with the output meta files and the socket inputs to `workspace`
+        (see `config_file` of the returned stand-in). The socket outputs
+        keep their number of bands and value types from the meta files of
+        the original configuration.
+
+        Parameters
+        ----------
+        config_file : str
+            Coupled LPJmL configuration file (JSON) as template.
+        ncell : int
+            Number of cells of the synthetic grid.
+        workspace : str
+            Directory to write the configuration, meta and input files to.
+        seed : int, default 0
+            Seed of the random number generator for synthetic outputs.
+        kwargs : dict, optional
+            Further keyword arguments of `LPJmLStandIn`.
+
+        Returns
+        -------
+        LPJmLStandIn
+            Stand-in generating outputs for all simulation years.
+        """
+        with open(config_file) as file:
+            config = json.load(file)
+        template_path = os.path.dirname(os.path.abspath(config_file))
+        workspace = os.path.abspath(workspace)
+        os.makedirs(f"{workspace}/output", exist_ok=True)
+        os.makedirs(f"{workspace}/input", exist_ok=True)
+
+        config.update(startgrid=0, endgrid=ncell - 1, sim_path=workspace)
+        lon, lat = synthetic_grid(ncell)
+
+        # outputs: index, steps, bands and type from the original meta files
+        output_index = {out["name"]: out["id"] for out in config["outputvar"]}
+        outputs, static = {}, []
+        for output in config["output"]:
+            if not output["file"].get("socket", False):
+                continue
+            name = output["id"]
+            with open(f"{template_path}/{output['file']['name']}.json") as f:
+                meta = json.load(f)
+            meta.update(ncell=ncell, firstcell=0)
+            output["file"]["name"] = f"{workspace}/output/{name}"
+            with open(f"{output['file']['name']}.json", "w") as f:
+                json.dump(meta, f, indent=2)
+
+            index = output_index[name]
+            value_type = VALUE_TYPES[meta["datatype"]]
+            steps = 0 if name in _STATIC_OUTPUTS else meta.get("nstep", 1)
+            outputs[index] = (steps, meta["nbands"], value_type)
+            if steps == 0:
+                values = _static_values(
+                    name, config, lon, lat, meta["nbands"], ncell
+                )
+                values = values / meta.get("scalar", 1.0)
+                static.append((index, values.ravel()))
+
+        # inputs: gridded input files covering the synthetic grid
+        inputs = {}
+        for name, socket_input in config["input"].items():
+            if not socket_input.get("socket", False):
+                continue
+            value_type = VALUE_TYPES["int" if name in _INT_INPUTS else "float"]
+            inputs[socket_input["id"]] = value_type
+            _write_input(
+                f"{workspace}/input/{name}.nc",
+                name,
+                lon,
+                lat,
+                _DTYPES[value_type],
+                year=config["start_coupling"] - 1,
+            )
+
+        standin = cls(
+            ncell=ncell,
+            inputs=inputs,
+            outputs=outputs,
+            static=[
+                (index, values.astype(_DTYPES[outputs[index][2]]))
+                for index, values in static
+            ],
+            exchanges=_synthetic_exchanges(
+                config, ncell, inputs, outputs, seed
+            ),
+            **kwargs,
+        )
+        standin.config_file = f"{workspace}/config_coupled_standin.json"
+        with open(standin.config_file, "w") as file:
+            json.dump(config, file, indent=2)
+        return standin
+
+    def _connect(self):
+        """Connect to the coupler, waiting until it accepts connections."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                return socket.create_connection((self.host, self.port))
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def run(self):
+        """Connect to the coupler and work through all exchanges."""
+        channel = self._connect()
+        try:
+            self._serve(channel)
+        finally:
+            channel.close()
+
+    def _serve(self, channel):
+        """Protocol of LPJmL with the coupler on a connected `channel`."""
+
+        def send_ints(*values):
+            channel.sendall(struct.pack(f"{len(values)}i", *values))
+
+        def recv_values(count, dtype):
+            buffer = bytearray(count * dtype.itemsize)
+            view = memoryview(buffer)
+            while view:
+                nbytes = channel.recv_into(view)
+                if not nbytes:
+                    raise ConnectionError("Coupler closed the connection.")
+                view = view[nbytes:]
+            return np.frombuffer(buffer, dtype=dtype)
+
+        # handshake: coupler sends "1", LPJmL sends a known integer and the
+        #   number of tasks, coupler confirms
+        recv_values(1, np.dtype("=i1"))
+        send_ints(42, 1)
+        recv_values(1, _DTYPES[2])
+
+        send_ints(
+            self.version, self.ncell, len(self.inputs), len(self.outputs)
+        )
+
+        nbands = {}
+        for index, value_type in self.inputs.items():
+            send_ints(SEND_INPUT_SIZE, index, value_type)
+            nbands[index] = int(recv_values(1, _DTYPES[2])[0])
+
+        for index, (steps, bands, value_type) in self.outputs.items():
+            send_ints(READ_OUTPUT_SIZE, index, steps, bands, value_type)
+            self._check_status(recv_values(1, _DTYPES[2])[0])
+
+        send_ints(GET_STATUS)
+        self._check_status(recv_values(1, _DTYPES[2])[0])
+
+        for index, values in self.static:
+            send_ints(READ_OUTPUT, index)
+            channel.sendall(self._encode(index, values))
+
+        for token, index, year, values in self.exchanges:
+            send_ints(token, index, year)
+            if token == SEND_INPUT:
+                # input values are sent cell by cell
+                self.inputs_received[index] = recv_values(
+                    self.ncell * nbands[index], _DTYPES[self.inputs[index]]
+                ).reshape(self.ncell, nbands[index])
+            else:
+                channel.sendall(self._encode(index, values))
+                # output values are sent band by band
+                self.outputs_sent[index] = np.reshape(
+                    values, (-1, self.ncell)
+                ).T
+
+    def _encode(self, index, values):
+        """Encode output values of output `index` for the socket."""
+        dtype = _DTYPES[self.outputs[index][2]]
+        return np.ascontiguousarray(values, dtype=dtype).tobytes()
+
+    @staticmethod
+    def _check_status(status):
+        if status != 0:
+            raise RuntimeError(f"Coupler returned error status {status}.")
+
+    def start(self):
+        """Run the stand-in in a background thread, see `join`."""
+
+        def target():
+            try:
+                self.run()
+            except BaseException as error:  # re-raised in join
+                self._error = error
+
+        self._thread = threading.Thread(
+            target=target, name="lpjml-standin", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        """Wait for the background thread and raise its error, if any."""
+        self._thread.join(timeout)
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # do not mask an error of the coupler side
+        if exc_type is None:
+            self.join()
+
+
+def _static_values(name, config, lon, lat, nbands, ncell):
+    """Values of static output `name` on the synthetic grid."""
+    if name == "grid":
+        return np.stack([lon, lat], axis=1)
+    # country/region codes in contiguous blocks of cells
+    ncode = len(config.get(f"{name}par", ())) or 1
+    codes = np.arange(ncell) * ncode // ncell
+    return np.repeat(codes[:, np.newaxis], nbands, axis=1)
+
+
+def _write_input(file_name, name, lon, lat, dtype, year):
+    """Write a gridded input file covering the synthetic grid."""
+    lons, lats = np.unique(lon), np.unique(lat)
+    data = np.zeros((1, len(lats), len(lons)), dtype=dtype)
+    xr.Dataset(
+        {name: (("time", "lat", "lon"), data)},
+        coords=dict(time=("time", [0], {"units": f"years since {year}-1-1"})),
+    ).assign_coords(lat=lats, lon=lons).to_netcdf(file_name)
+
+
+def _synthetic_exchanges(config, ncell, inputs, outputs, seed):
+    """Exchanges of all simulation years with random output values."""
+    rng = np.random.default_rng(seed)
+    start_coupling = config["start_coupling"]
+    outputyear = config["outputyear"]
+    for year in range(min(outputyear, start_coupling), config["lastyear"] + 1):
+        if year >= start_coupling:
+            for index in inputs:
+                yield SEND_INPUT, index, year, None
+        if year < outputyear:
+            continue
+        for index, (steps, bands, value_type) in outputs.items():
+            if steps == 0:
+                continue
+            # subannual outputs with one band are sent step by step
+            nsend, size = (steps, ncell) if bands == 1 else (1, bands * ncell)
+            for _ in range(nsend):
+                if value_type in (VALUE_TYPES["float"], VALUE_TYPES["double"]):
+                    values = rng.random(size, dtype=np.float32)
+                else:
+                    values = rng.integers(0, 365, size, dtype=np.int16)
+                yield READ_OUTPUT, index, year, values
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Run a local LPJmL stand-in for the coupler."
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=2042)
+    parser.add_argument("--timeout", type=float, default=60)
+    modes = parser.add_subparsers(dest="mode", required=True)
+    replay = modes.add_parser("replay", help="replay a recorded exchange")
+    replay.add_argument("recording")
+    synthetic = modes.add_parser("synthetic", help="synthetic grid")
+    synthetic.add_argument("config_file")
+    synthetic.add_argument("--ncell", type=int, default=67420)
+    synthetic.add_argument("--workspace", default="standin")
+    synthetic.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(args)
+
+    kwargs = dict(host=args.host, port=args.port, timeout=args.timeout)
+    if args.mode == "replay":
+        standin = LPJmLStandIn.replay(args.recording, **kwargs)
+    else:
+        standin = LPJmLStandIn.synthetic(
+            args.config_file,
+            ncell=args.ncell,
+            workspace=args.workspace,
+            seed=args.seed,
+            **kwargs,
+        )
+        print(f"Coupler configuration: {standin.config_file}", flush=True)
+    standin.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""On-disk storage of the output history of the copan:LPJmL world."""
+
+import queue
+import threading
+
+import netCDF4
+import numpy as np
+import xarray as xr
+from xarray.backends.locks import NETCDFC_LOCK
+
+from .history import year_end
+
+# time of the stored history
+_TIME_UNITS = "days since 1970-01-01"
+
+
+def _time_value(time):
+    """Numeric time value of a numpy.datetime64 in `_TIME_UNITS`."""
+    return (
+        np.datetime64(time, "D") - np.datetime64("1970-01-01", "D")
+    ).astype(np.int64)
+
+
+class OutputStore:
+    """Append the yearly output to a netCDF file on a background thread.
+
+    The file is created with the variables, coordinates and attributes of
+    `output` and an unlimited time dimension. Each appended year is written
+    as one record (all variables of a year are stored contiguously) by a
+    background writer thread, so that appending only hands the values over
+    to the writer. The stored history is available as lazily loaded
+    `xarray.Dataset` via `open_dataset` at any time.
+
+    The file is written in the 64-bit data netCDF format (CDF-5), which
+    allows to open the file for reading while the writer appends to it and
+    supports all integer types.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the netCDF file to create (overwritten if it exists).
+    output : pycoupler.LPJmLDataSet
+        World output dataset used as template. Its current history is
+        written as the first records.
+    maxsize : int, default 4
+        Maximum number of years waiting to be written. Appending blocks
+        only if the writer falls behind by more years.
+
+    Examples
+    --------
+    >>> store = OutputStore("output_history.nc", world.output)
+    >>> store.append(world.output.isel(time=[-1]), 2023)
+    >>> store.open_dataset().pft_harvestc.sel(cell=27410).mean("time")
+    """
+
+    def __init__(self, file_name, output, maxsize=4):
+        self.file_name = file_name
+        self.names = list(output.data_vars)
+        self._shapes = {}
+        self._ntime = 0
+        self._error = None
+
+        # variables with band dimensions named per variable (as in the
+        #   dataset) and time as first (record) dimension
+        variables = {
+            name: xr.DataArray(output[name]).rename(
+                {
+                    dim: f"{dim} ({name})"
+                    for dim in output[name].dims
+                    if dim not in ("cell", "time")
+                }
+            )
+            for name in self.names
+        }
+        self._dims = {name: var.dims for name, var in variables.items()}
+        template = xr.Dataset(
+            {
+                name: var.isel(time=slice(0, 0)).transpose("time", ...)
+                for name, var in variables.items()
+            },
+            attrs=output.attrs,
+        ).drop_vars("time")
+        for name in self.names:
+            self._shapes[name] = template[name].shape[1:]
+        template.coords["time"] = ("time", np.array([], dtype=np.int64))
+        template.time.attrs.update(units=_TIME_UNITS, calendar="standard")
+        template.to_netcdf(
+            file_name,
+            format="NETCDF3_64BIT_DATA",
+            engine="netcdf4",
+            unlimited_dims=["time"],
+        )
+
+        self._dataset = netCDF4.Dataset(file_name, "a")
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(
+            target=self._write, name="lpjml-output-store", daemon=True
+        )
+        self._thread.start()
+
+        # current history
+        for itime, time in enumerate(output.time.values):
+            self._put(
+                time,
+                {
+                    name: np.array(output[name].isel(time=itime).values)
+                    for name in self.names
+                },
+            )
+
+    @property
+    def ntime(self):
+        """Number of years written to the file."""
+        return self._ntime
+
+    def append(self, output, year):
+        """Append the output of `year` to the store.
+
+        Parameters
+        ----------
+        output : dict or pycoupler.LPJmLDataSet
+            Output of `year` with the variable name as key and array of
+            dimensions (cell, band[, time]) as value. All variables have to
+            be included. The arrays must not be modified afterwards (pass
+            copies of buffers that are reused).
+        year : int
+            Simulation year of the output.
+        """
+        self._put(
+            year_end(year),
+            {
+                name: np.asarray(getattr(output[name], "values", output[name]))
+                for name in self.names
+            },
+        )
+
+    def _put(self, time, values):
+        self._raise()
+        if not self._thread.is_alive():
+            raise RuntimeError("Output store is closed.")
+        self._queue.put((time, values))
+
+    def _write(self):
+        """Write queued years to the file (writer thread)."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    time, values = item
+                    # netCDF-C is not thread safe, share the lock of xarray
+                    with NETCDFC_LOCK:
+                        for name in self.names:
+                            self._dataset[name][self._ntime] = values[
+                                name
+                            ].reshape(self._shapes[name])
+                        self._dataset["time"][self._ntime] = _time_value(time)
+                        self._dataset.sync()
+                    self._ntime += 1
+            except Exception as error:  # raised in the calling thread
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _raise(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def flush(self):
+        """Wait until all appended years are written."""
+        self._queue.join()
+        self._raise()
+
+    def open_dataset(self):
+        """The stored history as lazily loaded `xarray.Dataset`.
+
+        Waits until all appended years are written. Years appended later
+        are not part of the returned dataset, open it again to include
+        them. Variables have the dimension order of the world output.
+        """
+        self.flush()
+        dataset = xr.open_dataset(self.file_name, cache=False)
+        return dataset.assign(
+            {
+                name: dataset[name].transpose(*self._dims[name])
+                for name in self.names
+            }
+        )
+
+    def close(self):
+        """Write all appended years and close the file."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+            self._dataset.close()
+        self._raise()
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} file_name='{self.file_name}'"
+            f" ntime={self.ntime}>"
+        )
@@ -0,0 +1,143 @@
+"""Per-phase timing of copan:LPJmL models."""
+
+import contextlib
+import csv
+import io
+import json
+import threading
+import time
+
+# shared no-op context manager returned by disabled timers
+_NO_SPAN = contextlib.nullcontext()
+
+
+class PhaseTimer:
+    """Collect the wall clock time of named phases per simulation year.
+
+    Spans (phases) are timed via the `span` context manager and summed per
+    name until the year is completed with `finish_year`, which stores the
+    phase times of the year in `records` and passes them to the registered
+    callbacks. `pycopanlpjml.Component` times the phases of the exchange
+    with LPJmL:
+
+    * ``"encode_input"``: re-encoding the changed input (with input
+      tracking),
+    * ``"send_input"``: sending the input to LPJmL,
+    * ``"read_output"``: receiving and decoding the output (includes
+      waiting for LPJmL, on the exchange thread with `begin_exchange`),
+    * ``"wait_output"``: time `finish_exchange` blocks for the output (not
+      recorded by `update_lpjml`, which reads the output inline),
+    * ``"history_merge"``: merging the output into the output history,
+    * ``"time_update"``: updating the time coordinates,
+
+    and completes a year at the end of `update_lpjml` or `finish_exchange`,
+    so that spans of
+    the model's own update (e.g. ``with model.timer.span("social"):``)
+    before or during the exchange of a year are recorded for that year.
+    If disabled, `span` returns a shared no-op context manager.
+
+    Parameters
+    ----------
+    enabled : bool, default False
+        Whether to time spans.
+    callback : callable, optional
+        Function called with ``(year, phases)`` for every completed year,
+        `phases` being a dict of phase name and seconds. Further callbacks
+        can be added with `add_callback`.
+
+    Examples
+    --------
+    >>> model = Model(config_file="config_coupled.json", timing=True)
+    >>> for year in model.lpjml.get_sim_years():
+    ...     with model.timer.span("social"):
+    ...         model.update_social(year)
+    ...     model.update_lpjml(year)
+    >>> model.timer.to_csv("timings.csv")
+    """
+
+    def __init__(self, enabled=False, callback=None):
+        self.enabled = enabled
+        self.records = {}
+        self._callbacks = [] if callback is None else [callback]
+        self._current = {}
+        self._lock = threading.Lock()
+
+    def add_callback(self, callback):
+        """Add a function called with ``(year, phases)`` per year."""
+        self._callbacks.append(callback)
+
+    def span(self, name):
+        """Context manager timing the phase `name` of the current year."""
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(name)
+
+    @contextlib.contextmanager
+    def _span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        """Add `seconds` to the phase `name` of the current year."""
+        with self._lock:
+            self._current[name] = self._current.get(name, 0.0) + seconds
+
+    def finish_year(self, year):
+        """Store the phases timed since the last year as `year` and pass
+        them to the callbacks.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            phases, self._current = self._current, {}
+        self.records[year] = phases
+        for callback in self._callbacks:
+            callback(year, phases)
+
+    def reset(self):
+        """Discard all records and the phases of the current year."""
+        with self._lock:
+            self.records = {}
+            self._current = {}
+
+    def to_json(self, file_name=None):
+        """Records as JSON ``{year: {phase: seconds}}``.
+
+        Parameters
+        ----------
+        file_name : str, optional
+            File to write to. If None, the JSON string is returned.
+        """
+        records = {str(year): phases for year, phases in self.records.items()}
+        if file_name is None:
+            return json.dumps(records, indent=2)
+        with open(file_name, "w") as file:
+            json.dump(records, file, indent=2)
+
+    def to_csv(self, file_name=None):
+        """Records as CSV with the columns year, phase and seconds.
+
+        Parameters
+        ----------
+        file_name : str, optional
+            File to write to. If None, the CSV string is returned.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["year", "phase", "seconds"])
+        for year, phases in self.records.items():
+            for phase, seconds in phases.items():
+                writer.writerow([year, phase, seconds])
+        if file_name is None:
+            return buffer.getvalue()
+        with open(file_name, "w", newline="") as file:
+            file.write(buffer.getvalue())
+
+    def __repr__(self):
+        return (
+            f"<{type(self).__name__} enabled={self.enabled}"
+            f" years={len(self.records)}>"
+        )
@@ -4,6 +4,12 @@ import numpy as np
 import networkx as nx
 import pycopancore.model_components.base.implementation as base
 
+from . import memory
+from .aggregate import Aggregator
+from .country import CountryIndex
+from .kernel import KernelCache
+from .spatial import GridIndex
+
 
 class World(base.World):
     """An LPJmL-integrating world entity.
@@ -20,11 +26,22 @@ class World(base.World):
     output : pycoupler.LPJmLDataSet
         Coupled LPJmL model outputs.
     grid : pycoupler.LPJmLData
-        Grid of the LPJmL model.
+        Grid of the LPJmL model. The cells are indexed spatially on first
+        access of `grid_index` (`pycopanlpjml.spatial.GridIndex`) for
+        vectorized `nearest_cell` and `cells_within` queries.
     country : pycoupler.LPJmLData
-        Countries of each cell as country code.
+        Countries of each cell as country code (or name). The cells of
+        each country are indexed once as `country_index`
+        (`pycopanlpjml.CountryIndex`) for vectorized per-country
+        aggregation and broadcasting.
     area : pycoupler.LPJmLData
-        Area of each cell in square meters.
+        Area of each cell in square meters. If not given, the area is
+        computed from the grid for the aggregation of world arrays
+        (`aggregate`).
+    country_names : numpy.ndarray, optional
+        Lookup table of the names of integer country codes (see
+        `pycopanlpjml.Component.country_names`), defaults to the table of
+        the model.
     kwargs : dict, optional
         Additional keyword arguments.
 
@@ -76,6 +93,7 @@ class World(base.World):
         grid=None,
         country=None,
         area=None,
+        country_names=None,
         **kwargs,
     ):
 
@@ -96,13 +114,248 @@ class World(base.World):
         # hold the grid information for each cell (lon, lat) from LPJmL
         if grid is not None:
             self.grid = grid
-            # initialize the neighbourhood as networkx graph
+            # initialize the neighbourhood as networkx graph (may be replaced
+            #   by a compact pycopanlpjml.Neighbourhood in init_cells)
             self.neighbourhood = nx.Graph()
 
         # hold the country information (country code str) from LPJmL
         if country is not None:
             self.country = country
+            # integer country codes are labelled by the model lookup table
+            if not np.issubdtype(country.dtype, np.integer):
+                country_names = None
+            elif country_names is None:
+                country_names = getattr(self.model, "country_names", None)
+            self.country_index = CountryIndex(country, names=country_names)
 
         # hold the area in m2 from LPJmL
         if area is not None:
             self.area = area
+
+    @property
+    def grid_index(self):
+        """Spatial index of the `grid` (`pycopanlpjml.spatial.GridIndex`),
+        built on first access (and again if the grid is replaced).
+        """
+        grid, index = getattr(self, "_grid_index", (None, None))
+        if index is None or grid is not self.grid:
+            index = GridIndex.from_grid(self.grid)
+            self._grid_index = (self.grid, index)
+        return index
+
+    def nearest_cell(self, lon, lat, return_distance=False):
+        """Positions of the cells nearest to points (lon/lat in degrees),
+        see `pycopanlpjml.spatial.GridIndex.nearest_cell`.
+
+        Examples
+        --------
+        >>> cells = world.nearest_cell(households.lon, households.lat)
+        >>> world.output.cftfrac.values[cells]
+        """
+        return self.grid_index.nearest_cell(
+            lon, lat, return_distance=return_distance
+        )
+
+    def cells_within(self, lon, lat, radius_km, return_distance=False):
+        """Positions of the cells within `radius_km` of points (lon/lat in
+        degrees), see `pycopanlpjml.spatial.GridIndex.cells_within`.
+        """
+        return self.grid_index.cells_within(
+            lon, lat, radius_km, return_distance=return_distance
+        )
+
+    @property
+    def kernel_cache(self):
+        """Cache of the distance kernels of the `grid`
+        (`pycopanlpjml.kernel.KernelCache`), created on first access (and
+        again if the grid is replaced).
+        """
+        grid, cache = getattr(self, "_kernel_cache", (None, None))
+        if cache is None or grid is not self.grid:
+            cache = KernelCache(self.grid_index)
+            self._kernel_cache = (self.grid, cache)
+        return cache
+
+    def distance_kernel(self, radius_km, **kwargs):
+        """Distance-weighted interaction kernel of the cells within
+        `radius_km`, built once per grid and kernel parameters and cached
+        on the world (see `kernel_cache`, kernels of a callable `decay` are
+        not cached). See
+        `pycopanlpjml.kernel.DistanceKernel.from_grid_index` for the
+        keyword arguments.
+
+        Examples
+        --------
+        >>> kernel = world.distance_kernel(
+        ...     200, decay="gaussian", scale_km=80, normalize=True
+        ... )
+        >>> neighbour_yield = kernel.apply(world.output.pft_harvestc)
+        """
+        return self.kernel_cache.get(radius_km, **kwargs)
+
+    @property
+    def aggregator(self):
+        """Area-weighted aggregation of world arrays
+        (`pycopanlpjml.aggregate.Aggregator`) with cached group weights,
+        built on first access (and again if the area or grid is replaced).
+        """
+        source = getattr(self, "area", None), self.grid
+        cached, aggregator = getattr(self, "_aggregator", ((), None))
+        if aggregator is None or any(
+            new is not old for new, old in zip(source, cached)
+        ):
+            aggregator = Aggregator.from_world(self)
+            self._aggregator = (source, aggregator)
+        return aggregator
+
+    def aggregate(
+        self,
+        values,
+        how="sum",
+        by="global",
+        band=None,
+        fraction=None,
+        time=-1,
+    ):
+        """Area-weighted total or mean of a world array over groups of
+        cells.
+
+        Parameters
+        ----------
+        values : str, numpy.ndarray or xarray.DataArray
+            World array with the cell dimension or name of an output.
+        how : str, default "sum"
+            "sum" for totals (values per m2 times area) or "mean" for
+            means weighted by the area.
+        by : str, dict or selection, default "global"
+            "global", "country", a selection of cells (see `select_cells`)
+            or a dict of region name and selection.
+        band : label or list, optional
+            Band(s) to aggregate, defaults to all bands.
+        fraction : str, numpy.ndarray or xarray.DataArray, optional
+            Fraction of the cell area the values refer to (or name of an
+            output, e.g. "cftfrac").
+        time : int or slice, default -1
+            Time step(s), -1 for the current time step, None for the whole
+            output history.
+
+        Returns
+        -------
+        numpy.ndarray or xarray.DataArray
+            See `pycopanlpjml.aggregate.Aggregator.total`.
+
+        Examples
+        --------
+        >>> world.aggregate(
+        ...     "pft_harvestc", by="country", fraction="cftfrac", time=None
+        ... )
+        """
+        if isinstance(values, str):
+            values = self.output[values]
+        if isinstance(fraction, str):
+            fraction = self.output[fraction]
+        if isinstance(by, dict) and not set(by) <= {"lon", "lat"}:
+            by = {name: self._cell_mask(select) for name, select in by.items()}
+        elif not isinstance(by, str):
+            by = self._cell_mask(by)
+        aggregator = self.aggregator
+        if how == "mean":
+            return aggregator.mean(values, by, band, fraction, time)
+        if how != "sum":
+            raise ValueError(
+                f"Unknown aggregation '{how}', must be 'sum' or 'mean'."
+            )
+        return aggregator.total(values, by, band, fraction, time)
+
+    def _cell_mask(self, select):
+        """Boolean cell mask of a selection (see `select_cells`)."""
+        mask = np.zeros(self.grid.sizes["cell"], dtype=bool)
+        mask[self.select_cells(select)] = True
+        return mask
+
+    def memory_report(self, cells=True, sample=None):
+        """Bytes held by the world data, the output history, the cells, the
+        neighbourhood and the derived indexes.
+
+        Cell attributes are classified as views of the world buffers,
+        copies (e.g. of an `isel` that could not return a view) or lazily
+        resolved (see `pycopanlpjml.memory.cell_report`).
+
+        Parameters
+        ----------
+        cells : bool, default True
+            Whether to inspect the cell objects.
+        sample : int, optional
+            Only inspect every n-th cell and extrapolate.
+
+        Returns
+        -------
+        dict
+            See `pycopanlpjml.memory.memory_report`.
+
+        Examples
+        --------
+        >>> report = world.memory_report(sample=100)
+        >>> report["history"]["output.pft_harvestc"], report["total"]
+        """
+        return memory.memory_report(self, cells=cells, sample=sample)
+
+    def select_cells(self, select):
+        """Positions of the cells matching a selection.
+
+        Parameters
+        ----------
+        select : array_like, list of str, dict or callable
+            Boolean mask along the cell dimension, cell positions
+            (integers in 0 to ncell - 1), countries (names, see
+            `country_index`), a lat/lon box as dict ``{"lon": (min, max),
+            "lat": (min, max)}`` (bounds included, either key optional) or a
+            predicate ``select(world)`` returning one of these, e.g.
+            ``lambda world:
+            world.output.cftfrac.isel(time=-1).sum("band") > 0``.
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted cell positions.
+        """
+        if callable(select):
+            select = select(self)
+        ncell = self.grid.sizes["cell"]
+        if isinstance(select, dict):
+            unknown = set(select) - {"lon", "lat"}
+            if unknown:
+                raise ValueError(
+                    f"Unknown bounds {sorted(unknown)} of the box, must be"
+                    " 'lon' or 'lat'."
+                )
+            mask = np.ones(ncell, dtype=bool)
+            for name, (lower, upper) in select.items():
+                coord = np.asarray(self.grid.coords[name].values)
+                mask &= (coord >= lower) & (coord <= upper)
+            return np.flatnonzero(mask)
+
+        values = np.atleast_1d(getattr(select, "values", select))
+        if values.size == 0:
+            return np.empty(0, dtype=np.int64)
+        if values.dtype == bool:
+            values = values.reshape(-1)
+            if values.size != ncell:
+                raise ValueError(
+                    f"Length of the cell mask ({values.size}) does not"
+                    f" match the number of cells ({ncell})."
+                )
+            return np.flatnonzero(values)
+        if np.issubdtype(values.dtype, np.integer):
+            invalid = (values < 0) | (values >= ncell)
+            if invalid.any():
+                raise ValueError(
+                    f"Cell positions {np.unique(values[invalid]).tolist()}"
+                    f" out of range, must be in 0 to {ncell - 1}."
+                )
+            return np.unique(values)
+        return np.unique(
+            np.concatenate(
+                [self.country_index[country] for country in values.tolist()]
+            )
+        )
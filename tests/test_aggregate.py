@@ -0,0 +1,113 @@
+"""Test the area-weighted aggregation of copan:LPJmL world arrays."""
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from pycopanlpjml import CountryIndex
+from pycopanlpjml.aggregate import Aggregator, cell_area
+
+
+def make_values(ncell=6, nband=3, ntime=4):
+    rng = np.random.default_rng(0)
+    return xr.DataArray(
+        rng.random((ncell, nband, ntime)),
+        dims=("cell", "band", "time"),
+        coords={"band": ["a", "b", "c"], "time": np.arange(ntime)},
+        name="harvest",
+    )
+
+
+def test_cell_area():
+    # cells at the equator and at 60 degrees north
+    area = cell_area([0.25, 60.25], 0.5)
+    np.testing.assert_allclose(
+        area[0], (111194.9 * 0.5) ** 2 * np.cos(np.radians(0.25))
+    )
+    np.testing.assert_allclose(area[1] / area[0], 0.5, rtol=1e-2)
+    assert cell_area([10], (1, 0.5))[0] == pytest.approx(
+        111194.9**2 * 0.5 * np.cos(np.radians(10))
+    )
+
+
+def test_aggregator():
+    values = make_values()
+    area = np.arange(1.0, 7.0)
+    index = CountryIndex(np.array(["DEU", "FRA", "DEU", "POL", "FRA", "DEU"]))
+    aggregator = Aggregator(area, country_index=index)
+    latest = values.isel(time=-1).values
+
+    total = aggregator.total(values)
+    assert total.dims == ("band",)
+    np.testing.assert_allclose(total.values, area @ latest)
+    mean = aggregator.mean(values, band="b")
+    assert mean.dims == ()
+    np.testing.assert_allclose(mean, area @ latest[:, 1] / area.sum())
+
+    # per country, with band selection over the history
+    totals = aggregator.total(values, by="country", band=["a", "c"], time=None)
+    assert totals.dims == ("country", "band", "time")
+    assert totals.country.values.tolist() == ["DEU", "FRA", "POL"]
+    deu = [0, 2, 5]
+    np.testing.assert_allclose(
+        totals.sel(country="DEU").values,
+        np.einsum("c,cbt->bt", area[deu], values.values[deu][:, [0, 2]]),
+    )
+
+    # masks and regions (numpy arrays are aggregated as given)
+    mask = np.array([True, True, False, False, False, True])
+    np.testing.assert_allclose(
+        aggregator.total(latest, by=mask), area[mask] @ latest[mask]
+    )
+    regions = aggregator.mean(latest, by={"west": mask, "east": ~mask}, band=2)
+    np.testing.assert_allclose(
+        regions,
+        [
+            area[mask] @ latest[mask, 2] / area[mask].sum(),
+            area[~mask] @ latest[~mask, 2] / area[~mask].sum(),
+        ],
+    )
+
+    # weights of the groupings are cached
+    assert aggregator.groups("country") is aggregator.groups("country")
+    assert aggregator.groups(mask.copy()) is aggregator.groups(mask)
+
+    # only the most recently used mask groupings are kept
+    bounded = Aggregator(area, country_index=index, cache_size=2)
+    bounded.groups("country")
+    for threshold in range(6):
+        bounded.total(latest, by=area > threshold)
+    assert len(bounded._groups) == 3
+    assert "country" in bounded._groups
+    groups = bounded.groups(area > 4)
+    bounded.groups(area > 0)
+    assert bounded.groups(area > 4) is groups
+
+    with pytest.raises(ValueError):
+        aggregator.total(values, by="continent")
+    with pytest.raises(ValueError):
+        aggregator.total(values, by=mask[1:])
+    with pytest.raises(ValueError):
+        Aggregator(area).total(values, by="country")
+
+
+def test_aggregator_fraction():
+    values = make_values()
+    fraction = make_values() / 3
+    area = np.full(6, 2.0)
+    aggregator = Aggregator(area)
+
+    # totals of outputs per area on a fraction of the cells
+    total = aggregator.total(values, fraction=fraction)
+    expected = np.einsum(
+        "c,cb->b",
+        area,
+        values.isel(time=-1).values * fraction.isel(time=-1).values,
+    )
+    np.testing.assert_allclose(total.values, expected)
+    # means per fraction weighted area
+    mean = aggregator.mean(values, fraction=fraction)
+    np.testing.assert_allclose(
+        mean.values,
+        expected / (area @ fraction.isel(time=-1).values),
+    )
@@ -0,0 +1,63 @@
+"""Test the compact storage dtypes of the copan:LPJmL world data."""
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from pycopanlpjml.compact import StoragePolicy
+
+
+def make_output():
+    """Output dataset with float64 and int64 variables."""
+    return xr.Dataset(
+        {
+            "cftfrac": (("cell", "band"), np.full((3, 2), 0.1)),
+            "hdate": (
+                ("cell", "band"),
+                np.array([[0, 120], [300, 365]] * 2)[:3],
+            ),
+            "soilc": (("cell", "band"), np.ones((3, 2))),
+        }
+    )
+
+
+def test_apply():
+    output = make_output()
+    policy = StoragePolicy({"cftfrac": "float32", "hdate": "int16"})
+    assert len(policy) == 2
+    assert policy.apply(output) == ["cftfrac", "hdate"]
+    assert output.cftfrac.dtype == np.float32
+    assert output.hdate.dtype == np.int16
+    assert output.soilc.dtype == np.float64
+    np.testing.assert_array_equal(output.hdate[1], [300, 365])
+    # float values are rounded to the storage dtype
+    assert output.cftfrac.values[0, 0] == np.float32(0.1)
+    # converted only once
+    values = output.hdate.values
+    assert policy.apply(output) == []
+    assert output.hdate.values is values
+    # received values are cast on assignment
+    values[0] = np.array([7, 8], dtype=np.int64)
+    assert output.hdate.dtype == np.int16
+
+
+def test_precision_contract():
+    policy = StoragePolicy({"hdate": "int8", "cftfrac": "float16"})
+    with pytest.raises(ValueError):
+        # 300 exceeds int8
+        policy.apply(make_output())
+    with pytest.raises(ValueError):
+        # the kind of the variable is kept
+        StoragePolicy({"hdate": "float32"}).apply(make_output())
+    with pytest.raises(ValueError):
+        StoragePolicy({"hdate": "U3"})
+
+    policy.check({"hdate": np.array([-128, 127]), "soilc": np.ones(2) * 1e9})
+    with pytest.raises(ValueError):
+        policy.check({"hdate": np.array([0.0, np.nan])})
+    with pytest.raises(ValueError):
+        policy.check({"cftfrac": np.array([0.5, 1e5])})
+    # non-finite float values are kept
+    policy.check({"cftfrac": np.array([np.nan, np.inf, 0.5])})
+    # safe casts are not checked
+    policy.check({"hdate": np.array([1], dtype=np.int8)})
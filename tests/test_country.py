@@ -0,0 +1,116 @@
+"""Test the country index of the copan:LPJmL world."""
+
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from pycopanlpjml import CountryIndex
+from pycopanlpjml.country import code_names, decode
+
+
+def test_country_index():
+    country = xr.DataArray(
+        np.array([["NLD"], ["DEU"], ["NLD"], ["DEU"], ["FRA"]]),
+        dims=("cell", "band"),
+    )
+    index = CountryIndex(country)
+
+    assert list(index) == ["DEU", "FRA", "NLD"]
+    assert index.sizes.tolist() == [2, 1, 2]
+    assert index["NLD"].tolist() == [0, 2]
+    assert "USA" not in index
+    with pytest.raises(KeyError):
+        index["USA"]
+    assert [cells.tolist() for cells in index.partitions()] == [
+        [1, 3],
+        [4],
+        [0, 2],
+    ]
+
+    values = np.array([[1.0, 10.0], [2.0, 20.0], [3.0, 30.0], [4.0, 40.0]])
+    values = np.vstack([values, [[5.0, 50.0]]])
+    area = np.array([1.0, 1.0, 3.0, 1.0, 2.0])
+    np.testing.assert_array_equal(index.aggregate(values)[:, 0], [6, 5, 4])
+    np.testing.assert_array_equal(
+        index.aggregate(values, weights=area)[:, 0], [6, 10, 10]
+    )
+    np.testing.assert_array_equal(
+        index.aggregate(values, how="mean", weights=area)[:, 1],
+        [30, 50, 25],
+    )
+    np.testing.assert_array_equal(
+        index.aggregate(values, how="max")[:, 0], [4, 5, 3]
+    )
+    with pytest.raises(ValueError):
+        index.aggregate(values, how="median")
+
+    # data arrays keep their dimension order with country instead of cell
+    harvest = xr.DataArray(values.T, dims=("band", "cell"), name="harvest")
+    total = index.aggregate(harvest, how="min")
+    assert total.dims == ("band", "country")
+    assert total.sel(country="NLD").values.tolist() == [1, 10]
+
+    np.testing.assert_array_equal(
+        index.broadcast(total.isel(band=0)), [1, 2, 1, 2, 5]
+    )
+    np.testing.assert_array_equal(
+        index.broadcast({"DEU": 0, "FRA": 3}, fill_value=1),
+        [1, 0, 1, 0, 3],
+    )
+    with pytest.raises(ValueError):
+        index.broadcast([1, 2])
+    # misspelled countries are not silently filled
+    with pytest.raises(KeyError):
+        index.broadcast({"DUE": 0})
+
+
+def test_code_names(tmp_path, monkeypatch):
+    import pycoupler.utils
+
+    calls = []
+    get_countries = pycoupler.utils.get_countries
+
+    def counted():
+        calls.append(1)
+        return get_countries()
+
+    monkeypatch.setattr(pycoupler.utils, "get_countries", counted)
+    config = SimpleNamespace(
+        countrypar=[
+            {"id": 0, "name": "Afghanistan"},
+            {"id": 2, "name": "Germany"},
+        ]
+    )
+    cache_dir = tmp_path / "cache"
+    names = code_names(config, iso=True, cache_dir=cache_dir)
+    assert names.tolist() == ["AFG", "1", "DEU"]
+
+    # the lookup table is read from the cache on repeated launches
+    cached = code_names(config, iso=True, cache_dir=cache_dir)
+    assert cached.tolist() == names.tolist() and len(calls) == 1
+    # names and ISO codes are cached separately
+    assert code_names(config, cache_dir=cache_dir)[2] == "Germany"
+    assert len(os.listdir(cache_dir)) == 2
+    # changed parameters are not served from the cache
+    config.countrypar[1]["name"] = "France"
+    assert code_names(config, iso=True, cache_dir=cache_dir)[2] == "FRA"
+    assert len(calls) == 2
+    # no cache by default
+    code_names(config, iso=True)
+    assert len(calls) == 3 and len(os.listdir(cache_dir)) == 3
+
+    assert decode(np.array([[2], [5], [0]]), names).tolist() == [
+        ["DEU"],
+        ["5"],
+        ["AFG"],
+    ]
+
+    # countries as codes are labelled by name
+    index = CountryIndex(np.array([2, 0, 2], dtype=np.int16), names=names)
+    assert list(index) == ["AFG", "DEU"]
+    assert index["DEU"].tolist() == index[2].tolist() == [0, 2]
+    assert index.cell_names().tolist() == ["DEU", "AFG", "DEU"]
+    assert index.broadcast({"DEU": 1.0}, fill_value=0).tolist() == [1, 0, 1]
@@ -0,0 +1,101 @@
+"""Test the domain decomposition of the copan:LPJmL world."""
+
+import sys
+
+import numpy as np
+import pytest
+
+from pycopanlpjml import Neighbourhood
+from pycopanlpjml.domain import Domain, DomainDecomposition, decompose
+from pycopanlpjml.standin import LPJmLStandIn
+from .test_standin import Model, free_port
+
+
+def test_decompose():
+    partitions = [np.arange(3 * i, 3 * i + 3) for i in range(5)]
+    assert decompose(partitions, 2).tolist() == [0] * 9 + [1] * 6
+    assert decompose(partitions, 5).tolist() == np.repeat(range(5), 3).tolist()
+    # every domain gets a partition
+    uneven = [np.arange(10), np.array([10]), np.array([11])]
+    assert decompose(uneven, 3).tolist() == [0] * 10 + [1, 2]
+    with pytest.raises(ValueError):
+        decompose(partitions, 6)
+
+
+def test_domain_build():
+    # chain of 6 cells split into 3 domains
+    neighbourhood = Neighbourhood.from_pairs(
+        [(icell, icell + 1) for icell in range(5)], 6
+    )
+    domains = Domain.build(np.array([0, 0, 1, 1, 2, 2]), neighbourhood)
+
+    middle = domains[1]
+    assert middle.cells.tolist() == [2, 3]
+    assert middle.halo.tolist() == [1, 4]
+    assert middle.peers == [0, 2]
+    # local positions: owned cells first, then the halo
+    assert middle.send == {0: [0], 2: [1]}
+    assert middle.recv == {0: [2], 2: [3]}
+    assert middle.neighbourhood.neighbours(0).tolist() == [2, 1]
+    assert domains[0].send == {1: [1]} and domains[0].recv == {1: [2]}
+
+
+def init_adopters(rank):
+    tillage = rank.world.input.with_tillage.values.reshape(-1)
+    tillage[: rank.ncell] = rank.domain.cells % 3 == 0
+
+
+def spread_tillage(rank, t):
+    """Adopt tillage if enough neighbours (incl. the halo) do."""
+    tillage = rank.world.input.with_tillage.values.reshape(-1)
+    rank.exchange_input("with_tillage")
+    mean = rank.world.neighbourhood.neighbour_mean(tillage)
+    tillage[: rank.ncell] = mean[: rank.ncell] > 0.4
+
+
+def latest_hdate(rank):
+    return rank.world.output.hdate.values[: rank.ncell, ..., -1]
+
+
+def test_domain_decomposition(test_path, tmp_path, monkeypatch):
+    """Run the decomposed model against a synthetic stand-in."""
+    monkeypatch.delattr(sys, "_called_from_test")
+    port = free_port()
+
+    with LPJmLStandIn.synthetic(
+        f"{test_path}/data/config_coupled_test.json",
+        ncell=100,
+        workspace=tmp_path,
+        port=port,
+    ) as standin:
+        model = Model(config_file=standin.config_file, lpjml_port=port)
+        neighbourhood = Neighbourhood.from_neighbour_matrix(
+            model.lpjml.grid.get_neighbourhood(id=False)
+        )
+        expected = (np.arange(100) % 3 == 0).astype(float)
+        with DomainDecomposition(
+            model,
+            ndomain=3,
+            step=spread_tillage,
+            init=init_adopters,
+            size=2.0,
+        ) as domains:
+            assert domains.ndomain == 3
+            assert np.bincount(domains.owner).tolist() == [
+                len(domain.cells) for domain in domains.domains
+            ]
+            assert all(len(domain.halo) for domain in domains.domains)
+            for year in model.lpjml.get_sim_years():
+                expected = neighbourhood.neighbour_mean(expected) > 0.4
+                expected = expected.astype(float)
+                domains.update(year)
+            hdate = domains.call(latest_hdate)
+
+    np.testing.assert_array_equal(
+        model.world.input.with_tillage.values.reshape(-1), expected
+    )
+    np.testing.assert_array_equal(standin.inputs_received[7][:, 0], expected)
+    for domain, values in zip(domains.domains, hdate):
+        np.testing.assert_array_equal(
+            values, model.world.output.hdate.values[domain.cells, ..., -1]
+        )
@@ -0,0 +1,79 @@
+"""Test the ensemble of concurrently coupled simulations."""
+
+import contextlib
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+import pycopanlpjml as lpjml
+from pycopanlpjml.ensemble import Ensemble
+from pycopanlpjml.standin import LPJmLStandIn
+from .conftest import get_test_path
+from .test_standin import Model
+
+
+def test_ensemble(test_path, tmp_path, monkeypatch):
+    """Run two members against synthetic stand-ins concurrently."""
+    monkeypatch.delattr(sys, "_called_from_test")
+    config_file = f"{test_path}/data/config_coupled_test.json"
+    ncells = {"small": 10, "large": 200}
+    standins = {}
+
+    def launch(name, port):
+        standins[name] = stack.enter_context(
+            LPJmLStandIn.synthetic(
+                config_file,
+                ncell=ncells[name],
+                workspace=tmp_path / name,
+                port=port,
+            )
+        )
+
+    def member(name):
+        return lambda port: Model(
+            config_file=standins[name].config_file, lpjml_port=port
+        )
+
+    def stop_tillage(model, year):
+        model.world.input.with_tillage.values[:] = 0
+
+    with contextlib.ExitStack() as stack:
+        ensemble = Ensemble(
+            {name: member(name) for name in ncells},
+            step=stop_tillage,
+            launch=launch,
+        )
+        assert len(set(ensemble.ports.values())) == 2
+        report = ensemble.run()
+
+    years = len(ensemble.members["small"].years)
+    for name, ncell in ncells.items():
+        assert report[name]["years"] == years
+        assert report[name]["error"] is None
+        assert report[name]["years_per_second"] > 0
+        assert ensemble.models[name].lpjml.ncell == ncell
+        assert (standins[name].inputs_received[7] == 0).all()
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_ensemble_error(test_path, monkeypatch):
+    """A failing member does not stop the others."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    def fail(port):
+        raise ConnectionError("LPJmL did not connect")
+
+    model = Model(config_file="config_coupled_test.json")
+    ensemble = Ensemble({"model": model, "failed": fail})
+    assert list(ensemble.ports) == ["failed"]
+    with pytest.raises(RuntimeError, match="failed"):
+        ensemble.run()
+
+    report = ensemble.report()
+    assert isinstance(report["failed"]["error"], ConnectionError)
+    assert report["model"]["years"] == len(ensemble.members["model"].years)
+    assert isinstance(ensemble.models["model"], lpjml.Component)
@@ -0,0 +1,119 @@
+"""Test the output history of the copan:LPJmL world."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from pycoupler.data import LPJmLData, LPJmLDataSet
+
+from pycopanlpjml import OutputHistory
+from pycopanlpjml.history import year_end
+
+
+def make_output(years, ncell=2, nband=3):
+    """Output dataset with values encoding year, cell and band."""
+    values = (
+        np.asarray(years)[np.newaxis, np.newaxis, :] * 100
+        + np.arange(ncell)[:, np.newaxis, np.newaxis] * 10
+        + np.arange(nband)[np.newaxis, :, np.newaxis]
+    )
+    time = pd.to_datetime([f"{year}-12-31" for year in years])
+    return LPJmLDataSet(
+        {
+            "harvest": LPJmLData(
+                data=values.astype(float),
+                dims=("cell", "band (harvest)", "time"),
+                coords={"cell": np.arange(ncell), "time": time},
+                name="harvest",
+            ),
+            "hdate": LPJmLData(
+                data=values[:, :1].astype(int),
+                dims=("cell", "band (hdate)", "time"),
+                coords={"cell": np.arange(ncell), "time": time},
+                name="hdate",
+            ),
+        }
+    )
+
+
+def test_year_end():
+    assert year_end(2023) == np.datetime64("2023-12-31")
+    assert year_end([1999, 2000]).tolist() == [
+        np.datetime64("1999-12-31").item(),
+        np.datetime64("2000-12-31").item(),
+    ]
+
+
+@pytest.mark.parametrize("mode", ["shift", "ring"])
+def test_output_history(mode):
+    """Test appending years for both storage modes."""
+    output = make_output([2020, 2021, 2022])
+    history = OutputHistory(output, mode=mode)
+
+    for year in range(2023, 2028):
+        history.append(make_output([year]), year)
+        expected = make_output([year - 2, year - 1, year])
+        np.testing.assert_array_equal(
+            output.harvest.values, expected.harvest.values
+        )
+        np.testing.assert_array_equal(output.time.values, expected.time.values)
+        assert history.years.tolist() == [year - 2, year - 1, year]
+        np.testing.assert_array_equal(
+            history.latest("hdate"), expected.hdate.values[..., -1]
+        )
+
+    # variables without output carry their latest values forward
+    history.append({"harvest": make_output([2028]).harvest}, 2028)
+    assert output.hdate.values[0, 0].tolist() == [202600, 202700, 202700]
+    assert output.harvest.values[0, 0, -1] == 202800
+
+
+def test_output_history_mode():
+    with pytest.raises(ValueError):
+        OutputHistory(make_output([2020]), mode="unknown")
+
+
+@pytest.mark.parametrize("mode", ["shift", "ring"])
+def test_output_history_latest(mode):
+    """Test variables of which only the latest values are kept."""
+    output = make_output([2020, 2021, 2022])
+    history = OutputHistory(output, mode=mode, latest=["hdate"])
+
+    history.append(make_output([2023]), 2023)
+    assert history.years.tolist() == [2021, 2022, 2023]
+    assert output.harvest.values[0, 0].tolist() == [202100, 202200, 202300]
+    # the earlier time steps are not shifted
+    assert output.hdate.values[0, 0].tolist() == [202000, 202100, 202300]
+    np.testing.assert_array_equal(
+        history.latest("hdate"), make_output([2023]).hdate.values[..., 0]
+    )
+
+
+@pytest.mark.parametrize("mode", ["shift", "ring"])
+@pytest.mark.parametrize("nyear", [2, 5])
+def test_output_history_extend(mode, nyear):
+    """Test appending several years in one step."""
+    output = make_output([2020, 2021, 2022])
+    history = OutputHistory(output, mode=mode)
+    years = list(range(2023, 2023 + nyear))
+    outputs = [
+        {"harvest": make_output([year]).harvest.values[..., 0]}
+        for year in years
+    ]
+    # hdate only in the second year, carried forward afterwards
+    outputs[1]["hdate"] = make_output([years[1]]).hdate
+
+    expected = OutputHistory(make_output([2020, 2021, 2022]), mode=mode)
+    for year, year_output in zip(years, outputs):
+        expected.append(year_output, year)
+
+    history.extend(outputs, years)
+    assert history.years.tolist() == list(range(years[-1] - 2, years[-1] + 1))
+    for name in ("harvest", "hdate"):
+        np.testing.assert_array_equal(
+            output[name].values, expected.output[name].values
+        )
+    np.testing.assert_array_equal(
+        output.time.values, expected.output.time.values
+    )
+    with pytest.raises(ValueError):
+        history.extend(outputs, years[:-1])
@@ -0,0 +1,117 @@
+"""Test the change tracking of the copan:LPJmL world input."""
+
+import struct
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from pycopanlpjml.cell import CellView
+from pycopanlpjml.inputs import InputTracker, encode, use_send_values
+
+
+def make_input(ncell=10):
+    """Input dataset like `world.input` (cell, band, time)."""
+    return xr.Dataset(
+        {
+            "with_tillage": (
+                ("cell", "band", "time"),
+                np.ones((ncell, 1, 1), dtype=np.int64),
+            ),
+            "fertilizer": (
+                ("cell", "npk", "time"),
+                np.arange(ncell * 2, dtype=np.float64).reshape(ncell, 2, 1),
+            ),
+        }
+    )
+
+
+def test_encode():
+    values = np.arange(6, dtype=np.float64).reshape(3, 2, 1)
+    encoded = encode(values)
+    assert encoded.dtype == np.float32 and encoded.shape == (3, 2)
+    # same bytes as pycoupler sending value by value (cell, band)
+    expected = b"".join(struct.pack("f", value) for value in range(6))
+    assert encoded.tobytes() == expected
+    assert np.shares_memory(encode(encoded), encoded)
+    assert encode(np.ones((3, 1), dtype=np.int64)).dtype == np.int32
+
+
+def test_use_send_values():
+    sent = []
+    lpjml = SimpleNamespace(
+        _send_input_values=None, _channel=SimpleNamespace(sendall=sent.append)
+    )
+    use_send_values(lpjml)
+    lpjml._send_input_values(np.ones((3, 1), dtype=np.int64))
+    assert bytes(sent[0]) == struct.pack("3i", 1, 1, 1)
+
+    # couplers without the private send internals are rejected
+    with pytest.raises(RuntimeError, match="_channel"):
+        use_send_values(SimpleNamespace(_send_input_values=None))
+
+
+def test_input_tracker_compare():
+    input = make_input(ncell=10)
+    tracker = InputTracker(input, block_size=4)
+    assert tracker.nblock == 3
+    assert tracker.encoded_bytes == tracker.nbytes == 10 * 4 + 10 * 2 * 4
+
+    # nothing changed, nothing is re-encoded
+    buffers = tracker.update()
+    assert tracker.encoded_bytes == 0
+    assert buffers["with_tillage"].ravel().tolist() == [1] * 10
+
+    # writes through (cell) views of the world arrays are detected
+    input.with_tillage.isel(cell=5).values[...] = 0
+    input.fertilizer.values[9, 1] = np.nan
+    np.testing.assert_array_equal(
+        tracker.dirty_blocks("with_tillage"), [False, True, False]
+    )
+    buffers = tracker.update()
+    assert tracker.encoded_bytes == 4 * 4 + 2 * 2 * 4
+    assert buffers["with_tillage"][5, 0] == 0
+    assert np.isnan(buffers["fertilizer"][9, 1])
+
+    # unchanged nan values are not dirty
+    assert not tracker.dirty_blocks("fertilizer").any()
+    np.testing.assert_array_equal(
+        buffers["fertilizer"], encode(input.fertilizer.values)
+    )
+
+
+def test_input_tracker_marked():
+    input = make_input(ncell=10)
+    tracker = InputTracker(input, mode="marked", block_size=4)
+
+    # unmarked writes are not sent
+    input.with_tillage.values[:] = 0
+    assert tracker.update()["with_tillage"].ravel().tolist() == [1] * 10
+
+    tracker.mark_dirty("with_tillage", [0, 9])
+    buffers = tracker.update()
+    assert tracker.encoded_bytes == 6 * 4
+    assert (
+        buffers["with_tillage"].ravel().tolist() == [0] * 4 + [1] * 4 + [0] * 2
+    )
+
+    tracker.mark_dirty()
+    tracker.update()
+    assert tracker.encoded_bytes == tracker.nbytes
+    with pytest.raises(KeyError):
+        tracker.mark_dirty("landuse")
+    with pytest.raises(ValueError):
+        InputTracker(input, mode="always")
+
+    # inputs set through cell views are marked
+    tracker.update()
+    view = CellView(input, 5, on_write=tracker.mark_dirty)
+    view.with_tillage = 3
+    view["fertilizer"] = 2.5
+    assert input.with_tillage.values[5, 0, 0] == 3
+    buffers = tracker.update()
+    assert tracker.encoded_bytes == 4 * (4 + 4 * 2)
+    assert buffers["with_tillage"][5].tolist() == [3]
+    with pytest.raises(KeyError):
+        view["landuse"] = 1
@@ -0,0 +1,133 @@
+"""Test the distance-weighted kernels of the copan:LPJmL world."""
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from pycopanlpjml import kernel as kernels
+from pycopanlpjml.kernel import DistanceKernel, KernelCache
+from pycopanlpjml.spatial import GridIndex, haversine
+from pycopanlpjml.standin import synthetic_grid
+
+
+def make_index(ncell=2000):
+    return GridIndex(*synthetic_grid(ncell), cellsize=0.5)
+
+
+def dense_weights(index, radius_km, decay):
+    """Dense weight matrix of a kernel computed cell by cell."""
+    distances = haversine(
+        index.lon[:, None],
+        index.lat[:, None],
+        index.lon[None, :],
+        index.lat[None, :],
+    )
+    return np.where(distances <= radius_km, decay(distances), 0)
+
+
+def test_distance_kernel(monkeypatch):
+    index = make_index()
+    kernel = DistanceKernel.from_grid_index(
+        index, radius_km=120, decay="exponential", scale_km=50
+    )
+    expected = dense_weights(index, 120, lambda d: np.exp(-d / 50))
+    assert kernel.nnz == np.count_nonzero(expected)
+    np.testing.assert_array_equal(kernel.degree, (expected > 0).sum(axis=1))
+
+    rng = np.random.default_rng(0)
+    values = rng.random((index.ncell, 3))
+    np.testing.assert_allclose(kernel.apply(values), expected @ values)
+
+    # data arrays keep their dimensions
+    data = xr.DataArray(values.T, dims=("band", "cell"))
+    result = kernel.apply(data)
+    assert result.dims == ("band", "cell")
+    np.testing.assert_allclose(result.values, (expected @ values).T)
+
+    # (chunked) numpy products equal the sparse product
+    np.testing.assert_allclose(kernel._product(values), expected @ values)
+    monkeypatch.setattr(kernels, "_CHUNK_SIZE", 7)
+    monkeypatch.setattr(kernels, "sparse", None)
+    np.testing.assert_allclose(kernel.apply(values), expected @ values)
+
+
+def test_kernel_product(monkeypatch):
+    """Test the numpy product with empty kernels against a dense one."""
+    # the last cell is isolated and has an empty kernel without itself
+    index = GridIndex(
+        np.array([0.25, 0.75, 1.25, 50.25]), np.full(4, 0.25), cellsize=0.5
+    )
+    kernel = DistanceKernel.from_grid_index(
+        index, 120, decay="uniform", include_self=False
+    )
+    values = np.array([[1.0], [2], [4], [8]])
+    np.testing.assert_array_equal(
+        kernel._product(values), [[6], [5], [3], [0]]
+    )
+
+    # isolated cells at the end of chunks and of the grid
+    rng = np.random.default_rng(1)
+    block, isolated = np.arange(300), np.arange(70)
+    lon = np.concatenate([0.25 + 0.5 * (block % 20), -174.75 + 5 * isolated])
+    lat = np.concatenate([0.25 + 0.5 * (block // 20), np.full(70, -40.25)])
+    order = np.concatenate([rng.permutation(369), [369]])
+    index = GridIndex(lon[order], lat[order], cellsize=0.5)
+    kernel = DistanceKernel.from_grid_index(
+        index, 60, decay="linear", include_self=False
+    )
+    assert kernel.degree[-1] == 0 and (kernel.degree > 0).sum() == 300
+    expected = dense_weights(index, 60, lambda d: 1 - d / 60)
+    np.fill_diagonal(expected, 0)
+    values = rng.random((index.ncell, 2))
+    for size in (1, 7, 50, kernels._CHUNK_SIZE):
+        monkeypatch.setattr(kernels, "_CHUNK_SIZE", size)
+        np.testing.assert_allclose(
+            kernel._product(values), expected @ values, atol=1e-12
+        )
+
+
+def test_distance_kernel_options():
+    index = make_index()
+    kernel = DistanceKernel.from_grid_index(
+        index, 60, decay="uniform", include_self=False, normalize=True
+    )
+    expected = dense_weights(index, 60, np.ones_like)
+    np.fill_diagonal(expected, 0)
+    assert kernel.nnz == np.count_nonzero(expected)
+    assert (kernel.indices != np.repeat(np.arange(2000), kernel.degree)).all()
+    values = np.arange(index.ncell, dtype=float)
+    # uniform normalized weights are the neighbour mean
+    np.testing.assert_allclose(
+        kernel.apply(values), kernel.neighbour_mean(values)
+    )
+
+    linear = DistanceKernel.from_grid_index(index, 60, decay="linear")
+    assert linear.weights.min() >= 0 and linear.weights.max() == 1
+
+    custom = DistanceKernel.from_grid_index(
+        index, 60, decay=lambda distances: 1 / (1 + distances)
+    )
+    np.testing.assert_allclose(custom.weights, 1 / (1 + custom.distances))
+
+    with pytest.raises(ValueError):
+        DistanceKernel.from_grid_index(index, 60, decay="cauchy")
+    with pytest.raises(ValueError):
+        DistanceKernel(kernel.indptr, kernel.indices, kernel.weights[1:])
+
+
+def test_kernel_cache():
+    cache = KernelCache(make_index(), size=2)
+    kernel = cache.get(100, decay="gaussian")
+    assert cache.get(100, decay="gaussian") is kernel
+    assert cache.get(100) is not kernel
+    # kernels of a callable decay are not cached
+    assert cache.get(50, decay=lambda d: 1 / (1 + d)) is not None
+    assert len(cache) == 2
+    # the least recently used kernel is evicted
+    cache.get(100, decay="gaussian")
+    cache.get(200)
+    assert len(cache) == 2
+    assert cache.get(100, decay="gaussian") is kernel
+    assert cache.get(100) is not cache.get(200)
+    cache.clear()
+    assert cache.get(100, decay="gaussian") is not kernel
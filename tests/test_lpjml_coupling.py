@@ -2,6 +2,7 @@
 
 import os
 import datetime
+import networkx as nx
 import numpy as np
 import pytest
 from unittest.mock import patch
@@ -17,7 +18,7 @@ class Model(lpjml.Component):
 
     name = "Test LPJmL coupled model component"
 
-    def __init__(self, **kwargs):
+    def __init__(self, cell_kwargs=None, **kwargs):
         """Initialize an instance of World."""
         super().__init__(**kwargs)
 
@@ -27,10 +28,11 @@ class Model(lpjml.Component):
             output=self.lpjml.read_historic_output(),
             grid=self.lpjml.grid,
             country=self.lpjml.country,
+            country_names=self.country_names,
         )
 
         # initialize cells
-        self.init_cells(cell_class=lpjml.Cell)
+        self.init_cells(cell_class=lpjml.Cell, **(cell_kwargs or {}))
 
     def update(self, t):
         self.update_lpjml(t)
@@ -612,3 +614,790 @@ def test_run_model(test_path):
     finally:
         # Restore original working directory
         os.chdir(original_cwd)
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_lazy_cells(test_path, monkeypatch):
+    """Test lazily resolved cell views against eager xarray views."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json", cell_kwargs={"lazy": True}
+    )
+    world = model.world
+    cells = sorted(world.cells, key=lambda cell: cell.index)
+
+    assert [cell.index for cell in cells] == [0, 1]
+    assert "input" not in cells[1].__dict__
+    np.testing.assert_array_equal(
+        cells[1].output.hdate, world.output.hdate.isel(cell=1).values
+    )
+    np.testing.assert_array_equal(
+        cells[1].grid, world.grid.isel(cell=1).values
+    )
+    assert cells[0].country[0] == "DEU"
+    assert set(cells[0].input) == {"with_tillage"}
+    assert not hasattr(cells[0], "area")
+
+    # cell views write through to the world buffers
+    cells[1].input.with_tillage[:] = 1
+    assert world.input.with_tillage.values[1].tolist() == [[1]]
+    assert world.input.with_tillage.values[0].tolist() == [[-999999]]
+    assert cells[1].input.to_xarray().with_tillage.item() == 1
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_select_cells(test_path, monkeypatch):
+    """Test creating cells of a selection only."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json",
+        cell_kwargs={"select": {"lat": (51.5, 52)}},
+    )
+    world = model.world
+    (cell,) = world.cells
+    assert cell.index == 1
+    assert list(cell.neighbourhood) == []
+    assert list(world.neighbourhood.nodes) == [cell]
+    # the world arrays still cover all cells
+    assert world.output.sizes["cell"] == 2
+
+    assert world.select_cells("DEU").tolist() == [0, 1]
+    assert world.select_cells([True, False]).tolist() == [0]
+    assert world.select_cells([1, 1]).tolist() == [1]
+    assert world.select_cells(
+        lambda world: world.grid.coords["lat"].values < 51.5
+    ).tolist() == [0]
+    with pytest.raises(ValueError):
+        world.select_cells({"x": (0, 1)})
+    with pytest.raises(KeyError):
+        world.select_cells(["FRA"])
+    # cell positions are not wrapped around or clipped
+    with pytest.raises(ValueError, match=r"\[-1\]"):
+        world.select_cells([-1, 0])
+    with pytest.raises(ValueError, match=r"\[2\]"):
+        world.select_cells([1, 2])
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_grid_index(test_path, monkeypatch):
+    """Test the spatial queries on the grid."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    world = Model(config_file="config_coupled_test.json").world
+    assert world.nearest_cell(7.7, 51.3) == 0
+    np.testing.assert_array_equal(
+        world.nearest_cell([8.1, 7.0], [51.9, 51.3]), [1, 0]
+    )
+    assert world.cells_within(7.75, 51.5, radius_km=30).tolist() == [0, 1]
+    assert world.grid_index is world.grid_index
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_distance_kernel(test_path, monkeypatch):
+    """Test the distance-weighted kernels of the world."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    world = Model(config_file="config_coupled_test.json").world
+    # distance-weighted kernels are built once per grid and parameters
+    kernel = world.distance_kernel(60, decay="uniform", normalize=True)
+    assert world.distance_kernel(60, decay="uniform", normalize=True) is kernel
+    np.testing.assert_allclose(
+        kernel.apply(world.output.hdate).values,
+        np.broadcast_to(world.output.hdate.mean("cell"), (2, 24, 1)),
+    )
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_aggregate(test_path, monkeypatch):
+    """Test the area-weighted aggregation of world variables."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    world = Model(config_file="config_coupled_test.json").world
+    # area is computed from the grid
+    area = lpjml.aggregate.cell_area([51.25, 51.75], 0.5)
+    np.testing.assert_allclose(world.aggregator.area, area)
+    harvest = world.output.pft_harvestc.isel(time=-1).values
+    cftfrac = world.output.cftfrac.isel(time=-1).values
+    total = world.aggregate("pft_harvestc", fraction="cftfrac")
+    np.testing.assert_allclose(total.values, area @ (harvest * cftfrac))
+    by_country = world.aggregate(
+        "pft_harvestc", how="mean", by="country", time=None
+    )
+    assert by_country.dims == ("country", "band", "time")
+    assert by_country.country.values.tolist() == ["DEU"]
+    north = world.aggregate(
+        "soilc_agr_layer", by={"north": {"lat": (51.5, 90)}}, band=200.0
+    )
+    assert north.dims == ("region",)
+    np.testing.assert_allclose(
+        north.values,
+        [area[1] * world.output.soilc_agr_layer.values[1, 0, -1]],
+    )
+    assert world.aggregator is world.aggregator
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_memory_report(test_path, monkeypatch):
+    """Test the memory accounting of world, cells and coupler buffers."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(config_file="config_coupled_test.json")
+    world = model.world
+    report = model.memory_report()
+    output = world.output.pft_harvestc
+    assert report["world"]["output.pft_harvestc"] == output.nbytes
+    assert report["history"] == {}
+    assert report["world"]["grid"] == world.grid.nbytes
+    assert report["cells"]["count"] == 2
+    # cells created via isel hold views of the world buffers
+    attributes = report["cells"]["attributes"]
+    assert attributes["output"] == {
+        "views": 2,
+        "copies": 0,
+        "lazy": 0,
+        "bytes": 0,
+    }
+    assert "area" not in attributes
+    assert report["cells"]["copies"] == 0
+    assert report["neighbourhood"] > 0
+    assert report["coupler"] == {}
+    assert report["total"] == lpjml.memory.total_bytes(report)
+
+    # accidental copies of world buffers are detected
+    cell = sorted(world.cells, key=lambda cell: cell.index)[0]
+    cell.output = world.output.isel(cell=[0])
+    report = world.memory_report()
+    assert report["cells"]["attributes"]["output"]["copies"] == 1
+    copied = sum(world.output[name][:1].nbytes for name in world.output)
+    assert report["cells"]["copies"] > copied
+    assert model.memory_report(cells=False).keys() >= {"world", "coupler"}
+
+    # derived indexes are accounted for once built
+    world.distance_kernel(60)
+    world.aggregate("hdate")
+    assert report["indexes"].keys() == {"country_index"}
+    assert world.memory_report()["indexes"].keys() == {
+        "country_index",
+        "grid_index",
+        "kernels",
+        "aggregator",
+    }
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_memory_report_lazy(test_path, monkeypatch):
+    """Test the memory accounting of lazy cells and the history."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json",
+        output_history="ring",
+        input_tracking="compare",
+        cell_kwargs={"on_access": True, "neighbourhood": "csr"},
+    )
+    world = model.world
+    world.cells[0]
+    report = model.memory_report()
+    assert report["cells"]["count"] == 1
+    assert report["cells"]["attributes"]["output"]["lazy"] == 1
+    assert report["coupler"] == {}
+
+    for year in list(model.lpjml.get_sim_years())[:2]:
+        model.update(year)
+    report = model.memory_report()
+    # ring buffers hold the history twice
+    output = world.output.pft_harvestc
+    assert report["world"]["output.pft_harvestc"] == (
+        output.nbytes // output.sizes["time"]
+    )
+    assert report["history"]["output.pft_harvestc"] == (
+        2 * output.nbytes - report["world"]["output.pft_harvestc"]
+    )
+    tracker = model.input_tracker
+    assert report["coupler"]["input_buffers"] == tracker.nbytes
+    assert report["total"] == lpjml.memory.total_bytes(report)
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_cells_on_access(test_path, monkeypatch):
+    """Test creating cells on first access."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    with pytest.raises(ValueError):
+        Model(
+            config_file="config_coupled_test.json",
+            cell_kwargs={"on_access": True},
+        )
+    monkeypatch.setenv("TEST_LINE_COUNTER", "0")
+    model = Model(
+        config_file="config_coupled_test.json",
+        cell_kwargs={
+            "select": ["DEU"],
+            "on_access": True,
+            "neighbourhood": "csr",
+        },
+    )
+    cells = model.world.cells
+    assert isinstance(cells, lpjml.cell.LazyCells)
+    assert len(cells) == 2 and cells.created == {}
+
+    second = cells[1]
+    assert cells[1] is second and list(cells.created) == [1]
+    assert second in cells and second.world is model.world
+    # neighbours are created on access
+    (first,) = second.neighbourhood
+    assert first.index == 0 and first in cells
+    np.testing.assert_array_equal(
+        first.output.hdate, model.world.output.hdate.values[0]
+    )
+
+    for year in model.lpjml.get_sim_years():
+        model.update(year)
+    assert sorted(cell.index for cell in cells) == [0, 1]
+
+    # all cells of the grid without a selection
+    monkeypatch.setenv("TEST_LINE_COUNTER", "0")
+    model = Model(
+        config_file="config_coupled_test.json",
+        cell_kwargs={"on_access": True, "neighbourhood": "csr"},
+    )
+    cells = model.world.cells
+    assert cells.positions.tolist() == [0, 1] and cells.created == {}
+    first = cells[0]
+    assert first.index == 0 and list(cells.created) == [0]
+    (second,) = first.neighbourhood
+    assert second.index == 1
+    np.testing.assert_array_equal(
+        second.output.hdate, model.world.output.hdate.values[1]
+    )
+    assert sorted(cell.index for cell in cells) == [0, 1]
+
+    # positions of a generator (e.g. `LPJmLCoupler.get_cells`)
+    cells = lpjml.cell.LazyCells(lambda index: index, iter(range(3)))
+    assert cells.positions.tolist() == [0, 1, 2]
+    with pytest.raises(ValueError):
+        lpjml.cell.LazyCells(lambda index: index, [[0, 1]])
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_cell_neighbourhood(test_path, monkeypatch):
+    """Test neighbourhood of cells resolved from the world graph."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(config_file="config_coupled_test.json")
+    first, second = sorted(model.world.cells, key=lambda cell: cell.index)
+
+    assert list(model.world.neighbourhood.edges) == [(first, second)]
+    # neighbourhood can be iterated repeatedly
+    assert list(first.neighbourhood) == [second]
+    assert list(first.neighbourhood) == [second]
+    assert list(second.neighbourhood) == [first]
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_csr_cell_neighbourhood(test_path, monkeypatch):
+    """Test cells with the compact CSR neighbourhood backend."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json",
+        cell_kwargs={"lazy": True, "neighbourhood": "csr"},
+    )
+    neighbourhood = model.world.neighbourhood
+    first, second = sorted(model.world.cells, key=lambda cell: cell.index)
+
+    assert isinstance(neighbourhood, lpjml.Neighbourhood)
+    assert list(first.neighbourhood) == [second]
+    np.testing.assert_array_equal(
+        neighbourhood.neighbour_mean(model.world.output.hdate).values[0],
+        model.world.output.hdate.values[1],
+    )
+    assert list(neighbourhood.graph.edges) == [(first, second)]
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_run_model_ring_history(test_path, monkeypatch):
+    """Test running the model with the ring buffer output history."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json",
+        output_history="ring",
+        cell_kwargs={"lazy": True},
+    )
+    # eager cells would keep views of the first ring window
+    with pytest.raises(ValueError):
+        model.init_cells(cell_class=lpjml.Cell)
+    hdate = model.world.output.hdate.values.copy()
+
+    for year in model.lpjml.get_sim_years():
+        model.update(year)
+
+    assert model.output_history.mode == "ring"
+    assert model.output_history.years.tolist() == [2050]
+    cell = min(model.world.cells, key=lambda cell: cell.index)
+    np.testing.assert_array_equal(cell.output.hdate, hdate[0])
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_pipelined_exchange(test_path, monkeypatch):
+    """Test exchanging data with LPJmL in begin and finish steps."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(config_file="config_coupled_test.json")
+    years = list(model.lpjml.get_sim_years())
+
+    with pytest.raises(RuntimeError):
+        model.finish_exchange()
+
+    model.begin_exchange(years[0])
+    assert model.exchange_pending
+    with pytest.raises(RuntimeError):
+        model.begin_exchange(years[0])
+    with pytest.raises(RuntimeError):
+        model.update_lpjml(years[0])
+    # world output is only updated at the synchronization point
+    assert model.output_history.years.tolist() == [2022]
+    assert model.finish_exchange() == years[0]
+    assert not model.exchange_pending
+    assert model.output_history.years.tolist() == [years[0]]
+
+    # errors of the background receive are raised by finish_exchange
+    def fail(t):
+        raise ConnectionError("lost connection")
+
+    monkeypatch.setattr(model, "_receive_output", fail)
+    model.begin_exchange(years[1])
+    with pytest.raises(ConnectionError):
+        model.finish_exchange()
+    assert not model.exchange_pending
+    monkeypatch.undo()
+    monkeypatch.chdir(f"{test_path}/data")
+
+    for year in years[1:]:
+        model.begin_exchange(year)
+        model.finish_exchange()
+    assert model.output_history.years.tolist() == [2050]
+    assert model._exchange_executor is None
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_phase_timing(test_path, monkeypatch):
+    """Test timing the phases of the exchange per simulation year."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(config_file="config_coupled_test.json", timing=True)
+    for year in model.lpjml.get_sim_years():
+        with model.timer.span("social"):
+            pass
+        model.update(year)
+        # update_lpjml exchanges inline, without the exchange thread
+        assert model._exchange_executor is None
+
+    assert list(model.timer.records) == list(range(2023, 2051))
+    assert set(model.timer.records[2050]) == {
+        "social",
+        "read_output",
+        "history_merge",
+        "time_update",
+    }
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_advance(test_path, tmp_path, monkeypatch):
+    """Test fast-forwarding several years in one span."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json",
+        timing=True,
+        output_store=str(tmp_path / "history.nc"),
+    )
+    with pytest.raises(ValueError):
+        model.advance(until=2051, t=2023)
+
+    assert model.advance(until=2030, t=2023) == 2030
+    assert model.output_history.years.tolist() == [2030]
+    assert list(model.timer.records) == [2030]
+    model.update(2031)
+    # the test coupler does not advance its simulation year
+    assert model.lpjml.sim_year == 2023
+    with pytest.raises(ValueError):
+        model.advance(until=2050, t=2032)
+    monkeypatch.setattr(model.lpjml, "_sim_year", 2032)
+    assert model.advance(until=2050, t=2032) == 2050
+
+    assert model.world.input.time.values[0] == np.datetime64("2051-12-31")
+    with model.output_store.open_dataset() as stored:
+        assert stored.sizes["time"] == 1 + 2050 - 2022
+    assert list(model.timer.records) == [2030, 2031, 2050]
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_output_store(test_path, tmp_path, monkeypatch):
+    """Test streaming the output history to disk."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json",
+        output_store=str(tmp_path / "output_history.nc"),
+    )
+    for year in model.lpjml.get_sim_years():
+        model.update(year)
+
+    history = model.output_store.open_dataset()
+    assert history.sizes["time"] == len(range(2022, 2051))
+    np.testing.assert_array_equal(
+        history.hdate.isel(time=-1).values,
+        model.world.output.hdate.isel(time=-1).values,
+    )
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_share_world(test_path, monkeypatch):
+    """Test backing the world arrays with shared memory."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json", cell_kwargs={"lazy": True}
+    )
+    handle = model.share_world()
+    with pytest.raises(RuntimeError):
+        model.share_world()
+
+    # inputs written by (worker) attachments are part of the world input
+    with handle.attach() as world:
+        world.input.with_tillage[1] = 0
+        assert world.country.values[0, 0] == "DEU"
+    cell = min(model.world.cells, key=lambda cell: cell.index)
+    assert cell.input.with_tillage[0] == -999999
+    assert model.world.input.with_tillage.values[1, 0, 0] == 0
+
+    for year in model.lpjml.get_sim_years():
+        model.update(year)
+    assert model.shared_world is None
+    assert model.world.input.with_tillage.values[1, 0, 0] == 0
+
+    model._output_history_mode = "ring"
+    with pytest.raises(ValueError):
+        model.share_world()
+
+    # views of eager cells would detach from the shared world
+    monkeypatch.setenv("TEST_LINE_COUNTER", "0")
+    eager = Model(config_file="config_coupled_test.json")
+    with pytest.raises(RuntimeError):
+        eager.share_world()
+    assert eager.shared_world is None
+    # eager cells are not created for a shared world
+    monkeypatch.setenv("TEST_LINE_COUNTER", "0")
+    model = Model(
+        config_file="config_coupled_test.json", cell_kwargs={"lazy": True}
+    )
+    model.share_world()
+    with pytest.raises(RuntimeError):
+        model.init_cells(cell_class=lpjml.Cell)
+    model.shared_world.close()
+
+
+def stop_tillage(cell, t, rng):
+    """Per-cell update function of test_scheduler."""
+    if cell.country.values[0] == "DEU" and len(cell.neighbours) == 1:
+        return {"with_tillage": 0}
+    return {"with_tillage": 1}
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_scheduler(test_path, monkeypatch):
+    """Test running cell level updates with the scheduler."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json",
+        input_tracking="marked",
+        cell_kwargs={"lazy": True},
+    )
+    assert list(model.world.country_index) == ["DEU"]
+    scheduler = model.init_scheduler(by="country", processes=1)
+    assert model.shared_world is not None
+    assert [cells.tolist() for cells in scheduler.partitions] == [[0, 1]]
+
+    for year in model.lpjml.get_sim_years():
+        model.scheduler.map_cells(stop_tillage, year)
+        model.update(year)
+
+    assert model.scheduler is None and model.shared_world is None
+    assert model.world.input.with_tillage.values.ravel().tolist() == [0, 0]
+    # the scheduler marks the written cells for the input wire buffers
+    assert model.input_tracker.buffers["with_tillage"].ravel().tolist() == [
+        0,
+        0,
+    ]
+
+    # writes into the views of eager cells would not be marked
+    monkeypatch.setenv("TEST_LINE_COUNTER", "0")
+    with pytest.raises(ValueError):
+        Model(config_file="config_coupled_test.json", input_tracking="marked")
+
+    # sharing the world for worker processes requires lazy cells
+    monkeypatch.setenv("TEST_LINE_COUNTER", "0")
+    eager = Model(config_file="config_coupled_test.json")
+    with pytest.raises(RuntimeError):
+        eager.init_scheduler(processes=2)
+    assert eager.shared_world is None
+    # without worker processes the world is not shared
+    eager.init_scheduler(processes=0).close()
+
+
+class ResumeModel(lpjml.Component):
+    """Test model resuming from a checkpoint instead of init_cells."""
+
+    def __init__(self, checkpoint, **kwargs):
+        super().__init__(**kwargs)
+
+        self.world = lpjml.World(
+            input=self.lpjml.read_input(copy=False),
+            output=self.lpjml.read_historic_output(),
+            grid=self.lpjml.grid,
+            country=self.lpjml.country,
+        )
+        self.load_checkpoint(checkpoint, cell_class=lpjml.Cell)
+
+    def update(self, t):
+        self.update_lpjml(t)
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_checkpoint(test_path, tmp_path, monkeypatch):
+    """Test saving and resuming from a checkpoint."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json",
+        checkpoint_path=str(tmp_path),
+    )
+    cells = model._sorted_cells()
+    for cell in cells:
+        cell.behaviour = cell.index + 0.5
+    model.checkpoint_attributes.append("behaviour")
+    model.world.input.with_tillage.values[:] = 1
+
+    checkpoint = model.save_checkpoint(str(tmp_path / "start"))
+    assert checkpoint.year == 2022
+    assert checkpoint.neighbourhood().pairs.tolist() == [[0, 1]]
+    # attributes of the cells must be storable as array
+    with pytest.raises(ValueError):
+        model.save_checkpoint(str(tmp_path / "invalid"), ["world"])
+
+    # checkpoints are saved at the restart year if restarts are written
+    monkeypatch.setattr(model.lpjml.config, "write_restart", True)
+    monkeypatch.setattr(model.lpjml.config, "restart_year", 2030)
+    for year in model.lpjml.get_sim_years():
+        model.update(year)
+    assert os.path.exists(tmp_path / "checkpoint_2030" / "checkpoint.json")
+    assert not os.path.exists(tmp_path / "checkpoint_2031")
+
+    monkeypatch.setenv("TEST_LINE_COUNTER", "0")
+    resumed = ResumeModel(
+        str(tmp_path / "start"), config_file="config_coupled_test.json"
+    )
+    assert isinstance(resumed.world.neighbourhood, lpjml.Neighbourhood)
+    assert [cell.behaviour for cell in resumed._sorted_cells()] == [0.5, 1.5]
+    assert resumed.world.input.with_tillage.values.ravel().tolist() == [1, 1]
+    with pytest.raises(ValueError):
+        resumed.load_checkpoint(str(tmp_path / "checkpoint_2030"))
+
+    for year in resumed.lpjml.get_sim_years():
+        resumed.update(year)
+    np.testing.assert_array_equal(
+        resumed.world.output.hdate.values, model.world.output.hdate.values
+    )
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_checkpoint_cells(test_path, tmp_path, monkeypatch):
+    """Test checkpoints of a selection of cells and invalid checkpoints."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json",
+        cell_kwargs={"select": {"lat": (51.5, 52)}},
+    )
+    (cell,) = model.world.cells
+    cell.behaviour = 3.5
+    # cells without a position are not stored
+    lpjml.Cell(world=model.world)
+    assert model._sorted_cells() == [cell]
+    checkpoint = model.save_checkpoint(str(tmp_path / "select"), ["behaviour"])
+    assert checkpoint.array("cells").tolist() == [1]
+    cell.behaviour = 0
+    checkpoint.restore_cells([cell])
+    assert cell.behaviour == 3.5
+    with pytest.raises(ValueError):
+        checkpoint.restore_cells([])
+
+    # neighbour pairs are stored as positions of the cells
+    world = lpjml.World(output=model.world.output)
+    first = lpjml.Cell(world=world, index=7)
+    second = lpjml.Cell(world=world, index=5)
+    world.neighbourhood = nx.Graph()
+    world.neighbourhood.add_edge(first, second)
+    assert lpjml.checkpoint._neighbour_pairs(world).tolist() == [[7, 5]]
+
+    # the world is left unchanged by a checkpoint that does not match
+    np.save(
+        tmp_path / "select" / "output.hdate.npy",
+        np.zeros((2, 24, 2), dtype=np.int64),
+    )
+    model.world.input.with_tillage.values[:] = 7
+    with pytest.raises(ValueError):
+        checkpoint.restore_world(model.world)
+    assert model.world.input.with_tillage.values.ravel().tolist() == [7, 7]
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_country_codes(test_path, tmp_path, monkeypatch):
+    """Test storing the countries as codes with cached names."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json",
+        country_encoding="codes",
+        country_cache=str(tmp_path),
+    )
+    assert model.world.country.dtype == np.int16
+    assert model.country_names[72] == "DEU"
+    assert model.world.country_index.cell_names().tolist() == ["DEU"] * 2
+    assert len(os.listdir(tmp_path)) == 2
+
+    with pytest.raises(ValueError):
+        Model(config_file="config_coupled_test.json", country_encoding="int")
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_subscribe_output(test_path, monkeypatch):
+    """Test merging only subscribed outputs."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    model = Model(
+        config_file="config_coupled_test.json", cell_kwargs={"lazy": True}
+    )
+    model.subscribe_output("hdate")
+    model.subscribe_output("soilc_agr_layer", every=5, latest=True)
+    assert model.output_history.latest_only == {"soilc_agr_layer"}
+    with pytest.raises(KeyError):
+        model.subscribe_output("harvest")
+
+    output = {
+        name: np.zeros(1)
+        for name in ("hdate", "soilc_agr_layer", "pft_harvestc")
+    }
+    assert set(model._subscribed_output(output, 2023)) == {
+        "hdate",
+        "soilc_agr_layer",
+    }
+    assert set(model._subscribed_output(output, 2024)) == {"hdate"}
+    assert set(model._subscribed_output(output, 2028)) == {
+        "hdate",
+        "soilc_agr_layer",
+    }
+
+    for year in model.lpjml.get_sim_years():
+        model.update(year)
+    # unsubscribed outputs are removed with the first exchange
+    assert set(model.world.output.data_vars) == {"hdate", "soilc_agr_layer"}
+    assert model.output_history.years.tolist() == [2050]
+    cell = min(model.world.cells, key=lambda cell: cell.index)
+    assert set(cell.output) == {"hdate", "soilc_agr_layer"}
+
+
+@patch.dict(
+    os.environ, {"TEST_PATH": get_test_path(), "TEST_LINE_COUNTER": "0"}
+)  # noqa
+def test_storage_dtypes(test_path, monkeypatch):
+    """Test the compact storage dtypes of the world input and output."""
+    monkeypatch.chdir(f"{test_path}/data")
+
+    dtypes = {"cftfrac": "float32", "hdate": "int16", "with_tillage": "int32"}
+    reference = Model(config_file="config_coupled_test.json")
+    monkeypatch.setenv("TEST_LINE_COUNTER", "0")
+    model = Model(
+        config_file="config_coupled_test.json",
+        output_history="ring",
+        storage_dtypes=dtypes,
+        cell_kwargs={"lazy": True},
+    )
+    assert model.world.output.cftfrac.dtype == np.float32
+    assert model.world.output.hdate.dtype == np.int16
+    assert model.world.output.pft_harvestc.dtype == np.float64
+    assert model.world.input.with_tillage.dtype == np.int32
+    np.testing.assert_array_equal(
+        model.world.output.hdate, reference.world.output.hdate
+    )
+    np.testing.assert_allclose(
+        model.world.output.cftfrac, reference.world.output.cftfrac, rtol=1e-7
+    )
+    report = model.memory_report(cells=False)
+    assert report["world"]["output.hdate"] == 2 * 24 * 2
+
+    for year in model.lpjml.get_sim_years():
+        model.update(year)
+    # the ring buffers and received outputs keep the storage dtypes
+    assert model.output_history._buffers["hdate"][0].dtype == np.int16
+    assert model.world.output.hdate.dtype == np.int16
+    cell = min(model.world.cells, key=lambda cell: cell.index)
+    assert cell.output.cftfrac.dtype == np.float32
+    assert model.output_history.years.tolist() == [2050]
+
+    with pytest.raises(ValueError):
+        model.storage_policy.check({"hdate": np.array([40000])})
+    # the fill value of with_tillage exceeds int16
+    monkeypatch.setenv("TEST_LINE_COUNTER", "0")
+    with pytest.raises(ValueError, match="exceed the range"):
+        Model(
+            config_file="config_coupled_test.json",
+            storage_dtypes={"with_tillage": "int16"},
+        )
@@ -0,0 +1,75 @@
+"""Test the neighbourhood structures of the copan:LPJmL world."""
+
+import networkx as nx
+import numpy as np
+import xarray as xr
+
+from pycopanlpjml.neighbourhood import Neighbourhood, neighbour_pairs
+
+
+def test_neighbour_pairs():
+    """Test vectorized pairs against cell by cell edge insertion."""
+    neighbour_matrix = np.array(
+        [
+            [1, 2, -9999],
+            [0, 2, -1],
+            [3, 1, 0],
+            [2, -9999, -9999],
+            [-9999, -9999, -9999],
+        ]
+    )
+    pairs = neighbour_pairs(neighbour_matrix)
+    assert pairs.tolist() == [[0, 1], [0, 2], [1, 2], [2, 3]]
+
+    # graph equals the graph built by iterating the matrix cell by cell
+    expected = nx.Graph()
+    expected.add_nodes_from(range(5))
+    for icell, neighbours in enumerate(neighbour_matrix):
+        for neighbour in neighbours:
+            if neighbour >= 0:
+                expected.add_edge(icell, neighbour)
+
+    graph = nx.Graph()
+    graph.add_nodes_from(range(5))
+    graph.add_edges_from(pairs.tolist())
+    assert nx.utils.graphs_equal(graph, expected)
+    assert all(list(graph.adj[i]) == list(expected.adj[i]) for i in range(5))
+
+
+def test_csr_neighbourhood():
+    """Test CSR neighbourhood reductions and on demand networkx graph."""
+    neighbour_matrix = np.array(
+        [[1, 2, -1], [0, 2, -1], [0, 1, 3], [2, -1, -1], [-1, -1, -1]]
+    )
+    neighbourhood = Neighbourhood.from_neighbour_matrix(neighbour_matrix)
+
+    assert neighbourhood.degree.tolist() == [2, 2, 3, 1, 0]
+    assert neighbourhood.neighbours(2).tolist() == [0, 1, 3]
+    assert list(neighbourhood.neighbors(3)) == [2]
+
+    values = np.array([[1.0, 10.0], [2.0, 20.0], [3.0, 30.0], [4.0, 40.0]])
+    values = np.vstack([values, [[5.0, 50.0]]])
+    np.testing.assert_array_equal(
+        neighbourhood.neighbour_sum(values)[:, 0], [5, 4, 7, 3, 0]
+    )
+    np.testing.assert_array_equal(
+        neighbourhood.neighbour_mean(values)[:, 1],
+        [25, 20, 70 / 3, 30, np.nan],
+    )
+    np.testing.assert_array_equal(
+        neighbourhood.neighbour_max(values)[:, 0], [3, 3, 4, 3, np.nan]
+    )
+
+    # xarray input keeps dimensions and coordinates
+    data = xr.DataArray(
+        values.T, dims=("band", "cell"), coords={"cell": np.arange(5) + 10}
+    )
+    result = neighbourhood.neighbour_min(data)
+    assert result.dims == ("band", "cell")
+    np.testing.assert_array_equal(result.values[0], [2, 1, 1, 3, np.nan])
+
+    # networkx graph equals the default world neighbourhood
+    expected = nx.Graph()
+    expected.add_nodes_from(range(5))
+    expected.add_edges_from(neighbour_pairs(neighbour_matrix).tolist())
+    assert nx.utils.graphs_equal(neighbourhood.graph, expected)
@@ -0,0 +1,119 @@
+"""Test the parallel scheduling of cell level updates."""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from pycopanlpjml.country import CountryIndex
+from pycopanlpjml.neighbourhood import Neighbourhood
+from pycopanlpjml.scheduler import CellScheduler, partition_cells
+from pycopanlpjml.shared import SharedWorld
+
+
+def make_world(ncell=6):
+    """World of a row of cells (0.5 degree, crossing 10 degrees east)."""
+    lon = 8.25 + 0.5 * np.arange(ncell)
+    cell = dict(cell=np.arange(ncell), lon=("cell", lon))
+    cell["lat"] = ("cell", np.full(ncell, 50.25))
+    world = SimpleNamespace(
+        input=xr.Dataset(
+            {
+                "with_tillage": (
+                    ("cell", "band", "time"),
+                    np.ones((ncell, 1, 1), dtype=np.int32),
+                )
+            },
+            coords=cell,
+        ),
+        output=xr.Dataset(
+            {"yield": (("cell", "time"), np.arange(ncell)[:, None] * 1.0)},
+            coords=cell,
+        ),
+        grid=xr.DataArray(
+            np.stack([lon, cell["lat"][1]], axis=1),
+            dims=("cell", "band"),
+            coords=cell,
+        ),
+        country=xr.DataArray(
+            np.array([["DEU"], ["DEU"], ["NLD"], ["DEU"], ["NLD"], ["NLD"]]),
+            dims=("cell", "band"),
+            coords=cell,
+        ),
+    )
+    world.country_index = CountryIndex(world.country)
+    return world
+
+
+def neighbour_tillage(cell, t, rng):
+    """Till if the right neighbour yields more, randomly otherwise."""
+    neighbours = cell.neighbours
+    right = neighbours[neighbours > cell.index]
+    if len(right) and cell.world.output["yield"][right[0], 0] > 3:
+        return {"with_tillage": cell.input.with_tillage * 2}
+    return {"with_tillage": rng.integers(10, 20)}
+
+
+def partition_sum(partition):
+    return {
+        "with_tillage": partition.world.input.with_tillage[partition.cells]
+        + partition.id
+    }
+
+
+def test_partition_cells():
+    world = make_world()
+    blocks = partition_cells(world, size=10)
+    assert [cells.tolist() for cells in blocks] == [[0, 1, 2, 3], [4, 5]]
+    countries = partition_cells(world, by="country")
+    assert [cells.tolist() for cells in countries] == [[0, 1, 3], [2, 4, 5]]
+    with pytest.raises(ValueError):
+        partition_cells(world, by="state")
+
+
+@pytest.mark.parametrize("processes", [0, 2])
+def test_cell_scheduler(processes):
+    world = make_world()
+    neighbourhood = Neighbourhood.from_neighbour_matrix(
+        [[1, -1], [0, 2], [1, 3], [2, 4], [3, 5], [4, -1]]
+    )
+    shared = SharedWorld(world) if processes else None
+
+    scheduler = CellScheduler(
+        world,
+        partition_cells(world, size=1),
+        neighbourhood,
+        handle=shared and shared.handle,
+        processes=processes,
+        seed=42,
+    )
+    assert scheduler.processes == processes
+    scheduler.map_cells(neighbour_tillage, 2023)
+    tillage = world.input.with_tillage.values[:, 0, 0].copy()
+
+    # neighbours are read before the update of the step
+    assert tillage[3:5].tolist() == [2, 2]
+
+    # independent of the number of processes
+    reference = make_world()
+    CellScheduler(
+        reference,
+        partition_cells(reference, size=1),
+        neighbourhood,
+        processes=0,
+        seed=42,
+    ).map_cells(neighbour_tillage, 2023)
+    np.testing.assert_array_equal(
+        reference.input.with_tillage.values, world.input.with_tillage.values
+    )
+
+    scheduler.map_partitions(partition_sum, 2024)
+    np.testing.assert_array_equal(
+        world.input.with_tillage.values[:, 0, 0],
+        tillage + [0, 0, 1, 1, 2, 2],
+    )
+
+    scheduler.close()
+    if shared:
+        shared.close()
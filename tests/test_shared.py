@@ -0,0 +1,57 @@
+"""Test the shared memory buffers of the copan:LPJmL world."""
+
+import multiprocessing
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from pycopanlpjml.shared import SharedWorld
+from .test_history import make_output
+
+
+def double_harvest(handle, cells):
+    """Worker writing its slice of cells in place."""
+    with handle.attach() as world:
+        world.output.harvest[cells] *= 2
+        return int(world.output.hdate[cells].sum())
+
+
+def test_shared_world():
+    output = make_output([2021, 2022], ncell=4)
+    expected = output.harvest.values * 2
+    world = SimpleNamespace(output=output, grid=output.hdate.isel(time=0))
+
+    shared = SharedWorld(world)
+    assert list(shared.handle.layout) == ["output", "grid"]
+    assert shared.nbytes >= output.harvest.values.nbytes
+
+    # the handle is cheap to pickle, attached arrays share the memory
+    assert len(pickle.dumps(shared.handle)) < 1000
+    attached = shared.handle.attach()
+    assert attached.output.cell_axis("harvest") == 0
+    attached.grid.values[:] = 1
+    assert (world.grid.values == 1).all()
+    attached.close()
+
+    with multiprocessing.Pool(2) as pool:
+        sums = pool.starmap(
+            double_harvest,
+            [(shared.handle, slice(0, 2)), (shared.handle, slice(2, 4))],
+        )
+    assert sum(sums) == output.hdate.values.sum()
+    np.testing.assert_array_equal(output.harvest.values, expected)
+
+    # the world keeps its values after the shared memory is released
+    shared.close()
+    np.testing.assert_array_equal(output.harvest.values, expected)
+    with pytest.raises(FileNotFoundError):
+        shared.handle.attach()
+
+
+def test_shared_world_object_dtype():
+    output = make_output([2022])
+    output.variables["hdate"].data = output.hdate.values.astype(object)
+    with pytest.raises(ValueError):
+        SharedWorld(SimpleNamespace(output=output))
@@ -0,0 +1,81 @@
+"""Test the spatial index of the copan:LPJmL world grid."""
+
+import numpy as np
+import pytest
+
+from pycopanlpjml.spatial import GridIndex, haversine
+from pycopanlpjml.standin import synthetic_grid
+
+
+def make_index(ncell=3000):
+    """Index of a synthetic grid with a gap (e.g. a lake)."""
+    lon, lat = synthetic_grid(ncell)
+    land = ~((lat > -54) & (lat < -53) & (lon > -170) & (lon < -160))
+    return GridIndex(lon[land], lat[land], cellsize=0.5)
+
+
+def test_haversine():
+    assert haversine(0, 0, 0, 0) == 0
+    # a quarter of the equator
+    np.testing.assert_allclose(haversine(0, 0, 90, 0), 10007.5, rtol=1e-4)
+    np.testing.assert_allclose(haversine(179.75, 10, -179.75, 10), 54.76, 1e-3)
+
+
+def test_nearest_cell():
+    index = make_index()
+    rng = np.random.default_rng(1)
+    # points on the grid, in the gap, across the antimeridian and far off
+    lon = np.concatenate([rng.uniform(-180, 180, 500), [-165, 179.9, 20]])
+    lat = np.concatenate([rng.uniform(-56, -40, 500), [-53.5, -55.7, 10]])
+
+    cells, distances = index.nearest_cell(lon, lat, return_distance=True)
+    expected = haversine(
+        lon[:, None], lat[:, None], index.lon[None, :], index.lat[None, :]
+    )
+    np.testing.assert_allclose(distances, expected.min(axis=1))
+    np.testing.assert_array_equal(cells, expected.argmin(axis=1))
+
+    # points in cells resolve to the cell
+    assert index.nearest_cell(index.lon[42], index.lat[42]) == 42
+    cells = index.nearest_cell(index.lon[:8].reshape(2, 4), index.lat[0])
+    assert cells.shape == (2, 4)
+
+
+def test_cells_within():
+    index = make_index()
+    rng = np.random.default_rng(2)
+    lon = np.concatenate([rng.uniform(-180, 180, 200), [-179.9, 20]])
+    lat = np.concatenate([rng.uniform(-56, -40, 200), [-54.4, 10]])
+
+    indptr, cells, distances = index.cells_within(
+        lon, lat, radius_km=150, return_distance=True
+    )
+    expected = haversine(
+        lon[:, None], lat[:, None], index.lon[None, :], index.lat[None, :]
+    )
+    found = np.split(cells, indptr[1:-1])
+    for point, point_distances in enumerate(np.split(distances, indptr[1:-1])):
+        np.testing.assert_array_equal(
+            found[point], np.flatnonzero(expected[point] <= 150)
+        )
+        np.testing.assert_allclose(
+            point_distances, expected[point, found[point]]
+        )
+    # no cells far off the grid
+    assert found[-1].size == 0
+    # wrapped around the antimeridian
+    assert (index.lon[found[-2]] > 179).any()
+
+    single = index.cells_within(index.lon[0], index.lat[0], radius_km=0)
+    assert single.tolist() == [0]
+    with pytest.raises(ValueError):
+        index.cells_within(0, 0, radius_km=-1)
+
+
+def test_grid_index_errors():
+    with pytest.raises(ValueError):
+        GridIndex([0.25], [0.25])
+    with pytest.raises(ValueError):
+        GridIndex([0.25, 0.3], [0.25, 0.25], cellsize=0.5)
+    # cell size is inferred from the coordinates
+    assert GridIndex([0.25, 0.75], [0.25, 1.25]).cellsize == (0.5, 1.0)
@@ -0,0 +1,201 @@
+"""Test the LPJmL stand-in speaking the coupler protocol."""
+
+import socket
+import sys
+
+import numpy as np
+import pytest
+
+import pycopanlpjml as lpjml
+from pycopanlpjml.standin import LPJmLStandIn, read_recording
+
+
+class Model(lpjml.Component):
+    """Test model exchanging data with the stand-in via socket."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.world = lpjml.World(
+            input=self.lpjml.read_input(copy=False),
+            output=self.lpjml.read_historic_output(),
+            grid=self.lpjml.grid,
+            country=self.lpjml.country,
+        )
+        self.init_cells(cell_class=lpjml.Cell, lazy=True)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def run_model(config_file, port, **kwargs):
+    model = Model(config_file=config_file, lpjml_port=port, **kwargs)
+    for year in model.lpjml.get_sim_years():
+        model.world.input.with_tillage.values[:] = year % 2
+        model.update_lpjml(year)
+    return model
+
+
+def test_read_recording(test_path):
+    recording = read_recording(f"{test_path}/data/test_receive.txt")
+
+    assert recording["ncell"] == 2
+    assert recording["inputs"] == {7: 2}
+    assert recording["outputs"][44] == (1, 24, 1)
+    assert [index for index, _ in recording["static"]] == [0, 1, 2]
+    np.testing.assert_array_equal(
+        recording["static"][0][1], [7.75, 51.25, 7.75, 51.75]
+    )
+    # 28 coupled years with one input, 29 years with 4 outputs
+    assert len(recording["exchanges"]) == 28 + 29 * 4
+
+
+def test_standin_replay(test_path, monkeypatch):
+    """Replay the recorded exchange through the coupler socket."""
+    # exchange via socket instead of the test mode of the coupler
+    monkeypatch.delattr(sys, "_called_from_test")
+    monkeypatch.chdir(f"{test_path}/data")
+    port = free_port()
+
+    with LPJmLStandIn.replay("test_receive.txt", port=port) as standin:
+        model = run_model("config_coupled_test.json", port)
+
+    np.testing.assert_array_equal(
+        model.world.output.hdate.values[..., -1], standin.outputs_sent[44]
+    )
+    assert model.output_history.years.tolist() == [2050]
+    np.testing.assert_array_equal(standin.inputs_received[7], [[0], [0]])
+
+
+def test_standin_synthetic(test_path, tmp_path, monkeypatch):
+    """Run the coupler against a synthetic grid."""
+    monkeypatch.delattr(sys, "_called_from_test")
+    port = free_port()
+
+    with LPJmLStandIn.synthetic(
+        f"{test_path}/data/config_coupled_test.json",
+        ncell=100,
+        workspace=tmp_path,
+        port=port,
+    ) as standin:
+        model = run_model(standin.config_file, port)
+
+    assert model.lpjml.ncell == 100
+    assert len(model.world.cells) == 100
+    np.testing.assert_allclose(
+        model.world.output.pft_harvestc.values[..., -1],
+        standin.outputs_sent[25],
+    )
+    np.testing.assert_array_equal(
+        model.world.grid.values[:2], [[-179.75, -55.75], [-179.25, -55.75]]
+    )
+    np.testing.assert_array_equal(standin.inputs_received[7], 0)
+
+
+def test_standin_input_tracking(test_path, tmp_path, monkeypatch):
+    """Send the tracked input wire buffers through the coupler socket."""
+    monkeypatch.delattr(sys, "_called_from_test")
+    port = free_port()
+
+    with LPJmLStandIn.synthetic(
+        f"{test_path}/data/config_coupled_test.json",
+        ncell=100,
+        workspace=tmp_path,
+        port=port,
+    ) as standin:
+        model = run_model(standin.config_file, port, input_tracking="compare")
+
+    # with_tillage alternates each year, all cells are re-encoded
+    assert model.input_tracker.encoded_bytes == 100 * 4
+    np.testing.assert_array_equal(
+        standin.inputs_received[7],
+        model.world.input.with_tillage.values.reshape(100, 1),
+    )
+
+
+def test_standin_marked_input(test_path, tmp_path, monkeypatch):
+    """Send inputs set through the cell views with marked tracking."""
+    monkeypatch.delattr(sys, "_called_from_test")
+    port = free_port()
+
+    with LPJmLStandIn.synthetic(
+        f"{test_path}/data/config_coupled_test.json",
+        ncell=100,
+        workspace=tmp_path,
+        port=port,
+    ) as standin:
+        model = Model(
+            config_file=standin.config_file,
+            lpjml_port=port,
+            input_tracking="marked",
+        )
+        model.world.input.with_tillage.values[:] = 1
+        model.input_tracker.mark_dirty("with_tillage")
+        cells = sorted(model.world.cells, key=lambda cell: cell.index)
+        for year in model.lpjml.get_sim_years():
+            # writes set through the cell views are marked and sent
+            for index in (3, 42):
+                cells[index].input.with_tillage = year % 2
+            model.update_lpjml(year)
+
+    expected = np.ones((100, 1))
+    expected[[3, 42]] = year % 2
+    np.testing.assert_array_equal(standin.inputs_received[7], expected)
+    assert model.input_tracker.mode == "marked"
+
+
+def test_standin_advance(test_path, tmp_path, monkeypatch):
+    """Fast-forward the coupled years in one span."""
+    monkeypatch.delattr(sys, "_called_from_test")
+    port = free_port()
+
+    with LPJmLStandIn.synthetic(
+        f"{test_path}/data/config_coupled_test.json",
+        ncell=100,
+        workspace=tmp_path / "advance",
+        port=port,
+    ) as standin:
+        model = Model(config_file=standin.config_file, lpjml_port=port)
+        model.world.input.with_tillage.values[:] = 0
+        lastyear = model.config.lastyear
+        with pytest.raises(ValueError):
+            model.advance(until=lastyear - 1, t=model.lpjml.sim_year + 1)
+        with pytest.raises(ValueError):
+            model.advance(until=lastyear - 1, chunk=0)
+        assert model.advance(until=lastyear - 2, chunk=3) == lastyear - 2
+        assert model.lpjml.sim_year == lastyear - 1
+        # inputs are sent cell first, whatever the order of the dimensions
+        tillage = model.world.input.with_tillage
+        model.world.input["with_tillage"] = tillage.transpose(
+            *tillage.dims[::-1]
+        )
+        model.world.input.with_tillage.values[:] = 0
+        model.world.input.with_tillage.values[..., 5] = 1
+        assert model.advance(until=lastyear - 1) == lastyear - 1
+        assert model.lpjml.sim_year == lastyear
+        sent = np.zeros((100, 1))
+        sent[5] = 1
+        np.testing.assert_array_equal(standin.inputs_received[7], sent)
+        model.world.input["with_tillage"] = tillage
+        model.world.input.with_tillage.values[:] = 1
+        model.update_lpjml(lastyear)
+
+    # outputs equal those of yearly exchanges of the same stand-in
+    port = free_port()
+    with LPJmLStandIn.synthetic(
+        f"{test_path}/data/config_coupled_test.json",
+        ncell=100,
+        workspace=tmp_path / "yearly",
+        port=port,
+    ) as yearly:
+        expected = run_model(yearly.config_file, port)
+
+    assert model.output_history.years.tolist() == [lastyear]
+    np.testing.assert_array_equal(standin.inputs_received[7], 1)
+    for name in model.world.output.data_vars:
+        np.testing.assert_array_equal(
+            model.world.output[name].values,
+            expected.world.output[name].values,
+        )
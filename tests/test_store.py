@@ -0,0 +1,50 @@
+"""Test the on-disk output history."""
+
+import numpy as np
+import pytest
+
+from pycopanlpjml.store import OutputStore
+from .test_history import make_output
+
+
+def test_output_store(tmp_path):
+    output = make_output([2021, 2022])
+    store = OutputStore(tmp_path / "history.nc", output)
+
+    history = store.open_dataset()
+    assert history.sizes["time"] == 2
+    assert history.harvest.dims == ("cell", "band (harvest)", "time")
+
+    for year in (2023, 2024):
+        store.append(make_output([year]), year)
+
+    # a dataset opened before is a snapshot of the stored history
+    assert history.sizes["time"] == 2
+    history = store.open_dataset()
+    assert store.ntime == 4
+    np.testing.assert_array_equal(
+        history.time.values.astype("datetime64[Y]").astype(int) + 1970,
+        [2021, 2022, 2023, 2024],
+    )
+    np.testing.assert_array_equal(
+        history.harvest.values,
+        make_output([2021, 2022, 2023, 2024]).harvest.values,
+    )
+    np.testing.assert_array_equal(
+        history.hdate.sel(time="2024").values[..., 0], [[202400], [202410]]
+    )
+
+    store.close()
+    assert store.open_dataset().sizes["time"] == 4
+    with pytest.raises(RuntimeError):
+        store.append(make_output([2025]), 2025)
+
+
+def test_output_store_error(tmp_path):
+    store = OutputStore(tmp_path / "history.nc", make_output([2022]))
+
+    # errors of the writer thread are raised in the calling thread
+    store.append({"harvest": np.zeros(5), "hdate": np.zeros(2)}, 2023)
+    with pytest.raises(ValueError):
+        store.flush()
+    store.close()
@@ -0,0 +1,45 @@
+"""Test the per-phase timer."""
+
+import json
+
+from pycopanlpjml import PhaseTimer
+
+
+def test_phase_timer(tmp_path):
+    received = []
+    timer = PhaseTimer(
+        enabled=True, callback=lambda year, phases: received.append(year)
+    )
+
+    with timer.span("social"):
+        pass
+    with timer.span("social"):
+        pass
+    timer.add("read_output", 0.5)
+    timer.finish_year(2023)
+    timer.add("read_output", 0.25)
+    timer.finish_year(2024)
+
+    assert list(timer.records) == [2023, 2024]
+    assert set(timer.records[2023]) == {"social", "read_output"}
+    assert timer.records[2024] == {"read_output": 0.25}
+    assert received == [2023, 2024]
+
+    timer.to_json(tmp_path / "timings.json")
+    with open(tmp_path / "timings.json") as file:
+        assert json.load(file)["2024"] == {"read_output": 0.25}
+    assert timer.to_csv().splitlines()[-1] == "2024,read_output,0.25"
+
+    timer.reset()
+    assert timer.records == {}
+
+
+def test_phase_timer_disabled():
+    timer = PhaseTimer()
+
+    with timer.span("social"):
+        pass
+    timer.finish_year(2023)
+
+    assert timer.span("social") is timer.span("other")
+    assert timer.records == {}